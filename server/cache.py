@@ -1,6 +1,11 @@
+import uuid
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 
 from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 
 class CacheHandler(ABC):
@@ -12,6 +17,13 @@ class CacheHandler(ABC):
     def set(self, key: str, value):
         pass
 
+    def delete(self, key: str):
+        self.set(key, None)
+
+    def lock(self, key: str):
+        """serializes read-modify-writes of `key`, as a context manager"""
+        return nullcontext()
+
 
 class CachedView(ABC):
     @abstractmethod
@@ -29,3 +41,48 @@ class DjangoCacheHandler(CacheHandler):
 
     def set(self, key: str, value):
         return cache.set(key, value, timeout=self.expiration)
+
+    def delete(self, key: str):
+        return cache.delete(key)
+
+    def lock(self, key: str, timeout=10, blocking_timeout=5):
+        # only the redis backend can lock across processes
+        if not hasattr(cache, "lock"):
+            return nullcontext()
+        return cache.lock(
+            f"{key}:lock", timeout=timeout, blocking_timeout=blocking_timeout
+        )
+
+
+def versioned(value):
+    """wrap `value` for the cache with a fresh content version"""
+    return {"value": value, "etag": uuid.uuid4().hex, "last_modified": timezone.now()}
+
+
+def is_versioned(cached) -> bool:
+    return isinstance(cached, dict) and cached.keys() == {
+        "value",
+        "etag",
+        "last_modified",
+    }
+
+
+def conditional_response(request, versions, build, variant=""):
+    """
+    304 Not Modified if the client already has every one of the cached
+    `versions`, otherwise `build()`. either way the response carries their
+    ETag and Last-Modified. `variant` tells apart representations of the same
+    versions, e.g. what an admin sees.
+    """
+    tags = [v["etag"] for v in versions] + ([variant] if variant else [])
+    etag = quote_etag(".".join(tags))
+    last_modified = int(max(v["last_modified"] for v in versions).timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+
+    if response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+    return response
@@ -5,6 +5,7 @@ from django.db import connection
 from django.db.models import IntegerField, Max, Prefetch, Sum, Value
 from django.db.models.functions import Coalesce
 from engagement.models import CohortStats
+from members.discord import discord_resolver
 from members.models import User
 from members.permissions import IsApiKey
 from rest_framework import generics, status
@@ -148,11 +149,7 @@ class CohortStatsView(APIView):
 
     def get_member_id_from_discord_id(self, discord_id: str) -> Optional[int]:
         try:
-            return (
-                User.objects.filter(discord_id=discord_id)
-                .values_list("id", flat=True)
-                .first()
-            )
+            return discord_resolver.resolve_many([discord_id]).get(int(discord_id))
         except ValueError:
             raise ValueError("Invalid discord_id format")
 
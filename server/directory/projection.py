@@ -0,0 +1,187 @@
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+import orjson
+from django_redis import get_redis_connection
+from members.models import User
+from redis.exceptions import RedisError
+
+from server.renderers import dumps
+
+from .serializers import (
+    AdminDirectoryMemberSerializer,
+    RegularDirectoryMemberSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryProjection:
+    """
+    what the directory shows of every member, serialized once per role into
+    a redis hash of user id -> json.
+
+    a request only fetches and decodes the members it returns, instead of
+    unpickling every `User`. saving or deleting a member rewrites just their
+    entries and gives the projection a new content version, for conditional
+    requests. the projection is rebuilt from the db when it's missing, and
+    `rebuild_after` seconds after its last rebuild in case a bulk write
+    skipped the signals, however often it's refreshed since. while redis is
+    down, members are serialized from the db.
+    """
+
+    # bump when the serialized shape changes, so stale entries aren't read
+    VERSION = 1
+    KEY = "directory:members:v{version}:{role}"
+    META_KEY = "directory:members:v{version}:meta"
+
+    ROLES = {
+        "regular": RegularDirectoryMemberSerializer,
+        "admin": AdminDirectoryMemberSerializer,
+    }
+
+    def __init__(self, rebuild_after=60 * 60 * 24, redis=None):
+        self._rebuild_after = rebuild_after
+        self._redis = redis
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def key(self, role: str) -> str:
+        return self.KEY.format(version=self.VERSION, role=role)
+
+    @property
+    def meta_key(self) -> str:
+        return self.META_KEY.format(version=self.VERSION)
+
+    def get_queryset(self):
+        # the admin serializer lists groups and permissions
+        return User.objects.prefetch_related("groups", "user_permissions")
+
+    def serialize(self, members) -> Dict[str, Dict[int, bytes]]:
+        """role -> user id -> serialized member"""
+        return {
+            role: {member.id: dumps(serializer(member).data) for member in members}
+            for role, serializer in self.ROLES.items()
+        }
+
+    def _set_meta(self, pipe, rebuilt=False):
+        now = datetime.now(timezone.utc).timestamp()
+        meta = {"etag": uuid.uuid4().hex, "last_modified": now}
+        if rebuilt:
+            # a refresh keeps the time of the last rebuild
+            meta["built_at"] = now
+        pipe.hset(self.meta_key, mapping=meta)
+
+    def rebuild(self) -> int:
+        """rebuild every role's hash from the db. returns the number of members"""
+        members = list(self.get_queryset())
+        serialized = self.serialize(members)
+
+        pipe = self.redis.pipeline()
+        for role, entries in serialized.items():
+            key = self.key(role)
+            # rebuild off to the side and swap it in, so readers never see a
+            # partial projection
+            pipe.delete(f"{key}:rebuild")
+            if entries:
+                pipe.hset(f"{key}:rebuild", mapping=entries)
+                pipe.rename(f"{key}:rebuild", key)
+            else:
+                pipe.delete(key)
+        self._set_meta(pipe, rebuilt=True)
+        pipe.execute()
+
+        logger.info(f"rebuilt the directory projection of {len(members)} members")
+        return len(members)
+
+    def refresh(self, user_ids: Iterable[int]) -> None:
+        """rewrite the entries of `user_ids`, dropping members that are gone"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+        try:
+            if not self.redis.exists(self.meta_key):
+                # the next read rebuilds it anyway
+                return
+
+            members = list(self.get_queryset().filter(id__in=user_ids))
+            gone = user_ids - {member.id for member in members}
+
+            pipe = self.redis.pipeline()
+            for role, entries in self.serialize(members).items():
+                if entries:
+                    pipe.hset(self.key(role), mapping=entries)
+                if gone:
+                    pipe.hdel(self.key(role), *gone)
+            self._set_meta(pipe)
+            pipe.execute()
+        except RedisError as e:
+            logger.error(f"failed to refresh the directory projection: {e}")
+
+    def invalidate(self) -> None:
+        """have the next read rebuild the projection"""
+        try:
+            self.redis.delete(self.meta_key)
+        except RedisError as e:
+            logger.error(f"failed to invalidate the directory projection: {e}")
+
+    def _ensure_built(self):
+        """the projection's meta, rebuilding the projection if it's missing or due"""
+        meta = self.redis.hgetall(self.meta_key)
+        built_at = float(meta.get(b"built_at", 0))
+        if datetime.now(timezone.utc).timestamp() >= built_at + self._rebuild_after:
+            self.rebuild()
+            meta = self.redis.hgetall(self.meta_key)
+        return meta
+
+    def get_version(self) -> Dict:
+        """the projection's content version, see `cache.versioned`"""
+        try:
+            meta = self._ensure_built()
+            etag, last_modified = meta[b"etag"], meta[b"last_modified"]
+        except (RedisError, KeyError) as e:
+            logger.error(f"directory projection unavailable: {e}")
+            # never matches, so the response is always built
+            etag, last_modified = uuid.uuid4().hex, datetime.now(timezone.utc)
+        else:
+            etag = etag.decode()
+            last_modified = datetime.fromtimestamp(float(last_modified), timezone.utc)
+
+        return {"etag": etag, "last_modified": last_modified}
+
+    def get_members(self, role: str, user_ids: List[int]) -> List[Dict]:
+        """`user_ids`' members as `role` sees them, in order, skipping the gone"""
+        if not user_ids:
+            return []
+
+        try:
+            self._ensure_built()
+            entries = self.redis.hmget(self.key(role), user_ids)
+        except RedisError as e:
+            logger.error(f"directory projection unavailable: {e}")
+            members = {m.id: m for m in self.get_queryset().filter(id__in=user_ids)}
+            serializer = self.ROLES[role]
+            return [serializer(members[i]).data for i in user_ids if i in members]
+
+        return [orjson.loads(entry) for entry in entries if entry is not None]
+
+    def get_ids(self) -> List[int]:
+        """every member's user id, in no particular order"""
+        try:
+            self._ensure_built()
+            # every role has the same members
+            user_ids = self.redis.hkeys(self.key(next(iter(self.ROLES))))
+            return [int(user_id) for user_id in user_ids]
+        except RedisError as e:
+            logger.error(f"directory projection unavailable: {e}")
+            return list(User.objects.values_list("id", flat=True))
+
+
+directory_projection = DirectoryProjection()
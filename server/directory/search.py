@@ -0,0 +1,74 @@
+import operator
+from functools import reduce
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import Greatest
+from members.models import User
+
+# covered by the members' trigram search index
+SEARCH_FIELDS = ["username", "first_name", "last_name", "major", "discord_username"]
+MAX_TERMS = 5
+
+
+def search_members(query):
+    """
+    ids of the members matching any term of `query` anywhere in a search
+    field, best matches first. each row also has `total`, the number of
+    matches, see `SearchPaginator`.
+    """
+    # dict keeps the terms in order
+    terms = list(dict.fromkeys(query.lower().split()))[:MAX_TERMS]
+    members = User.objects.annotate(total=Window(Count("id")))
+
+    if not terms:
+        return members.order_by("id").values("id", "total")
+
+    matches = reduce(
+        operator.or_,
+        (
+            Q(**{f"{field}__icontains": term})
+            for term in terms
+            for field in SEARCH_FIELDS
+        ),
+    )
+    # how well each term matches the member's closest field
+    rank = reduce(
+        operator.add,
+        (
+            Greatest(*(TrigramWordSimilarity(term, field) for field in SEARCH_FIELDS))
+            for term in terms
+        ),
+    )
+
+    return (
+        members.filter(matches)
+        .annotate(rank=rank)
+        .order_by(F("rank").desc(), "username")
+        .values("id", "total")
+    )
+
+
+class SearchPaginator(Paginator):
+    """
+    pages through `search_members`, reading the number of matches off the
+    page itself so a page is a single query. pages past the end are empty.
+    """
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+
+        bottom = (number - 1) * self.per_page
+        members = list(self.object_list[bottom : bottom + self.per_page])
+        if not members and number > 1:
+            raise EmptyPage("That page contains no results")
+
+        # count is a cached_property, so this stands in for the count query
+        self.count = members[0]["total"] if members else 0
+        return self._get_page(members, number, self)
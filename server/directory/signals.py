@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from members.models import User
+
+from .projection import directory_projection
+
+
+def refresh_on_commit(user_ids):
+    # only once the change is visible to the projection's query, and never
+    # for a rolled back one
+    transaction.on_commit(lambda: directory_projection.refresh(user_ids))
+
+
+@receiver(post_save, sender=User)
+def refresh_saved_member(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"password"}:
+        return
+    refresh_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def drop_deleted_member(sender, instance, **kwargs):
+    refresh_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def refresh_member_access(sender, instance, action, reverse, pk_set, **kwargs):
+    # admins see a member's groups and permissions
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        refresh_on_commit([instance.pk])
+    elif pk_set:
+        refresh_on_commit(pk_set)
+    else:
+        # a group or permission was cleared of every member
+        transaction.on_commit(directory_projection.invalidate)
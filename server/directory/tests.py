@@ -1,3 +1,233 @@
-from django.test import TestCase  # noqa: F401
+import pickle
+import time
+from unittest.mock import patch
 
-# Create your tests here.
+import orjson
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from members.models import User
+from redis.exceptions import RedisError
+from rest_framework.test import APIClient
+
+from server.testing import FakeRedis, create_members
+
+from .projection import DirectoryProjection, directory_projection
+
+
+class BrokenRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise RedisError("connection refused")
+
+        return fail
+
+
+class MemberDirectorySearchBase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer = User.objects.create(
+            username="viewer", discord_username="viewer", discord_id=-1
+        )
+        self.viewer.groups.add(Group.objects.create(name="is_verified"))
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+        self.redis = FakeRedis()
+        self.patcher = patch.object(directory_projection, "_redis", self.redis)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        super().tearDown()
+
+    def _search(self, query, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/directory/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+
+        searches = [q for q in queries.captured_queries if "LIKE" in q["sql"]]
+        return response.json(), searches
+
+    def _usernames(self, page):
+        return [member["username"] for member in page["results"]]
+
+
+class MemberDirectorySearchTests(MemberDirectorySearchBase):
+    def test_members_matching_several_terms_are_listed_once(self):
+        User.objects.create(
+            username="ada", first_name="Ada", last_name="Lovelace", discord_id=1
+        )
+        User.objects.create(username="lovelace_fan", first_name="Grace", discord_id=2)
+
+        page, _ = self._search("ada lovelace")
+
+        # case doesn't matter, and the closest match comes first
+        self.assertEqual(self._usernames(page), ["ada", "lovelace_fan"])
+        self.assertEqual(page["count"], 2)
+
+    def test_major_and_discord_username_are_searched(self):
+        create_members(0, 4)
+
+        page, _ = self._search("informatics")
+        self.assertEqual(self._usernames(page), ["member0", "member2"])
+
+        page, _ = self._search("discord3")
+        self.assertEqual(self._usernames(page), ["member3"])
+
+    def test_pages_are_one_query(self):
+        create_members(0, 45)
+
+        page, searches = self._search("member", page=2)
+
+        self.assertEqual(len(searches), 1)
+        self.assertEqual(page["count"], 45)
+        self.assertEqual(len(page["results"]), 20)
+        self.assertIsNotNone(page["next"])
+        self.assertIsNotNone(page["previous"])
+
+        self.assertEqual(
+            self.client.get(
+                "/directory/search/", {"q": "member", "page": 4}
+            ).status_code,
+            404,
+        )
+
+    def test_no_matches(self):
+        create_members(0, 3)
+
+        page, _ = self._search("nobody")
+        self.assertEqual(page["count"], 0)
+        self.assertEqual(page["results"], [])
+
+
+class MemberDirectorySearchBenchmark(MemberDirectorySearchBase):
+    def test_search_over_10k_members(self):
+        create_members(0, 10_000)
+        directory_projection.rebuild()
+
+        for query in ["member9999", "first12 last12", "informatics", "zzz"]:
+            start = time.perf_counter()
+            page, searches = self._search(query)
+            duration = (time.perf_counter() - start) * 1000
+            print(
+                f"search {query!r}: {page['count']} matches, "
+                f"{len(searches)} queries, {duration:.2f} ms"
+            )
+
+            self.assertEqual(len(searches), 1)
+
+        page, _ = self._search("member9999")
+        self.assertEqual(self._usernames(page), ["member9999"])
+
+
+class DirectoryProjectionTests(MemberDirectorySearchBase):
+    def setUp(self):
+        super().setUp()
+        self.users = create_members(0, 3)
+
+    def test_saving_a_member_rewrites_their_entries(self):
+        first = self.client.get("/directory/search/")
+        self.assertEqual(first.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            member = User.objects.get(username="member1")
+            member.first_name = "renamed"
+            member.save()
+
+        response = self.client.get(f"/directory/{member.id}/")
+        self.assertEqual(response.json()["first_name"], "renamed")
+        self.assertNotEqual(
+            self.client.get("/directory/search/").headers["ETag"], first.headers["ETag"]
+        )
+
+    def test_deleted_members_are_dropped(self):
+        self.client.get("/directory/search/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(username="member2").delete()
+
+        self.assertEqual(
+            self.client.get(f"/directory/{self.users[2].id}/").status_code, 404
+        )
+        self.assertNotIn(self.users[2].id, directory_projection.get_ids())
+
+    def test_refreshed_projection_is_still_rebuilt(self):
+        projection = DirectoryProjection(rebuild_after=60, redis=FakeRedis())
+        projection.rebuild()
+
+        # skips the signals, so only a rebuild picks it up
+        added = User.objects.bulk_create(
+            [User(username="added", discord_username="added", discord_id=-2)]
+        )[0]
+        projection.refresh([self.users[0].id])
+        self.assertNotIn(added.id, projection.get_ids())
+
+        # the last rebuild was over a minute ago
+        projection.redis.data[projection.meta_key][b"built_at"] = b"0"
+        projection.refresh([self.users[0].id])
+        self.assertIn(added.id, projection.get_ids())
+
+    def test_unchanged_directory_is_not_modified(self):
+        first = self.client.get("/directory/search/")
+
+        response = self.client.get(
+            "/directory/search/", HTTP_IF_NONE_MATCH=first.headers["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_entries_are_serialized_per_role(self):
+        regular = self.client.get(f"/directory/{self.users[0].id}/").json()
+
+        self.viewer.groups.add(Group.objects.create(name="is_admin"))
+        admin = self.client.get(f"/directory/{self.users[0].id}/").json()
+
+        self.assertNotIn("is_active", regular)
+        self.assertTrue(admin["is_active"])
+        self.assertNotIn("password", admin)
+
+        stored = self.redis.data[directory_projection.key("regular")]
+        self.assertEqual(orjson.loads(stored[str(self.users[0].id).encode()]), regular)
+
+    def test_recommendations_skip_the_viewer(self):
+        recommended = self.client.get("/directory/recommended/").json()
+
+        self.assertEqual(
+            sorted(member["username"] for member in recommended),
+            ["member0", "member1", "member2"],
+        )
+
+    def test_falls_back_to_the_db_without_redis(self):
+        with patch.object(directory_projection, "_redis", BrokenRedis()):
+            page, _ = self._search("member1")
+            member = self.client.get(f"/directory/{self.users[0].id}/")
+
+        self.assertEqual(self._usernames(page), ["member1"])
+        self.assertEqual(member.json()["username"], "member0")
+
+
+class DirectoryProjectionBenchmark(TestCase):
+    def test_page_is_cheaper_than_unpickling_everyone(self):
+        create_members(0, 5000)
+        projection = DirectoryProjection(redis=FakeRedis())
+        projection.rebuild()
+
+        pickled = pickle.dumps(list(User.objects.all()))
+        start = time.perf_counter()
+        pickle.loads(pickled)
+        unpickle = (time.perf_counter() - start) * 1000
+
+        user_ids = sorted(projection.get_ids())[:20]
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            members = projection.get_members("regular", user_ids)
+        page = (time.perf_counter() - start) * 1000
+
+        print(
+            f"unpickling 5000 members: {len(pickled)} bytes, {unpickle:.2f} ms; "
+            f"projection page of {len(members)}: {page:.2f} ms"
+        )
+        self.assertEqual(len(members), 20)
+        self.assertEqual(len(queries), 0)
@@ -2,19 +2,15 @@ import logging
 import random
 from datetime import date
 
-from cache import CachedView, DjangoCacheHandler
+from cache import conditional_response
 from custom_auth.permissions import IsAdmin, IsVerified
 from django.http import JsonResponse
-from members.models import User
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .managers import DirectoryManager
-from .serializers import (
-    AdminDirectoryMemberSerializer,
-    RegularDirectoryMemberSerializer,
-)
+from .projection import directory_projection
+from .search import SearchPaginator, search_members
 
 logger = logging.getLogger(__name__)
 
@@ -26,65 +22,53 @@ class StandardResultsSetPagination(PageNumberPagination):
 
 
 class BaseMemberDirectoryView:
-    def get_serializer_class(self, request):
+    projection = directory_projection
+
+    def get_role(self, request):
+        """which of the projection's roles `request` sees members as"""
         if IsAdmin.has_permission(self, request, None):
-            return AdminDirectoryMemberSerializer
-        return RegularDirectoryMemberSerializer
+            return "admin"
+        return "regular"
 
 
-class MemberDirectorySearchView(APIView, BaseMemberDirectoryView, CachedView):
-    permission_classes = [IsVerified]
-    pagination_class = StandardResultsSetPagination
+class SearchResultsPagination(StandardResultsSetPagination):
+    django_paginator_class = SearchPaginator
 
-    def generate_key():
-        return "user:all"
 
-    manager = DirectoryManager(DjangoCacheHandler(expiration=60 * 60), generate_key)
+class MemberDirectorySearchView(APIView, BaseMemberDirectoryView):
+    permission_classes = [IsVerified]
+    pagination_class = SearchResultsPagination
 
     def get(self, request):
         query = request.query_params.get("q", "")
         logger.info("Searching for members with query: %s", query)
 
-        members = self.manager.get_all()
+        role = self.get_role(request)
 
-        if query:
-            terms = query.split()
-            members = [
-                member
-                for term in terms
-                for member in members
-                if (
-                    term in member.username
-                    or term in member.first_name
-                    or term in member.last_name
-                )
-            ]
+        def build():
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(search_members(query), request)
+            members = self.projection.get_members(role, [row["id"] for row in page])
 
-        paginator = self.pagination_class()
-        paginated_members = paginator.paginate_queryset(members, request)
+            return paginator.get_paginated_response(members)
 
-        serializer_class = self.get_serializer_class(request)
-        serializer = serializer_class(paginated_members, many=True)
+        # admins see more of each member
+        return conditional_response(
+            request, [self.projection.get_version()], build, variant=role
+        )
 
-        return paginator.get_paginated_response(serializer.data)
 
-
-class MemberDirectoryView(APIView, BaseMemberDirectoryView, CachedView):
+class MemberDirectoryView(APIView, BaseMemberDirectoryView):
     permission_classes = [IsVerified]
 
-    def generate_key(**kwargs):
-        return f"user:member:{kwargs['id']}"
-
-    manager = DirectoryManager(DjangoCacheHandler(60 * 3), generate_key)
-
     def get(self, request, id):
-        try:
-            member = self.manager.get(id, serializer=self.get_serializer_class(request))
-            return Response(member)
-        except User.DoesNotExist:
+        members = self.projection.get_members(self.get_role(request), [id])
+        if not members:
             logger.error("Error retrieving user: user with id %s not found", id)
             return JsonResponse({"detail": "Member not found."}, status=404)
 
+        return Response(members[0])
+
 
 def simple_hash(s: str) -> int:
     h = 5381
@@ -93,7 +77,7 @@ def simple_hash(s: str) -> int:
     return h
 
 
-class RecommendedMembersView(APIView, BaseMemberDirectoryView, CachedView):
+class RecommendedMembersView(APIView, BaseMemberDirectoryView):
     permission_classes = [IsVerified]
 
     def get_daily_seed(self, username):
@@ -102,28 +86,26 @@ class RecommendedMembersView(APIView, BaseMemberDirectoryView, CachedView):
         seed_string = f"{username}:{today}"
         return simple_hash(seed_string)
 
-    def generate_key(**kwargs):
-        return "user:all"
-
-    manager = DirectoryManager(DjangoCacheHandler(60 * 60), generate_key)
-
     def get(self, request):
 
         try:
-            all_users = self.manager.get_all()
-            all_users.remove(request.user)
+            # sorted, so the seed alone decides the shuffle
+            user_ids = sorted(
+                user_id
+                for user_id in self.projection.get_ids()
+                if user_id != request.user.id
+            )
 
-            if not all_users:
+            if not user_ids:
                 return Response([])
 
             seed = self.get_daily_seed(request.user.username)
             r = random.Random(seed)
-            r.shuffle(all_users)
-            recommended = all_users[:5]
+            r.shuffle(user_ids)
 
-            serializer_class = self.get_serializer_class(request)
-            serializer = serializer_class(recommended, many=True)
-            return Response(serializer.data)
+            return Response(
+                self.projection.get_members(self.get_role(request), user_ids[:5])
+            )
 
         except Exception as e:
             logger.error("Error getting recommended members: %s", str(e))
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from engagement.models import AttendanceSession, AttendanceSessionStats
+from engagement.queries import CHECK_IN_ATTENDEES_QUERY
+from leaderboard.signals import stats_changed
+
+
+class ActiveSession(NamedTuple):
+    session_id: int
+    expires: datetime
+
+    def is_active(self):
+        return timezone.now() < self.expires
+
+
+class ActiveSessionCache:
+    """
+    session key -> the latest session using it, kept in process and in redis.
+
+    sessions are cached in redis until `expired_ttl` seconds after they
+    expire, and each worker trusts its own copy for at most `local_ttl`
+    seconds before checking redis again. saving or deleting a session drops
+    its key from both, so an extended, reused or deleted key is seen by every
+    worker within `local_ttl`. only keys redis doesn't know, e.g. unknown
+    ones, go to the db. sessions made through `CreateAttendanceSession` are
+    cached up front.
+    """
+
+    PREFIX = "engagement:attendance_session:"
+
+    def __init__(self, max_size=1024, local_ttl=5, expired_ttl=60):
+        self._max_size = max_size
+        self._local_ttl = local_ttl
+        self._expired_ttl = expired_ttl
+        # key -> (session, when it was cached in this worker)
+        self._sessions: Dict[str, Tuple[ActiveSession, float]] = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key):
+        return f"{self.PREFIX}{key}"
+
+    def _remember(self, key, session: ActiveSession):
+        with self._lock:
+            now = time.monotonic()
+            if len(self._sessions) >= self._max_size:
+                self._sessions = {
+                    k: entry
+                    for k, entry in self._sessions.items()
+                    if now < entry[1] + self._local_ttl
+                }
+            self._sessions[key] = (session, now)
+
+    def _store(self, key, session: ActiveSession):
+        self._remember(key, session)
+
+        remaining = (session.expires - timezone.now()).total_seconds()
+        cache.set(
+            self._cache_key(key),
+            tuple(session),
+            timeout=max(remaining, 0) + self._expired_ttl,
+        )
+
+    def add(self, session: AttendanceSession):
+        self._store(session.key, ActiveSession(session.session_id, session.expires))
+
+    def discard(self, key):
+        """forget `key`, e.g. after its session changed"""
+        with self._lock:
+            self._sessions.pop(key, None)
+        cache.delete(self._cache_key(key))
+
+    def get(self, key) -> Optional[ActiveSession]:
+        """
+        the latest session using `key`, which may have expired, or None if
+        there's no such session. a stale local copy is refreshed from redis,
+        only keys redis doesn't know reach the db.
+        """
+        entry = self._sessions.get(key)
+        if entry and time.monotonic() < entry[1] + self._local_ttl:
+            return entry[0]
+
+        # another worker may have created, changed or deleted the session
+        shared = cache.get(self._cache_key(key))
+        if shared:
+            session = ActiveSession(*shared)
+            self._remember(key, session)
+            return session
+
+        # Since we sort by expires and active sesions must have a unique key,
+        # the first result is the desired active session.
+        row = (
+            AttendanceSession.objects.filter(key=key)
+            .order_by("-expires")
+            .values_list("session_id", "expires")
+            .first()
+        )
+        if row is None:
+            with self._lock:
+                self._sessions.pop(key, None)
+            return None
+
+        session = ActiveSession(*row)
+        self._store(key, session)
+        return session
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._sessions)
+            self._sessions = {}
+        cache.delete_many([self._cache_key(key) for key in keys])
+
+
+active_sessions = ActiveSessionCache()
+
+
+def check_in(session_id: int, user_ids: List[int]) -> Set[int]:
+    """
+    add members to a session and count it towards their attendance stats.
+    returns the ids of the members that weren't already in the session.
+
+    this is a single statement, so concurrent check ins never lose a count
+    and never lock more than the rows they insert.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return set()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CHECK_IN_ATTENDEES_QUERY.format(
+                values=", ".join(["(%s, %s)"] * len(user_ids))
+            ),
+            [value for user_id in user_ids for value in (session_id, user_id)]
+            + [timezone.now()],
+        )
+        added = {row[0] for row in cursor.fetchall()}
+
+    # the stats were written behind the orm's back
+    if added:
+        stats_changed.send(sender=AttendanceSessionStats, member_ids=list(added))
+
+    return added
@@ -1,14 +1,27 @@
+import atexit
 import logging
+import os
+import signal
 import threading
 import time
+import uuid
 from collections import defaultdict
-from typing import Dict
+from datetime import timedelta
+from typing import Dict, List, Optional, Union
 
-from django.db import transaction
-from django.db.models import F
-from engagement.models import DiscordMessageStats
-from members.models import User
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from engagement.queries import (
+    PRUNE_MESSAGE_COUNT_DRAINS_QUERY,
+    RECORD_MESSAGE_COUNT_DRAIN_QUERY,
+    UPSERT_DISCORD_MESSAGE_STATS_QUERY,
+)
+from members.discord import discord_resolver
 from pydantic import BaseModel
+from redis.exceptions import RedisError, ResponseError
+
+from server.settings import MESSAGE_BUFFER_BACKEND
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +32,18 @@ class Message(BaseModel):
 
 
 class MessageBuffer:
-    def __init__(self, batch_size=200, max_size=1000, flush_interval=120):
+    """
+    bounded in-memory buffer of discord messages, drained into
+    `DiscordMessageStats` by a background flusher thread.
+
+    `add_message` never touches the db: the flusher wakes every
+    `flush_interval` seconds, or as soon as `batch_size` messages are queued.
+    messages arriving while `max_size` messages are queued are dropped.
+    """
+
+    def __init__(
+        self, batch_size=200, max_size=1000, flush_interval=120, background=True
+    ):
         self._buffer = []
         self._lock = threading.Lock()
         self._last_flush = time.time()
@@ -28,19 +52,121 @@ class MessageBuffer:
         self._max_size = max_size
         self._flush_interval = flush_interval
 
+        # serializes flushes between the flusher thread and shutdown
+        self._flush_lock = threading.Lock()
+
+        self._background = background
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+        self._dropped = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._last_flush_latency = 0.0
+        self._max_flush_latency = 0.0
+
     def add_message(self, message: Message) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: List[Message]) -> int:
+        """buffer messages under a single lock, returns how many were accepted"""
+        if self._background:
+            self._ensure_flusher()
+
         with self._lock:
-            if len(self._buffer) >= self._max_size:
-                logger.error("buffer full, dropping message")
+            accepted = messages[: max(self._max_size - len(self._buffer), 0)]
+            dropped = len(messages) - len(accepted)
+
+            self._buffer.extend(accepted)
+            self._dropped += dropped
+            should_flush = dropped or len(self._buffer) >= self._batch_size
+
+        if dropped:
+            logger.error(f"buffer full, dropping {dropped} messages")
+        if should_flush:
+            self._wakeup.set()
+
+        return len(accepted)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            queued = len(self._buffer)
+
+        return {
+            "pid": os.getpid(),
+            "queued": queued,
+            "dropped": self._dropped,
+            "flushed": self._flushed,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "last_flush_latency_ms": round(self._last_flush_latency * 1000, 2),
+            "max_flush_latency_ms": round(self._max_flush_latency * 1000, 2),
+        }
+
+    def _ensure_flusher(self) -> None:
+        # one flusher per process, restarted if we were forked after it started
+        if self._flusher_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._flusher_pid == os.getpid():
                 return
 
-            self._buffer.append(message)
-            should_flush = (
-                len(self._buffer) >= self._batch_size
-                or time.time() - self._last_flush >= self._flush_interval
+            self._stopping.clear()
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="message-buffer-flusher", daemon=True
             )
+            self._flusher.start()
+            self._flusher_pid = os.getpid()
 
-        if should_flush:
+        atexit.register(self.shutdown)
+        self._install_sigterm_handler()
+
+    def _install_sigterm_handler(self) -> None:
+        # signal handlers can only be installed from the main thread
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            # don't flush inside the handler: the interrupted frame may hold
+            # the buffer lock. the flusher drains, and atexit waits for it.
+            self._stopping.set()
+            self._wakeup.set()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                raise SystemExit(0)
+
+        try:
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            logger.warning("could not install SIGTERM handler for message buffer")
+
+    def _run_flusher(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(timeout=self._flush_interval)
+            self._wakeup.clear()
+            self.flush_to_db()
+            # the flusher owns its own db connection, don't let it go stale
+            close_old_connections()
+
+        self.flush_to_db()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """stop the flusher and drain whatever is still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+
+        flusher = self._flusher
+        if flusher and flusher.is_alive() and flusher is not threading.current_thread():
+            flusher.join(timeout=timeout)
+
+        if self._buffer:
             self.flush_to_db()
 
     def _aggregate(self, messages) -> Dict[int, Dict[int, int]]:
@@ -49,11 +175,24 @@ class MessageBuffer:
             result[msg.channel_id][msg.discord_id] += 1
         return result
 
+    def _has_pending(self) -> bool:
+        return bool(self._buffer)
+
     def flush_to_db(self) -> None:
-        try:
-            self._flush_to_db()
-        except Exception as e:
-            logger.exception(f"flush error: {e}")
+        if not self._has_pending():
+            return
+
+        with self._flush_lock:
+            start = time.perf_counter()
+            try:
+                self._flush_to_db()
+            except Exception as e:
+                self._failed_flushes += 1
+                logger.exception(f"flush error: {e}")
+            finally:
+                latency = time.perf_counter() - start
+                self._last_flush_latency = latency
+                self._max_flush_latency = max(self._max_flush_latency, latency)
 
     def _flush_to_db(self) -> None:
         if not self._buffer:
@@ -68,79 +207,14 @@ class MessageBuffer:
             return
 
         try:
-            with transaction.atomic():
-                aggregated = self._aggregate(messages)
-                if not aggregated:
-                    return
-
-                discord_ids = {
-                    discord_id
-                    for counts in aggregated.values()
-                    for discord_id in counts
-                }
-
-                users = User.objects.filter(discord_id__in=discord_ids).values(
-                    "id", "discord_id"
-                )
-                user_map = {u["discord_id"]: u["id"] for u in users}
-
-                missing = discord_ids - user_map.keys()
-                if missing:
-                    logger.warning(f"missing users: {list(missing)[:10]}")
-
-                for counts in aggregated.values():
-                    counts = {k: v for k, v in counts.items() if k in user_map}
-
-                stats_count = 0
-                for channel_id, channel_counts in aggregated.items():
-                    if not channel_counts:
-                        continue
-
-                    create_batch = [
-                        DiscordMessageStats(
-                            member_id=user_map[discord_id],
-                            channel_id=channel_id,
-                            message_count=0,
-                        )
-                        for discord_id in channel_counts
-                        if discord_id in user_map
-                    ]
-
-                    DiscordMessageStats.objects.bulk_create(
-                        create_batch, ignore_conflicts=True
-                    )
-
-                    stats = DiscordMessageStats.objects.filter(
-                        member_id__in=[m.member_id for m in create_batch],
-                        channel_id=channel_id,
-                    ).values("channel_id", "member_id", "id")
-
-                    stats_map = {
-                        (int(s["member_id"]), int(s["channel_id"])): int(s["id"])
-                        for s in stats
-                    }
-
-                    update_batch = [
-                        DiscordMessageStats(
-                            id=stats_map[(member_id, channel_id)],
-                            member_id=member_id,
-                            channel_id=channel_id,
-                            message_count=F("message_count") + count,
-                        )
-                        for discord_id, count in channel_counts.items()
-                        if discord_id in user_map
-                        and ((member_id := user_map[discord_id]), channel_id)
-                        in stats_map
-                    ]
-
-                    DiscordMessageStats.objects.bulk_update(
-                        update_batch, ["message_count"]
-                    )
-                    stats_count += len(update_batch)
-
-                logger.info(
-                    f"flushed {len(messages)} messages across {len(aggregated)} channels to db, updated {stats_count} stats"
-                )
+            aggregated = self._aggregate(messages)
+            stats_count = self._write_counts(aggregated)
+
+            self._flushes += 1
+            self._flushed += len(messages)
+            logger.info(
+                f"flushed {len(messages)} messages across {len(aggregated)} channels to db, updated {stats_count} stats"
+            )
 
         except Exception as e:
             logger.exception(f"flush failed: {e}")
@@ -148,9 +222,199 @@ class MessageBuffer:
                 self._buffer.extend(messages)
             raise
 
-    def __del__(self):
-        if self._buffer:
+    def _write_counts(self, aggregated: Dict[int, Dict[int, int]]) -> int:
+        """upsert channel_id -> discord_id -> count, returns the number of stats"""
+        discord_ids = {
+            discord_id for counts in aggregated.values() for discord_id in counts
+        }
+        user_map = discord_resolver.resolve_many(discord_ids)
+
+        missing = discord_ids - user_map.keys()
+        if missing:
+            logger.warning(f"missing users: {list(missing)[:10]}")
+
+        rows = [
+            (user_map[discord_id], str(channel_id), count)
+            for channel_id, channel_counts in aggregated.items()
+            for discord_id, count in channel_counts.items()
+            if discord_id in user_map
+        ]
+        if not rows:
+            return 0
+
+        # single statement, so the whole batch is applied atomically
+        with connection.cursor() as cursor:
+            cursor.execute(
+                UPSERT_DISCORD_MESSAGE_STATS_QUERY.format(
+                    values=", ".join(["(%s, %s, %s)"] * len(rows))
+                ),
+                [value for row in rows for value in row],
+            )
+
+        return len(rows)
+
+
+class RedisMessageBuffer(MessageBuffer):
+    """
+    message counts shared by every worker through a redis hash.
+
+    each message is a single HINCRBY (one pipeline per batch) on `channel_id:discord_id`, so counts
+    survive worker restarts and `max_size` applies to the local fallback
+    only. every worker runs a flusher, but only the one holding the flush
+    lock drains the hash: it is renamed out of the way (new messages land in
+    a fresh hash), given a drain id, written with one upsert and then
+    deleted. a drain that fails leaves the renamed hash behind and is retried
+    on the next flush.
+
+    the upsert records the drain id in the same transaction, so a drain
+    that's retried after its hash outlived the write (e.g. the lock expired
+    before the hash was deleted) isn't counted twice.
+
+    if redis is unreachable, messages fall back to the in-memory buffer.
+    """
+
+    COUNTS_KEY = "engagement:message_counts"
+    FLUSHING_KEY = "engagement:message_counts:flushing"
+    LOCK_KEY = "engagement:message_counts:lock"
+    DRAIN_ID_FIELD = "drain_id"
+
+    # deletes every key in KEYS if the lock in KEYS[1] is still held with ARGV[1]
+    RELEASE_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", unpack(KEYS))
+    end
+    return 0
+    """
+
+    # how long a drain can be retried without being counted twice
+    DRAIN_RETENTION = timedelta(days=7)
+
+    def __init__(self, *args, redis=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._redis = redis
+        self._redis_errors = 0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def add_messages(self, messages: List[Message]) -> int:
+        if self._background:
+            self._ensure_flusher()
+
+        counts = defaultdict(int)
+        for message in messages:
+            counts[f"{message.channel_id}:{message.discord_id}"] += 1
+
+        try:
+            # one round trip, applied all-or-nothing so a fallback can't double count
+            pipe = self.redis.pipeline()
+            for field, count in counts.items():
+                pipe.hincrby(self.COUNTS_KEY, field, count)
+            pipe.execute()
+            return len(messages)
+        except RedisError as e:
+            self._redis_errors += 1
+            logger.error(f"redis unavailable, buffering messages locally: {e}")
+            return super().add_messages(messages)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        stats = super().stats()
+        stats["redis_errors"] = self._redis_errors
+        try:
+            stats["shared_queued"] = self.redis.hlen(self.COUNTS_KEY)
+        except RedisError:
+            stats["shared_queued"] = -1
+        return stats
+
+    def _has_pending(self) -> bool:
+        # the shared hash is always worth checking, even with no local messages
+        return True
+
+    def _flush_to_db(self) -> None:
+        # drain anything that fell back to local memory first
+        super()._flush_to_db()
+
+        token = uuid.uuid4().hex
+        lock_timeout_ms = max(int(self._flush_interval * 1000), 30_000)
+        if not self.redis.set(self.LOCK_KEY, token, nx=True, px=lock_timeout_ms):
+            return
+
+        try:
+            self._drain_shared_counts(token)
+        finally:
+            self._release(token, self.LOCK_KEY)
+
+    def _holds_lock(self, token: str) -> bool:
+        return self.redis.get(self.LOCK_KEY) == token.encode()
+
+    def _release(self, token: str, *keys: str) -> bool:
+        """delete `keys` and the lock, only if `token` still holds the lock"""
+        return bool(
+            self.redis.eval(
+                self.RELEASE_SCRIPT, len(keys) + 1, self.LOCK_KEY, *keys, token
+            )
+        )
+
+    def _record_drain(self, drain_id: str) -> bool:
+        """record `drain_id` as applied, false if it already was"""
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                PRUNE_MESSAGE_COUNT_DRAINS_QUERY, [now - self.DRAIN_RETENTION]
+            )
+            cursor.execute(RECORD_MESSAGE_COUNT_DRAIN_QUERY, [drain_id, now])
+            return cursor.rowcount > 0
+
+    def _drain_shared_counts(self, token: str) -> None:
+        # a leftover FLUSHING_KEY is a previous drain that didn't finish
+        if not self.redis.exists(self.FLUSHING_KEY):
             try:
-                self.flush_to_db()
-            except Exception as e:
-                logger.exception(f"shutdown flush failed: {e}")
+                self.redis.rename(self.COUNTS_KEY, self.FLUSHING_KEY)
+            except ResponseError:
+                # nothing has been counted since the last drain
+                return
+
+        # kept by a retried drain, so it's recognized if it was already applied
+        self.redis.hsetnx(self.FLUSHING_KEY, self.DRAIN_ID_FIELD, uuid.uuid4().hex)
+        counts = self.redis.hgetall(self.FLUSHING_KEY)
+        drain_id = counts.pop(self.DRAIN_ID_FIELD.encode()).decode()
+
+        aggregated = defaultdict(lambda: defaultdict(int))
+        messages = 0
+        for field, count in counts.items():
+            channel_id, discord_id = field.decode().split(":")
+            aggregated[int(channel_id)][int(discord_id)] += int(count)
+            messages += int(count)
+
+        if not self._holds_lock(token):
+            logger.warning(f"lost the flush lock before writing drain {drain_id}")
+            return
+
+        with transaction.atomic():
+            applied = self._record_drain(drain_id)
+            stats_count = (
+                self._write_counts(aggregated) if applied and aggregated else 0
+            )
+
+        if not self._release(token, self.FLUSHING_KEY):
+            # the next lock holder retries it, and skips the write
+            logger.warning(f"lost the flush lock before deleting drain {drain_id}")
+
+        if not applied:
+            logger.info(f"drain {drain_id} was already applied, dropped it")
+            return
+
+        self._flushes += 1
+        self._flushed += messages
+        logger.info(
+            f"drained {messages} shared messages across {len(aggregated)} channels to db, updated {stats_count} stats"
+        )
+
+
+def get_message_buffer() -> MessageBuffer:
+    if MESSAGE_BUFFER_BACKEND == "redis":
+        return RedisMessageBuffer()
+    return MessageBuffer()
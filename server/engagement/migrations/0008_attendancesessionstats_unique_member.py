@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_stats(apps, schema_editor):
+    # keep the most recent row for each member, the rebuild recounts them anyway
+    AttendanceSessionStats = apps.get_model("engagement", "AttendanceSessionStats")
+    keep = (
+        AttendanceSessionStats.objects.values("member")
+        .annotate(keep=Max("id"))
+        .values("keep")
+    )
+    AttendanceSessionStats.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("engagement", "0007_cohortstats_last_updated_cohortstats_streak"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_stats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="attendancesessionstats",
+            constraint=models.UniqueConstraint(
+                fields=("member",), name="unique_attendance_session_stats"
+            ),
+        ),
+    ]
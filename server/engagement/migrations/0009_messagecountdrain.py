@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("engagement", "0008_attendancesessionstats_unique_member"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageCountDrain",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("drain_id", models.CharField(max_length=32, unique=True)),
+                (
+                    "drained_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
@@ -21,6 +21,7 @@ class AttendanceSession(models.Model):
             self.expires = self.expires.astimezone(timezone.utc)
 
         # Key must be unique for active sessions
+        # checked against the db, a cached session can be seconds out of date
         if not self.pk:
             active_session = AttendanceSession.objects.filter(
                 key=self.key, expires__gt=timezone.now()
@@ -63,6 +64,13 @@ class AttendanceSessionStats(models.Model):
     sessions_attended = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member"], name="unique_attendance_session_stats"
+            )
+        ]
+
     def __str__(self):
         return f"{self.member.username}: {self.sessions_attended}"
 
@@ -79,3 +87,13 @@ class CohortStats(models.Model):
     dailyChecks = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
     streak = models.IntegerField(default=0)
+
+
+class MessageCountDrain(models.Model):
+    """a drain of the shared message counts that made it to the db, see `RedisMessageBuffer`"""
+
+    drain_id = models.CharField(max_length=32, unique=True)
+    drained_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.drain_id} - {self.drained_at}"
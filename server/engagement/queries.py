@@ -0,0 +1,41 @@
+# one row per (member_id, channel_id, message_count) is appended to VALUES
+UPSERT_DISCORD_MESSAGE_STATS_QUERY = """
+INSERT INTO engagement_discordmessagestats (member_id, channel_id, message_count)
+VALUES {values}
+ON CONFLICT (member_id, channel_id) DO UPDATE
+SET message_count = engagement_discordmessagestats.message_count
+    + EXCLUDED.message_count;
+"""
+
+# records a drain of the shared message counts, in the same transaction as
+# its upsert. no row is inserted if the drain was already applied.
+RECORD_MESSAGE_COUNT_DRAIN_QUERY = """
+INSERT INTO engagement_messagecountdrain (drain_id, drained_at)
+VALUES (%s, %s)
+ON CONFLICT (drain_id) DO NOTHING;
+"""
+
+# drains older than the cutoff can't be retried anymore
+PRUNE_MESSAGE_COUNT_DRAINS_QUERY = """
+DELETE FROM engagement_messagecountdrain WHERE drained_at < %s;
+"""
+
+# one (attendancesession_id, user_id) row per check in is appended to VALUES,
+# followed by the last_updated timestamp. attendees already in the session are
+# skipped, everyone else is added and has their sessions_attended bumped in
+# the same statement. returns the ids of the members that were added.
+CHECK_IN_ATTENDEES_QUERY = """
+WITH added AS (
+    INSERT INTO engagement_attendancesession_attendees (attendancesession_id, user_id)
+    VALUES {values}
+    ON CONFLICT (attendancesession_id, user_id) DO NOTHING
+    RETURNING user_id
+)
+INSERT INTO engagement_attendancesessionstats (member_id, sessions_attended, last_updated)
+SELECT user_id, COUNT(*), %s FROM added GROUP BY user_id
+ON CONFLICT (member_id) DO UPDATE
+SET sessions_attended = engagement_attendancesessionstats.sessions_attended
+    + EXCLUDED.sessions_attended,
+    last_updated = EXCLUDED.last_updated
+RETURNING member_id;
+"""
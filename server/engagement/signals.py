@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .attendance import active_sessions
+from .models import AttendanceSession
+
+
+@receiver(post_save, sender=AttendanceSession)
+@receiver(post_delete, sender=AttendanceSession)
+def forget_cached_session(sender, instance, **kwargs):
+    # e.g. an extended expiry or a deleted session, the next lookup reloads it
+    active_sessions.discard(instance.key)
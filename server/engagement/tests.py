@@ -1,12 +1,27 @@
+import threading
 from datetime import timedelta
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
+from members.discord import DiscordIdResolver
 from members.models import User
+from redis.exceptions import ConnectionError
 from rest_framework.test import APIClient
 
-from .models import AttendanceSession
+from server.testing import FakeRedis
+
+from .attendance import ActiveSessionCache, active_sessions, check_in
+from .buffer import Message, MessageBuffer, RedisMessageBuffer
+from .models import (
+    AttendanceSession,
+    AttendanceSessionStats,
+    DiscordMessageStats,
+    MessageCountDrain,
+)
 
 
 class AuthenticatedTestCase(TestCase):
@@ -50,6 +65,14 @@ class AuthenticatedTestCase(TestCase):
 class AttendanceAPITests(AuthenticatedTestCase):
     def setUp(self):
         super().setUp()
+        # sessions cached by earlier tests were rolled back with their db
+        active_sessions.clear()
+        # shares nothing with earlier tests, so member lookups are counted
+        self.resolver_patcher = patch(
+            "engagement.views.discord_resolver",
+            DiscordIdResolver(redis=FakeRedis()),
+        )
+        self.resolver_patcher.start()
         self.client = APIClient()
         # Create test user
         self.user = User.objects.create(
@@ -74,6 +97,10 @@ class AttendanceAPITests(AuthenticatedTestCase):
             .replace("+00:00", "Z"),
         )
 
+    def tearDown(self):
+        self.resolver_patcher.stop()
+        super().tearDown()
+
     def test_create_session(self):
         response = self.client.post(
             "/engagement/attendance/session",
@@ -177,7 +204,542 @@ class AttendanceAPITests(AuthenticatedTestCase):
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.data["error"], "Member not found")
 
+    def test_attend_session_twice_counts_once(self):
+        # session and member (until they're cached) and check in. the
+        # leaderboards are patched once the request commits
+        for num_queries in (3, 1):
+            with self.assertNumQueries(num_queries):
+                response = self.client.post(
+                    "/engagement/attendance/attend",
+                    {"session_key": "test-key", "discord_id": "123456789"},
+                )
+
+        self.assertResponse(response, 400)
+        self.assertEqual(response.data["error"], "User already in session")
+        self.assertEqual(
+            AttendanceSessionStats.objects.get(member=self.user).sessions_attended, 1
+        )
+
+    def test_created_session_is_resolved_without_the_db(self):
+        response = self.client.post(
+            "/engagement/attendance/session",
+            {
+                "title": "New Session",
+                "key": "new-key",
+                "expires": (timezone.now() + timedelta(hours=1))
+                .isoformat()
+                .replace("+00:00", "Z"),
+            },
+        )
+        self.assertResponse(response, 201)
+
+        with self.assertNumQueries(0):
+            session = active_sessions.get("new-key")
+
+        self.assertEqual(session.session_id, response.data["session"]["session_id"])
+        self.assertTrue(session.is_active())
+
+    def test_extended_session_is_picked_up(self):
+        response = self.client.post(
+            "/engagement/attendance/attend",
+            {"session_key": "expired-key", "discord_id": "123456789"},
+        )
+        self.assertResponse(response, 400)
+        self.assertEqual(response.data["error"], "Session has expired")
+
+        session = AttendanceSession.objects.get(key="expired-key")
+        session.expires = timezone.now() + timedelta(hours=1)
+        session.save()
+
+        response = self.client.post(
+            "/engagement/attendance/attend",
+            {"session_key": "expired-key", "discord_id": "123456789"},
+        )
+        self.assertResponse(response, 201)
+
+    def test_deleted_session_is_not_found(self):
+        self.assertIsNotNone(active_sessions.get("test-key"))
+
+        self.session.delete()
+
+        response = self.client.post(
+            "/engagement/attendance/attend",
+            {"session_key": "test-key", "discord_id": "123456789"},
+        )
+        self.assertResponse(response, 404)
+        self.assertEqual(response.data["error"], "Session not found")
+
+    def test_stale_local_session_is_read_from_redis(self):
+        sessions = ActiveSessionCache(local_ttl=0)
+        shared = LocMemCache("attendance-tests", {})
+        with patch("engagement.attendance.cache", shared):
+            self.assertEqual(sessions.get("test-key").session_id, self.session.pk)
+            self.assertFalse(sessions.get("expired-key").is_active())
+
+            # every local copy is already stale
+            with self.assertNumQueries(0):
+                self.assertEqual(sessions.get("test-key").session_id, self.session.pk)
+                self.assertFalse(sessions.get("expired-key").is_active())
+
+    def test_overlapping_key_is_rejected_without_a_cached_session(self):
+        active_sessions.clear()
+
+        with self.assertRaises(ValidationError):
+            AttendanceSession.objects.create(
+                title="Overlapping Session",
+                key="test-key",
+                expires=timezone.now() + timedelta(hours=1),
+            )
+
+    def test_expired_key_can_be_reused(self):
+        self.assertFalse(active_sessions.get("expired-key").is_active())
+
+        response = self.client.post(
+            "/engagement/attendance/session",
+            {
+                "title": "New Session",
+                "key": "expired-key",
+                "expires": (timezone.now() + timedelta(hours=1))
+                .isoformat()
+                .replace("+00:00", "Z"),
+            },
+        )
+        self.assertResponse(response, 201)
+
+        response = self.client.post(
+            "/engagement/attendance/attend",
+            {"session_key": "expired-key", "discord_id": "123456789"},
+        )
+        self.assertResponse(response, 201)
+
+    def test_bulk_attend_session(self):
+        self.session.attendees.add(self.user2)
+
+        # session, members and check in
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                "/engagement/attendance/attend/bulk",
+                {
+                    "session_key": "test-key",
+                    "discord_ids": ["123456789", 987654321, 555, 123456789],
+                },
+                format="json",
+            )
+
+        self.assertResponse(response, 200)
+        self.assertEqual(
+            response.data,
+            {"added": [123456789], "already_present": [987654321], "unknown": [555]},
+        )
+        self.assertEqual(self.session.attendees.count(), 2)
+        self.assertEqual(
+            AttendanceSessionStats.objects.get(member=self.user).sessions_attended, 1
+        )
+
+    def test_bulk_attend_expired_session(self):
+        response = self.client.post(
+            "/engagement/attendance/attend/bulk",
+            {"session_key": "expired-key", "discord_ids": [123456789]},
+            format="json",
+        )
+        self.assertResponse(response, 400)
+        self.assertEqual(response.data["error"], "Session has expired")
+
+    def test_bulk_attend_invalid_discord_ids(self):
+        response = self.client.post(
+            "/engagement/attendance/attend/bulk",
+            {"session_key": "test-key", "discord_ids": ["not-an-id"]},
+            format="json",
+        )
+        self.assertResponse(response, 400)
+        self.assertFalse(self.session.attendees.exists())
+
     def test_get_user_with_multiple_attendance(self):
         self.session.attendees.add(self.user, self.user2)
         response = self.client.get(f"/engagement/attendance/member/{self.user.id}/")
         self.assertEqual(response.status_code, 200)
+
+
+class ConcurrentCheckInTests(TransactionTestCase):
+    def test_concurrent_check_ins_are_counted_exactly_once(self):
+        users = User.objects.bulk_create(
+            [
+                User(username=f"member{i}", discord_id=i, discord_username=f"m{i}")
+                for i in range(20)
+            ]
+        )
+        sessions = [
+            AttendanceSession.objects.create(
+                title=key, key=key, expires=timezone.now() + timedelta(hours=1)
+            )
+            for key in ("a", "b")
+        ]
+        added = []
+
+        def attend(session, user):
+            try:
+                added.extend(check_in(session.session_id, [user.id]))
+            finally:
+                connection.close()
+
+        # every member checks in to both sessions, twice
+        threads = [
+            threading.Thread(target=attend, args=(session, user))
+            for _ in range(2)
+            for session in sessions
+            for user in users
+        ]
+        with patch("engagement.attendance.stats_changed.send"):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(added), 40)
+        self.assertEqual(
+            set(
+                AttendanceSessionStats.objects.values_list(
+                    "sessions_attended", flat=True
+                )
+            ),
+            {2},
+        )
+        self.assertEqual(AttendanceSessionStats.objects.count(), 20)
+        for session in sessions:
+            self.assertEqual(session.attendees.count(), 20)
+
+
+class MessageBufferTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(
+            discord_id=123456789, discord_username="test_user"
+        )
+        self.user2 = User.objects.create(
+            username="2", discord_id=987654321, discord_username="test_user2"
+        )
+        self.buffer = MessageBuffer(
+            batch_size=1000, flush_interval=3600, background=False
+        )
+        self.resolver_patcher = patch(
+            "engagement.buffer.discord_resolver",
+            DiscordIdResolver(redis=FakeRedis()),
+        )
+        self.resolver_patcher.start()
+
+    def tearDown(self):
+        super().tearDown()
+        self.resolver_patcher.stop()
+
+    def _add(self, discord_id, channel_id, count=1):
+        for _ in range(count):
+            self.buffer.add_message(
+                Message(discord_id=discord_id, channel_id=channel_id)
+            )
+
+    def _count(self, user, channel_id):
+        return DiscordMessageStats.objects.get(
+            member=user, channel_id=str(channel_id)
+        ).message_count
+
+    def test_flush_upserts_all_channels_in_one_statement(self):
+        self._add(123456789, 1, count=3)
+        self._add(123456789, 2)
+        self._add(987654321, 1, count=2)
+        self._add(555555555, 1)  # unknown member is skipped
+
+        # user lookup + upsert
+        with self.assertNumQueries(2):
+            self.buffer.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 3)
+        self.assertEqual(self._count(self.user, 2), 1)
+        self.assertEqual(self._count(self.user2, 1), 2)
+        self.assertEqual(DiscordMessageStats.objects.count(), 3)
+
+    def test_flush_increments_existing_stats_with_cached_members(self):
+        self._add(123456789, 1, count=2)
+        self.buffer.flush_to_db()
+
+        self._add(123456789, 1, count=5)
+        self._add(987654321, 3)
+
+        # only the new member needs a lookup
+        with self.assertNumQueries(2):
+            self.buffer.flush_to_db()
+
+        self._add(123456789, 1)
+        self._add(987654321, 3)
+
+        with self.assertNumQueries(1):
+            self.buffer.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 8)
+        self.assertEqual(self._count(self.user2, 3), 2)
+
+
+class MessageBufferFlusherTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flushed = []
+        self.flush_threads = []
+        self.batch_flushed = threading.Event()
+
+        self.buffer = MessageBuffer(batch_size=3, max_size=5, flush_interval=3600)
+        self.flush_patcher = patch.object(
+            self.buffer, "_flush_to_db", side_effect=self._fake_flush
+        )
+        self.flush_patcher.start()
+
+    def tearDown(self):
+        self.buffer.shutdown(timeout=1)
+        self.flush_patcher.stop()
+        super().tearDown()
+
+    def _fake_flush(self):
+        with self.buffer._lock:
+            messages = self.buffer._buffer[:]
+            self.buffer._buffer.clear()
+        self.flushed.extend(messages)
+        self.flush_threads.append(threading.current_thread())
+        self.batch_flushed.set()
+
+    def _add(self, count):
+        for i in range(count):
+            self.buffer.add_message(Message(discord_id=i, channel_id=1))
+
+    def test_batch_is_flushed_off_the_request_thread(self):
+        self._add(2)
+        self.assertEqual(self.flushed, [])
+
+        self._add(1)
+        self.assertTrue(self.batch_flushed.wait(timeout=5))
+
+        self.assertEqual(len(self.flushed), 3)
+        self.assertNotIn(threading.current_thread(), self.flush_threads)
+
+    def test_full_buffer_drops_and_counts(self):
+        # hold the flusher off so the buffer fills up
+        with self.buffer._flush_lock:
+            self._add(7)
+            stats = self.buffer.stats()
+
+        self.assertEqual(stats["queued"], 5)
+        self.assertEqual(stats["dropped"], 2)
+
+    def test_shutdown_drains_buffer(self):
+        self._add(2)
+        self.buffer.shutdown(timeout=1)
+
+        self.assertEqual(len(self.flushed), 2)
+        self.assertFalse(self.buffer._flusher.is_alive())
+
+
+class RedisMessageBufferTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(
+            discord_id=123456789, discord_username="test_user"
+        )
+        self.user2 = User.objects.create(
+            username="2", discord_id=987654321, discord_username="test_user2"
+        )
+        self.redis = FakeRedis()
+        # two gunicorn workers sharing the same redis
+        self.workers = [
+            RedisMessageBuffer(redis=self.redis, background=False) for _ in range(2)
+        ]
+
+    def _count(self, user, channel_id):
+        return DiscordMessageStats.objects.get(
+            member=user, channel_id=str(channel_id)
+        ).message_count
+
+    def test_counts_from_all_workers_are_drained_once(self):
+        first, second = self.workers
+        for _ in range(3):
+            first.add_message(Message(discord_id=123456789, channel_id=1))
+        second.add_message(Message(discord_id=123456789, channel_id=1))
+        second.add_message(Message(discord_id=987654321, channel_id=2))
+
+        self.assertEqual(self.redis.hlen(RedisMessageBuffer.COUNTS_KEY), 2)
+        self.assertEqual(first._buffer, [])
+
+        second.flush_to_db()
+        first.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 4)
+        self.assertEqual(self._count(self.user2, 2), 1)
+        self.assertEqual(self.redis.data, {})
+
+    def test_only_lock_holder_drains(self):
+        first, second = self.workers
+        first.add_message(Message(discord_id=123456789, channel_id=1))
+        self.redis.set(RedisMessageBuffer.LOCK_KEY, "other-worker", nx=True)
+
+        second.flush_to_db()
+
+        self.assertFalse(DiscordMessageStats.objects.exists())
+        self.assertEqual(self.redis.hlen(RedisMessageBuffer.COUNTS_KEY), 1)
+
+    def test_failed_drain_is_retried(self):
+        first, _ = self.workers
+        first.add_message(Message(discord_id=123456789, channel_id=1))
+
+        with patch.object(first, "_write_counts", side_effect=RuntimeError("db")):
+            first.flush_to_db()
+
+        # the count and its drain id
+        self.assertEqual(self.redis.hlen(RedisMessageBuffer.FLUSHING_KEY), 2)
+        self.assertNotIn(RedisMessageBuffer.LOCK_KEY, self.redis.data)
+
+        first.add_message(Message(discord_id=123456789, channel_id=1))
+        first.flush_to_db()
+        first.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 2)
+        self.assertEqual(self.redis.data, {})
+
+    def test_drain_outliving_its_lock_is_applied_once(self):
+        first, second = self.workers
+        first.add_message(Message(discord_id=123456789, channel_id=1))
+
+        write_counts = first._write_counts
+
+        def write_and_lose_lock(aggregated):
+            stats_count = write_counts(aggregated)
+            # the lock expired mid drain, and another worker took it
+            self.redis.data[RedisMessageBuffer.LOCK_KEY] = b"other-worker"
+            return stats_count
+
+        with patch.object(first, "_write_counts", side_effect=write_and_lose_lock):
+            first.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 1)
+        self.assertEqual(self.redis.hlen(RedisMessageBuffer.FLUSHING_KEY), 2)
+        self.assertEqual(self.redis.get(RedisMessageBuffer.LOCK_KEY), b"other-worker")
+
+        self.redis.delete(RedisMessageBuffer.LOCK_KEY)
+        second.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 1)
+        self.assertEqual(self.redis.data, {})
+
+    def test_lost_lock_is_not_written(self):
+        first, _ = self.workers
+        first.add_message(Message(discord_id=123456789, channel_id=1))
+
+        hgetall = self.redis.hgetall
+
+        def read_and_lose_lock(key):
+            self.redis.data[RedisMessageBuffer.LOCK_KEY] = b"other-worker"
+            return hgetall(key)
+
+        with patch.object(self.redis, "hgetall", side_effect=read_and_lose_lock):
+            first.flush_to_db()
+
+        self.assertFalse(DiscordMessageStats.objects.exists())
+        self.assertEqual(self.redis.hlen(RedisMessageBuffer.FLUSHING_KEY), 2)
+        self.assertFalse(MessageCountDrain.objects.exists())
+
+    def test_batch_is_one_pipeline(self):
+        first, _ = self.workers
+        messages = [Message(discord_id=123456789, channel_id=1)] * 3 + [
+            Message(discord_id=987654321, channel_id=1)
+        ]
+
+        with patch.object(
+            self.redis, "pipeline", wraps=self.redis.pipeline
+        ) as pipeline:
+            self.assertEqual(first.add_messages(messages), 4)
+
+        pipeline.assert_called_once()
+        first.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 3)
+        self.assertEqual(self._count(self.user2, 1), 1)
+
+    def test_falls_back_to_local_buffer_without_redis(self):
+        first, _ = self.workers
+        with patch.object(self.redis, "hincrby", side_effect=ConnectionError("down")):
+            first.add_message(Message(discord_id=123456789, channel_id=1))
+
+        self.assertEqual(len(first._buffer), 1)
+        self.assertEqual(first.stats()["redis_errors"], 1)
+
+        first.flush_to_db()
+
+        self.assertEqual(self._count(self.user, 1), 1)
+
+
+class MessageBatchAPITests(AuthenticatedTestCase):
+    url = "/engagement/message/batch/"
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.buffer = MessageBuffer(max_size=4, background=False)
+        self.buffer_patcher = patch(
+            "engagement.views.InjestMessageBatchView._message_buffer", self.buffer
+        )
+        self.buffer_patcher.start()
+
+    def tearDown(self):
+        self.buffer_patcher.stop()
+        super().tearDown()
+
+    def test_json_array(self):
+        response = self.client.post(
+            self.url,
+            [
+                {"discord_id": 1, "channel_id": 2},
+                {"discord_id": "1", "channel_id": 2},
+                {"discord_id": 3, "channel_id": 2},
+                "not a message",
+            ],
+            format="json",
+        )
+
+        self.assertResponse(response, 202)
+        self.assertEqual(response.data["accepted"], 2)
+        self.assertEqual(response.data["invalid"], [1, 3])
+        self.assertEqual(
+            [(m.discord_id, m.channel_id) for m in self.buffer._buffer],
+            [(1, 2), (3, 2)],
+        )
+
+    def test_ndjson(self):
+        body = "\n".join('{"discord_id": %d, "channel_id": 7}' % i for i in range(6))
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+
+        self.assertResponse(response, 202)
+        # buffer only has room for 4
+        self.assertEqual(response.data["accepted"], 4)
+        self.assertEqual(response.data["dropped"], 2)
+        self.assertEqual(self.buffer.stats()["dropped"], 2)
+
+    def test_invalid_body(self):
+        response = self.client.post(self.url, {"messages": "nope"}, format="json")
+        self.assertResponse(response, 400)
+
+        response = self.client.post(
+            self.url, "{not json", content_type="application/json"
+        )
+        self.assertResponse(response, 400)
+
+    def test_ndjson_lines_that_arent_json_are_invalid(self):
+        body = "\n".join(
+            [
+                '{"discord_id": 1, "channel_id": 7}',
+                "{not json",
+                "",
+                "[1, 2",
+                '{"discord_id": 2, "channel_id": 7}',
+            ]
+        )
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+
+        self.assertResponse(response, 202)
+        self.assertEqual(response.data["accepted"], 2)
+        # blank lines aren't events
+        self.assertEqual(response.data["invalid"], [1, 2])
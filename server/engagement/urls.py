@@ -8,6 +8,16 @@ urlpatterns = [
         views.InjestMessageEventView.as_view(),
         name="injest-message-event",
     ),
+    path(
+        "message/batch/",
+        views.InjestMessageBatchView.as_view(),
+        name="injest-message-batch",
+    ),
+    path(
+        "message/buffer/",
+        views.MessageBufferStatsView.as_view(),
+        name="message-buffer-stats",
+    ),
     path(
         "message/query/",
         views.QueryDiscordMessageStats.as_view(),
@@ -34,6 +44,11 @@ urlpatterns = [
         name="get-session-attendees",
     ),
     path("attendance/attend", views.AttendSession.as_view(), name="attend-session"),
+    path(
+        "attendance/attend/bulk",
+        views.BulkAttendSession.as_view(),
+        name="bulk-attend-session",
+    ),
     path(
         "cohort/oa",
         view=views.UpdateOAStatsView.as_view(),
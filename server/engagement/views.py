@@ -3,15 +3,16 @@ from collections import defaultdict
 from datetime import datetime
 from typing import Dict, List
 
+import orjson
 import pydantic
 from custom_auth.permissions import IsAdmin, IsVerified
-from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from email_util.send_email import send_email
 from leaderboard.models import GitHubStats, LeetcodeStats
 from leaderboard.serializers import GitHubStatsSerializer, LeetcodeStatsSerializer
+from members.discord import discord_resolver
 from members.models import User
 from members.permissions import IsApiKey
 from members.serializers import UserSerializer
@@ -19,17 +20,17 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .buffer import Message, MessageBuffer
-from .models import (
-    AttendanceSession,
-    AttendanceSessionStats,
-    CohortStats,
-    DiscordMessageStats,
-)
+from .attendance import active_sessions, check_in
+from .buffer import Message, get_message_buffer
+from .models import AttendanceSession, CohortStats, DiscordMessageStats
 from .serializers import AttendanceSessionSerializer, MemberSerializer
 
 logger = logging.getLogger(__name__)
 
+MAX_MESSAGE_BATCH_SIZE = 1000
+MAX_CHECK_IN_BATCH_SIZE = 1000
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
 
 def parse_date(x):
     date = datetime.strptime(x, "%Y-%m-%dT%H:%M:%S.%fZ")
@@ -65,6 +66,7 @@ class CreateAttendanceSession(APIView):
             session = AttendanceSession.objects.create(
                 title=request.data["title"], key=request.data["key"], expires=expires
             )
+            active_sessions.add(session)
 
             return Response(
                 {
@@ -128,61 +130,104 @@ class AttendSession(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            # Since we sort by expires and active sesions must have a unique key,
-            # the first result is the desired active session.
-            session = (
-                AttendanceSession.objects.filter(key=session_key)
-                .order_by("-expires")
-                .first()
+        session = active_sessions.get(session_key)
+
+        if not session:
+            return Response(
+                {"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-            if not session:
-                return Response(
-                    {"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND
-                )
+        if not session.is_active():
+            return Response(
+                {"error": "Session has expired"}, status=status.HTTP_400_BAD_REQUEST
+            )
 
-            if not session.is_active():
-                return Response(
-                    {"error": "Session has expired"}, status=status.HTTP_400_BAD_REQUEST
-                )
+        user_id = discord_resolver.resolve(discord_id)
+        if user_id is None:
+            return Response(
+                {"error": "Member not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not check_in(session.session_id, [user_id]):
+            return Response(
+                {"error": "User already in session"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(status=status.HTTP_201_CREATED)
 
-            try:
-                user = User.objects.get(discord_id=discord_id)
-                # Check if user is already in the session
-                if user not in session.attendees.all():
-                    session.attendees.add(user)
-
-                    stats, created = AttendanceSessionStats.objects.get_or_create(
-                        member=user
-                    )
-                    with transaction.atomic():
-                        stats.sessions_attended += 1
-                        stats.last_updated = timezone.now()
-
-                        stats.save()
-
-                    return Response(status=status.HTTP_201_CREATED)
-                else:
-                    return Response(
-                        {"error": "User already in session"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-            except User.DoesNotExist:
-                return Response(
-                    {"error": "Member not found"}, status=status.HTTP_404_NOT_FOUND
-                )
 
-        except AttendanceSession.DoesNotExist:
+class BulkAttendSession(APIView):
+    """
+    bulk version of `AttendSession` for the discord bot, checks a list of
+    discord ids in to a session with one member lookup and one check in.
+    reports which members were added, already present, or unknown.
+    """
+
+    permission_classes = [IsAdmin | IsApiKey]
+
+    def _parse_discord_ids(self, discord_ids):
+        if not isinstance(discord_ids, list):
+            return None
+        try:
+            return list(dict.fromkeys(int(discord_id) for discord_id in discord_ids))
+        except (TypeError, ValueError):
+            return None
+
+    def post(self, request):
+        session_key = request.data.get("session_key")
+        discord_ids = self._parse_discord_ids(request.data.get("discord_ids"))
+
+        if not session_key or discord_ids is None:
+            return Response(
+                {"error": "session_key and a list of discord_ids are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(discord_ids) > MAX_CHECK_IN_BATCH_SIZE:
+            return Response(
+                {"error": f"at most {MAX_CHECK_IN_BATCH_SIZE} members per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = active_sessions.get(session_key)
+
+        if not session:
             return Response(
                 {"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
+        if not session.is_active():
+            return Response(
+                {"error": "Session has expired"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user_ids = discord_resolver.resolve_many(discord_ids)
+        added = check_in(session.session_id, list(user_ids.values()))
+
+        result = {"added": [], "already_present": [], "unknown": []}
+        for discord_id in discord_ids:
+            if discord_id not in user_ids:
+                result["unknown"].append(discord_id)
+            elif user_ids[discord_id] in added:
+                result["added"].append(discord_id)
+            else:
+                result["already_present"].append(discord_id)
+
+        logger.info(
+            "Bulk check in to session %s: %d added, %d already present, %d unknown",
+            session.session_id,
+            len(result["added"]),
+            len(result["already_present"]),
+            len(result["unknown"]),
+        )
+
+        return Response(result, status=status.HTTP_200_OK)
+
 
 class InjestMessageEventView(generics.CreateAPIView):
     permission_classes = [IsAdmin | IsApiKey]
-    _message_buffer = MessageBuffer()
+    _message_buffer = get_message_buffer()
 
     def post(self, request, *args, **kwargs):
         try:
@@ -215,6 +260,93 @@ class InjestMessageEventView(generics.CreateAPIView):
             )
 
 
+class InjestMessageBatchView(APIView):
+    """
+    bulk version of `InjestMessageEventView`, accepts a json array (or
+    {"messages": [...]}) or an ndjson body of {discord_id, channel_id} events.
+    invalid events are reported back by index, the rest are buffered.
+    """
+
+    permission_classes = [IsAdmin | IsApiKey]
+    _message_buffer = InjestMessageEventView._message_buffer
+
+    def _parse_line(self, line):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # reported as an invalid event, like any other malformed one
+            return None
+
+    def _parse_events(self, request):
+        if request.content_type.startswith(NDJSON_CONTENT_TYPE):
+            return [
+                self._parse_line(line)
+                for line in request.body.splitlines()
+                if line.strip()
+            ]
+
+        events = request.data
+        if isinstance(events, dict):
+            events = events.get("messages")
+        return events
+
+    def post(self, request, *args, **kwargs):
+        events = self._parse_events(request)
+
+        if not isinstance(events, list):
+            return Response(
+                {"error": "expected a list of messages"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(events) > MAX_MESSAGE_BATCH_SIZE:
+            return Response(
+                {"error": f"at most {MAX_MESSAGE_BATCH_SIZE} messages per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        messages = []
+        invalid = []
+        for idx, event in enumerate(events):
+            discord_id = event.get("discord_id") if isinstance(event, dict) else None
+            channel_id = event.get("channel_id") if isinstance(event, dict) else None
+
+            if not isinstance(discord_id, int) or not isinstance(channel_id, int):
+                invalid.append(idx)
+                continue
+
+            messages.append(Message(discord_id=discord_id, channel_id=channel_id))
+
+        accepted = self._message_buffer.add_messages(messages) if messages else 0
+
+        logger.info(
+            "Message batch added to buffer: %d accepted, %d dropped, %d invalid",
+            accepted,
+            len(messages) - accepted,
+            len(invalid),
+        )
+
+        return Response(
+            {
+                "accepted": accepted,
+                "dropped": len(messages) - accepted,
+                "invalid": invalid,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class MessageBufferStatsView(APIView):
+    """backpressure metrics for this worker's message buffer"""
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(
+            InjestMessageEventView._message_buffer.stats(), status=status.HTTP_200_OK
+        )
+
+
 class GetUserStats(APIView):
     permission_classes = [IsVerified | IsApiKey]
 
@@ -298,11 +430,10 @@ class CohortStatsBase(APIView):
         if not discord_id:
             return None, "Discord ID is required"
 
-        try:
-            user = User.objects.get(discord_id=discord_id)
-            return user.id, None
-        except User.DoesNotExist:
+        user_id = discord_resolver.resolve(discord_id)
+        if user_id is None:
             return None, "User with discord ID not found"
+        return user_id, None
 
     def update_stats(self, cohort_stats_object: CohortStats):
         pass
@@ -113,6 +113,30 @@ class CommonAvailabilityStableMatching(PairingAlgorithm):
     def _calculate_common_slots_matrix(
         self, pool_member_ids: List[int]
     ) -> NDArray[np.int_]:
+        """
+        calculate the common slot count for every pair of members in one pass.
+
+        each member's 7x48 availability is flattened into a row of a 0/1 matrix,
+        so the pairwise overlap counts are the entries of ``slots @ slots.T``.
+        counts never exceed 7 * 48, so float32 accumulation is exact.
+        """
+        slots = np.stack(
+            [self._availabilities[member_id].ravel() for member_id in pool_member_ids]
+        ).astype(np.float32)
+
+        common_slots = np.rint(slots @ slots.T).astype(np.int_)
+        # a member never shares slots with themself
+        np.fill_diagonal(common_slots, 0)
+
+        return common_slots
+
+    def _calculate_common_slots_matrix_pairwise(
+        self, pool_member_ids: List[int]
+    ) -> NDArray[np.int_]:
+        """
+        reference pairwise impl of `_calculate_common_slots_matrix`, kept for
+        parity checks and benchmarks.
+        """
         num_members = len(pool_member_ids)
         common_slots = np.zeros((num_members, num_members), dtype=np.int_)
 
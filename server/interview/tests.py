@@ -131,3 +131,61 @@ class TestCommonAvailabilityStableMatching(TestCase):
 
         for num_members in [10, 20, 50, 100, 200, 500, 1000, 2000]:
             self._pair_large_input_calculate_preferences(num_members)
+
+    def _random_availabilities(self, num_members):
+        rng = np.random.default_rng(num_members)
+        return {i: rng.random((7, 48)) < 0.5 for i in range(num_members)}
+
+    def test_common_slots_matrix_matches_pairwise(self):
+        availabilities = self._random_availabilities(64)
+        availabilities[64] = np.zeros((7, 48), dtype=bool)
+        availabilities[65] = np.ones((7, 48), dtype=bool)
+        pool_member_ids = list(availabilities.keys())
+        self.algorithm.set_availabilities(availabilities)
+
+        vectorized = self.algorithm._calculate_common_slots_matrix(pool_member_ids)
+        pairwise = self.algorithm._calculate_common_slots_matrix_pairwise(
+            pool_member_ids
+        )
+
+        np.testing.assert_array_equal(vectorized, pairwise)
+        self.assertTrue(np.all(np.diag(vectorized) == 0))
+        self.assertEqual(vectorized[64, 65], 0)
+        self.assertEqual(vectorized[0, 65], availabilities[0].sum())
+
+    def test_common_slots_matrix_benchmark(self):
+        # the pairwise loop is quadratic in python, so at larger pool sizes it is
+        # only run for a sample of rows and its full cost is extrapolated
+        sampled_rows = 50
+
+        for num_members in [100, 1000, 5000]:
+            availabilities = self._random_availabilities(num_members)
+            pool_member_ids = list(range(num_members))
+            self.algorithm.set_availabilities(availabilities)
+
+            start_time = timezone.now()
+            vectorized = self.algorithm._calculate_common_slots_matrix(pool_member_ids)
+            vectorized_ms = (timezone.now() - start_time).total_seconds() * 1000
+
+            rows = min(sampled_rows, num_members)
+            start_time = timezone.now()
+            for i in range(rows):
+                for j in range(num_members):
+                    if i == j:
+                        continue
+                    self.assertEqual(
+                        vectorized[i, j],
+                        self.algorithm.calculate_common_slots_numpy(
+                            availabilities[i], availabilities[j]
+                        ),
+                    )
+            sample_ms = (timezone.now() - start_time).total_seconds() * 1000
+            # the original loop only visits the upper triangle
+            pairwise_ms = sample_ms * (num_members / rows) / 2
+
+            print(
+                f"Common slots for {num_members} members: "
+                f"vectorized {vectorized_ms:.2f} ms, "
+                f"pairwise ~{pairwise_ms:.2f} ms"
+            )
+            self.assertLess(vectorized_ms, pairwise_ms)
@@ -0,0 +1,30 @@
+from typing import Dict
+
+from django.db import connection
+from django.utils import timezone
+
+from .queries import APPLY_APPLICATION_DELTAS_QUERY
+
+
+def apply_application_deltas(model, deltas: Dict[int, int]) -> Dict[int, int]:
+    """
+    add `deltas` (user id -> change) to the members' `applied` count in one
+    statement, never going below zero. returns user id -> applied for every
+    member that has stats after the change.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            APPLY_APPLICATION_DELTAS_QUERY.format(
+                table=model._meta.db_table,
+                values=", ".join(["(%s, %s)"] * len(deltas)),
+            ),
+            [timezone.now()]
+            + [
+                value for user_id, delta in deltas.items() for value in (user_id, delta)
+            ],
+        )
+        return dict(cursor.fetchall())
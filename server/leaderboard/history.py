@@ -0,0 +1,178 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .managers import (
+    CohortStatsLeaderboardManager,
+    GitHubLeaderboardManager,
+    LeaderboardManager,
+    LeetcodeLeaderboardManager,
+)
+from .models import StatsHistory
+from .queries import DOWNSAMPLE_STATS_HISTORY_QUERY
+
+logger = logging.getLogger(__name__)
+
+
+class TrackedStats(NamedTuple):
+    manager: LeaderboardManager
+    # row field (as in the manager's ordering_options) -> stats model field
+    metrics: Dict[str, str]
+    # fk telling a member's rows apart, e.g. their cohort
+    scope: Optional[str] = None
+
+
+TRACKED_STATS = {
+    tracked.manager.board: tracked
+    for tracked in [
+        TrackedStats(
+            LeetcodeLeaderboardManager(),
+            {
+                "total_solved": "total_solved",
+                "easy_solved": "easy_solved",
+                "medium_solved": "medium_solved",
+                "hard_solved": "hard_solved",
+            },
+        ),
+        TrackedStats(
+            GitHubLeaderboardManager(),
+            {
+                "total_commits": "total_commits",
+                "total_prs": "total_prs",
+                "followers": "followers",
+            },
+        ),
+        TrackedStats(
+            CohortStatsLeaderboardManager(),
+            {
+                "daily_checks": "dailyChecks",
+                "applications": "applications",
+                "online_assessments": "onlineAssessments",
+                "interviews": "interviews",
+                "offers": "offers",
+            },
+            scope="cohort",
+        ),
+    ]
+}
+
+
+def current_values(tracked: TrackedStats):
+    """(member_id, metric, scope) -> value, from one query on the stats model"""
+    manager = tracked.manager
+    fields = [f"{manager.member_field}_id", *tracked.metrics.values()]
+    if tracked.scope:
+        fields.append(f"{tracked.scope}_id")
+
+    values = {}
+    for row in manager.model.objects.values_list(*fields):
+        member_id, scope = row[0], row[-1] if tracked.scope else 0
+        for metric, value in zip(tracked.metrics, row[1:]):
+            values[(member_id, metric, scope)] = value
+    return values
+
+
+def latest_values(board: str, before: date):
+    """(member_id, metric, scope) -> the last value recorded before `before`"""
+    # ordered like the unique index, but backwards, so distinct on picks each
+    # series' latest row straight off the index
+    rows = (
+        StatsHistory.objects.filter(board=board, day__lt=before)
+        .order_by("-member_id", "-metric", "-scope", "-day")
+        .distinct("member_id", "metric", "scope")
+        .values_list("member_id", "metric", "scope", "value")
+    )
+    return {
+        (member_id, metric, scope): value for member_id, metric, scope, value in rows
+    }
+
+
+def take_snapshot(board: str, day: Optional[date] = None) -> int:
+    """
+    record today's (or `day`'s) changes to a board's stats against their last
+    recorded value, replacing that day's rows if it was already taken. a
+    member's first row is their baseline, with no change. returns the number
+    of rows written.
+    """
+    tracked = TRACKED_STATS[board]
+    day = day or timezone.localdate()
+
+    previous = latest_values(board, day)
+    history = []
+    for (member_id, metric, scope), value in current_values(tracked).items():
+        last = previous.get((member_id, metric, scope))
+        if last == value or (last is None and not value):
+            continue
+
+        history.append(
+            StatsHistory(
+                member_id=member_id,
+                board=board,
+                metric=metric,
+                scope=scope,
+                day=day,
+                value=value,
+                delta=0 if last is None else value - last,
+            )
+        )
+
+    with transaction.atomic():
+        StatsHistory.objects.filter(
+            board=board, day=day, period=StatsHistory.DAY
+        ).delete()
+        StatsHistory.objects.bulk_create(history, batch_size=1000)
+
+    logger.info(f"recorded {len(history)} {board} stats changes for {day}")
+    return len(history)
+
+
+def downsample(before: date) -> int:
+    """
+    fold daily rows of weeks that ended before `before` into weekly rows.
+    returns the number of weekly rows written.
+    """
+    # only whole weeks, so a week is never split across daily and weekly rows
+    before -= timedelta(days=before.weekday())
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            DOWNSAMPLE_STATS_HISTORY_QUERY.format(table=StatsHistory._meta.db_table),
+            [StatsHistory.DAY, before, StatsHistory.WEEK],
+        )
+        return cursor.rowcount
+
+
+def member_history(board, username, metric, scope, since):
+    """a member's recorded values of `metric` since `since`, oldest first"""
+    return list(
+        StatsHistory.objects.filter(
+            board=board,
+            member__username=username,
+            metric=metric,
+            scope=scope,
+            day__gte=since,
+        )
+        .order_by("day")
+        .values("day", "period", "value", "delta")
+    )
+
+
+def top_movers(board, metric, since, scope=None, limit=10):
+    """
+    members whose `metric` grew the most since `since`, across every scope
+    unless one is given
+    """
+    history = StatsHistory.objects.filter(board=board, metric=metric, day__gte=since)
+    if scope is not None:
+        history = history.filter(scope=scope)
+
+    return list(
+        history.values("member__username", "scope")
+        .annotate(change=Sum("delta"))
+        .filter(change__gt=0)
+        .order_by("-change", "member__username")[:limit]
+    )
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from leaderboard.history import downsample
+
+
+class Command(BaseCommand):
+    help = "Folds old daily leaderboard stats history into weekly rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=90,
+            help="Keep daily rows for this many days",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.localdate() - timedelta(days=options["days"])
+        rows = downsample(before)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Folded daily stats history into {rows} weekly rows")
+        )
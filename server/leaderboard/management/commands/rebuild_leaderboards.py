@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from leaderboard.managers import (
+    AttendanceLeaderboardManager,
+    CohortStatsLeaderboardManager,
+    GitHubLeaderboardManager,
+    LeetcodeLeaderboardManager,
+)
+from leaderboard.store import LeaderboardStore
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the redis sorted set leaderboards from the database"
+
+    def handle(self, *args, **options):
+        store = LeaderboardStore()
+
+        for manager in [
+            LeetcodeLeaderboardManager(),
+            GitHubLeaderboardManager(),
+            AttendanceLeaderboardManager(),
+            CohortStatsLeaderboardManager(),
+        ]:
+            rows = store.sync(manager)
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt {manager.board} leaderboard: {rows} rows")
+            )
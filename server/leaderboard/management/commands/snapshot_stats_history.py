@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from leaderboard.history import TRACKED_STATS, take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Records today's changes to leaderboard stats in their history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--board",
+            choices=list(TRACKED_STATS),
+            help="Only snapshot this board",
+        )
+
+    def handle(self, *args, **options):
+        boards = [options["board"]] if options["board"] else list(TRACKED_STATS)
+
+        for board in boards:
+            rows = take_snapshot(board)
+            self.stdout.write(
+                self.style.SUCCESS(f"Recorded {rows} {board} stats changes")
+            )
@@ -1,31 +1,93 @@
-from collections import defaultdict
-
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
 from django.utils import timezone
-from engagement.models import AttendanceSessionStats
+from engagement.models import AttendanceSession, AttendanceSessionStats
+from leaderboard.managers import AttendanceLeaderboardManager
+from leaderboard.recounts import LAST_RUN_KEY, attendance_recounts
+from leaderboard.signals import stats_changed
+from leaderboard.store import sync_leaderboard_store
 from members.models import User
 
 
 class Command(BaseCommand):
     help = "Updates derived data for attendance stats"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only recount members of sessions active since the last run, "
+            "and members removed from sessions since then",
+        )
+
+    def get_members(self, incremental):
+        """
+        filter for the members to recount, and the queued recounts it covers,
+        or (None, ()) for everyone
+        """
+        last_run = cache.get(LAST_RUN_KEY)
+        if not incremental or last_run is None:
+            return None, ()
+
+        # removals and deleted sessions leave no newer row behind
+        recounts = attendance_recounts.get()
+        if recounts is None:
+            return None, ()
+
+        # check ins only happen while a session is active, so anyone who
+        # checked in since the last run is in a session that hasn't expired
+        # since then
+        checked_in = AttendanceSession.attendees.through.objects.filter(
+            attendancesession__expires__gte=last_run
+        ).values("user_id")
+        return Q(id__in=checked_in) | Q(id__in=recounts), recounts
+
     def handle(self, *args, **options):
+        started = timezone.now()
+        members, recounts = self.get_members(options["incremental"])
 
-        session_counts = defaultdict(int)
+        # filtering on the members' sessions here would also filter the count
+        users = User.objects.all() if members is None else User.objects.filter(members)
+        counts = users.annotate(
+            sessions=Count("attendance_sessions", distinct=True),
+            current=Subquery(
+                AttendanceSessionStats.objects.filter(member=OuterRef("pk")).values(
+                    "sessions_attended"
+                )
+            ),
+        ).values_list("id", "sessions", "current")
 
-        for user in User.objects.all().values("id", "attendance_sessions"):
-            session_counts[user["id"]] += 1 if user["attendance_sessions"] else 0
+        changed = [
+            AttendanceSessionStats(
+                member_id=user_id, sessions_attended=sessions, last_updated=started
+            )
+            for user_id, sessions, current in counts
+            if sessions != current
+        ]
 
-        for user_id, attended_sessions in session_counts.items():
-            user_stats, _ = AttendanceSessionStats.objects.get_or_create(
-                member_id=user_id
+        with transaction.atomic():
+            AttendanceSessionStats.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["member"],
+                update_fields=["sessions_attended", "last_updated"],
             )
 
-            with transaction.atomic():
-                user_stats.sessions_attended = attended_sessions
-                user_stats.last_updated = timezone.now()
+        cache.set(LAST_RUN_KEY, started, timeout=None)
+        attendance_recounts.done(recounts)
 
-                user_stats.save()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated attendance stats for {len(changed)} members"
+                + (" (incremental)" if members is not None else "")
+            )
+        )
 
-            self.stdout.write(self.style.SUCCESS(str(user_stats)))
+        stats_changed.send(
+            sender=AttendanceSessionStats,
+            member_ids=[stats.member_id for stats in changed],
+        )
+        if members is None:
+            sync_leaderboard_store(AttendanceLeaderboardManager())
@@ -1,138 +1,338 @@
 import logging
-import time
+from datetime import timedelta
 
-import requests
-from bs4 import BeautifulSoup
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
-from leaderboard.models import GitHubStats
+from leaderboard.models import GitHubStats, RefreshSchedule
+from leaderboard.refresh import (
+    RetryableError,
+    TokenBucket,
+    fetch_all,
+    get_session,
+    parse_retry_after,
+    raise_for_retryable,
+)
+from leaderboard.schedule import RefreshScheduler, with_handle
+from leaderboard.signals import stats_changed
 from members.models import User
 
+from server.settings import GITHUB_TOKEN
+
 logger = logging.getLogger(__name__)
 
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_USER_FIELDS = """
+    contributionsCollection {
+        contributionCalendar {
+            totalContributions
+        }
+    }
+    pullRequests {
+        totalCount
+    }
+    followers {
+        totalCount
+    }
+"""
+
+
+def github_headers(token, **headers):
+    return {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {token}",
+        **headers,
+    }
+
+
+def raise_for_github_rate_limit(response):
+    raise_for_retryable(response)
+
+    # github turns rate limited requests away with a 403
+    if response.status_code == 403 and (
+        "Retry-After" in response.headers
+        or response.headers.get("X-RateLimit-Remaining") == "0"
+    ):
+        raise RetryableError(
+            f"rate limited by {response.url}",
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+def has_new_activity(login, token, etag="", last_modified=""):
+    """
+    conditional request for a user's public events. returns None if the user
+    doesn't exist, (False, ...) if nothing happened since the validators were
+    issued, otherwise (True, etag, last_modified). 304s don't count against
+    the rate limit.
+    """
+    headers = github_headers(token)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = get_session().get(
+        f"{GITHUB_API_URL}/users/{login}/events/public",
+        headers=headers,
+        params={"per_page": 1},
+        timeout=10,
+    )
+    raise_for_github_rate_limit(response)
+
+    if response.status_code == 304:
+        return False, etag, last_modified
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch events for {login}: {response.status_code}")
+        return None
+
+    return (
+        True,
+        response.headers.get("ETag", ""),
+        response.headers.get("Last-Modified", ""),
+    )
+
+
+def get_github_stats(logins, token):
+    """
+    stats for many users from one aliased graphql query. users that don't
+    exist are left out.
+    """
+    variables = {f"u{i}": login for i, login in enumerate(dict.fromkeys(logins))}
+    query = "query({}) {{ {} }}".format(
+        ", ".join(f"${alias}: String!" for alias in variables),
+        " ".join(
+            f"{alias}: user(login: ${alias}) {{ {GITHUB_USER_FIELDS} }}"
+            for alias in variables
+        ),
+    )
+
+    response = get_session().post(
+        f"{GITHUB_API_URL}/graphql",
+        headers=github_headers(token),
+        json={"query": query, "variables": variables},
+        timeout=30,
+    )
+    raise_for_github_rate_limit(response)
+    response.raise_for_status()
+
+    data = response.json()
+    if any(e.get("type") == "RATE_LIMITED" for e in data.get("errors", [])):
+        raise RetryableError(f"rate limited by {response.url}")
+
+    stats = {}
+    for alias, login in variables.items():
+        user = (data.get("data") or {}).get(alias)
+        if not user:
+            continue
+
+        stats[login] = {
+            "total_prs": user["pullRequests"]["totalCount"],
+            "total_commits": user["contributionsCollection"]["contributionCalendar"][
+                "totalContributions"
+            ],
+            "followers": user["followers"]["totalCount"],
+        }
+    return stats
+
 
 class Command(BaseCommand):
     help = "Updates GitHub statistics for all users"
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=5.0,
+            help="Maximum API requests per second",
+        )
         parser.add_argument(
             "--timeout",
+            type=float,
+            help="Minimum seconds between API requests, overrides --rate",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Maximum number of requests in flight",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=25,
+            help="Users per GraphQL query",
+        )
+        parser.add_argument(
+            "--retries",
             type=int,
-            default=10,  # high default timeout for rate limits
-            help="Timeout between API requests in seconds",
+            default=3,
+            help="Retries for rate limited or failed requests",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=1.0,
+            help="Base delay in seconds between retries, doubled on each attempt",
         )
         parser.add_argument(
             "--username", type=str, help="Update stats for specific username only"
         )
         parser.add_argument(
-            "--force", action="store_true", help="Force update even if recently updated"
+            "--limit", type=int, help="Maximum number of due users to refresh"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Force update even if not yet due or unchanged",
+        )
+        parser.add_argument(
+            "--full-refresh-after",
+            type=float,
+            default=24,
+            help="Hours after which stats are fetched even without new activity",
         )
 
-    def get_github_stats(self, username):
-        """Fetch GitHub statistics using public API and web scraping for contributions"""
-        try:
-            # contribution count
-            contributions_url = f"https://github.com/users/{username}/contributions"
-            response = requests.get(contributions_url)
-            contributions = 0
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                h2_tag = soup.find("h2", class_="f4 text-normal mb-2")
-                if h2_tag:
-                    contributions_text = h2_tag.text.strip().split()[0]
-                    contributions = int(contributions_text.replace(",", ""))
-
-            # basic user info
-            user_response = requests.get(
-                f"https://api.github.com/users/{username}",
-                headers={"Accept": "application/vnd.github.v3+json"},
-                timeout=10,
-            )
+    def handle(self, *args, **options):
+        if not GITHUB_TOKEN:
+            raise CommandError("GITHUB_TOKEN is required for the GitHub GraphQL API")
 
-            if user_response.status_code != 200:
-                logger.error(
-                    f"Failed to fetch user data for {username}: {user_response.status_code}"
-                )
-                return None
+        username = options["username"]
+        force = options["force"]
+        rate = 1 / options["timeout"] if options["timeout"] else options["rate"]
+        limiter = TokenBucket(rate)
+        fetch_options = {
+            "limiter": limiter,
+            "concurrency": options["concurrency"],
+            "retries": options["retries"],
+            "backoff": options["backoff"],
+        }
 
-            user_data = user_response.json()
+        scheduler = RefreshScheduler(RefreshSchedule.GITHUB)
+        users = (
+            User.objects.filter(username=username) if username else User.objects.all()
+        ).only("id", "username", "github")
+        users = with_handle(users, "github")
+        if not force:
+            users = scheduler.due(users, limit=options["limit"])
 
-            # PR count
-            pr_response = requests.get(
-                f"https://api.github.com/search/issues?q=author:{username}+type:pr",
-                headers={"Accept": "application/vnd.github.v3+json"},
-                timeout=10,
+        due = {
+            user.id: user
+            for user in users
+            if user.github and user.github.get("username")
+        }
+        existing = {
+            stats.user_id: stats
+            for stats in GitHubStats.objects.filter(user_id__in=due)
+        }
+
+        # only members with new public activity, or stats that haven't been
+        # fetched in a while, need their stats fetched. followers and the
+        # rolling year of contributions change without any public events
+        now = timezone.now()
+        fetched_before = now - timedelta(hours=options["full_refresh_after"])
+        validators, unchanged = {}, []
+        if force:
+            active = list(due)
+        else:
+            checks, errors = fetch_all(
+                due,
+                lambda user_id: has_new_activity(
+                    due[user_id].github["username"],
+                    GITHUB_TOKEN,
+                    existing[user_id].etag if user_id in existing else "",
+                    existing[user_id].last_modified if user_id in existing else "",
+                ),
+                **fetch_options,
             )
+            self._report_errors(due, errors)
 
-            total_prs = 0
-            if pr_response.status_code == 200:
-                pr_data = pr_response.json()
-                total_prs = pr_data.get("total_count", 0)
-            else:
-                logger.warning(
-                    f"Failed to fetch PR data for {username}: {pr_response.status_code}"
+            active = []
+            for user_id, check in checks.items():
+                stats = existing.get(user_id)
+                stale = stats is None or (
+                    stats.last_fetched is None or stats.last_fetched < fetched_before
                 )
+                if check is None or not (check[0] or stale):
+                    self.stdout.write(f"No changes for {due[user_id].username}")
+                    unchanged.append(user_id)
+                    continue
+                active.append(user_id)
+                if check[0]:
+                    validators[user_id] = check[1:]
 
-            return {
-                "total_prs": total_prs,
-                "total_commits": contributions,  # contributions count from profile
-                "followers": user_data.get("followers", 0),
-            }
-
-        except Exception as e:
-            logger.error(f"Error fetching GitHub data for {username}: {str(e)}")
-            return None
-
-    def handle(self, *args, **options):
-        timeout = options["timeout"]
-        username = options["username"]
-        force = options["force"]
-
-        def update_user_stats(user):
-            if not user.github or not user.github.get("username"):
-                return False
-
-            try:
-                stats = GitHubStats.objects.get(user=user)
-                if (
-                    not force
-                    and (timezone.now() - stats.last_updated).total_seconds() < 3600
-                ):
-                    return False
-            except GitHubStats.DoesNotExist:
-                stats = GitHubStats(user=user)
-
-            github_data = self.get_github_stats(user.github["username"])
-            if not github_data:
-                return False
-
-            with transaction.atomic():
-                stats.total_prs = github_data["total_prs"]
-                stats.total_commits = github_data["total_commits"]
-                stats.followers = github_data["followers"]
-                stats.last_updated = timezone.now()
-                stats.save()
-                return True
-
-        users = (
-            User.objects.filter(username=username) if username else User.objects.all()
+        batch_size = options["batch_size"]
+        batches = [
+            tuple(active[i : i + batch_size]) for i in range(0, len(active), batch_size)
+        ]
+        results, errors = fetch_all(
+            batches,
+            lambda batch: get_github_stats(
+                [due[user_id].github["username"] for user_id in batch], GITHUB_TOKEN
+            ),
+            **fetch_options,
+        )
+        self._report_errors(
+            due,
+            {user_id: error for batch, error in errors.items() for user_id in batch},
         )
 
-        for user in users:
-            if not user.github or not user.github.get("username"):
-                continue
-            try:
-                if update_user_stats(user):
+        to_update, to_create, changed = [], [], []
+        for batch, github_stats in results.items():
+            for user_id in batch:
+                github_data = github_stats.get(due[user_id].github["username"])
+                if not github_data:
                     self.stdout.write(
-                        self.style.SUCCESS(f"Updated GitHub stats for {user.username}")
+                        self.style.WARNING(f"Skipped {due[user_id].username}")
+                    )
+                    unchanged.append(user_id)
+                    continue
+
+                stats = existing.get(user_id) or GitHubStats(user_id=user_id)
+                is_changed = not stats.pk or any(
+                    getattr(stats, f) != v for f, v in github_data.items()
+                )
+                if is_changed:
+                    for field, value in github_data.items():
+                        setattr(stats, field, value)
+                    stats.last_updated = now
+                    changed.append(user_id)
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"Updated GitHub stats for {due[user_id].username}"
+                        )
                     )
                 else:
-                    self.stdout.write(self.style.WARNING(f"Skipped {user.username}"))
-                time.sleep(
-                    timeout
-                )  # hopefully respect rate limits, needs to be run async though
-            except Exception as e:
-                logger.error(f"Failed to update stats for {user.username}: {str(e)}")
-                continue
+                    self.stdout.write(f"No changes for {due[user_id].username}")
+                    unchanged.append(user_id)
+
+                # only remember validators once the stats they vouch for
+                # are saved, or the next run would skip them with a 304
+                if user_id in validators:
+                    stats.etag, stats.last_modified = validators[user_id]
+                stats.last_fetched = now
+                (to_update if stats.pk else to_create).append(stats)
+
+        with transaction.atomic():
+            GitHubStats.objects.bulk_update(
+                to_update,
+                [
+                    "total_prs",
+                    "total_commits",
+                    "followers",
+                    "last_updated",
+                    "etag",
+                    "last_modified",
+                    "last_fetched",
+                ],
+            )
+            GitHubStats.objects.bulk_create(to_create)
+            scheduler.record(changed=changed, unchanged=unchanged, now=now)
+
+        stats_changed.send(sender=GitHubStats, member_ids=changed)
+
+    def _report_errors(self, users, errors):
+        for user_id, error in errors.items():
+            logger.error(
+                f"Failed to update stats for {users[user_id].username}: {error}"
+            )
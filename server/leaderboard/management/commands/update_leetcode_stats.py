@@ -1,152 +1,198 @@
 import logging
-import time
 
-import requests
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
-from leaderboard.models import LeetcodeStats
+from leaderboard.models import LeetcodeStats, RefreshSchedule
+from leaderboard.refresh import TokenBucket, fetch_all, get_session, raise_for_retryable
+from leaderboard.schedule import RefreshScheduler, with_handle
+from leaderboard.signals import stats_changed
 from members.models import User
 
 logger = logging.getLogger(__name__)
 
+LEETCODE_GRAPHQL_URL = "https://leetcode.com/graphql"
+LEETCODE_PROFILE_QUERY = """
+    query getUserProfile($username: String!) {
+        matchedUser(username: $username) {
+            submitStats {
+                acSubmissionNum {
+                    difficulty
+                    count
+                }
+            }
+        }
+    }
+"""
+
+# LeetcodeStats field -> key in `get_leetcode_profile`'s result
+LEETCODE_STATS_FIELDS = {
+    "total_solved": "solvedProblem",
+    "easy_solved": "easySolved",
+    "medium_solved": "mediumSolved",
+    "hard_solved": "hardSolved",
+}
+
+
+def get_leetcode_profile(username):
+    """
+    solved counts for a leetcode user, or None if they can't be found.
+    raises `RetryableError` when rate limited or leetcode is having a moment.
+    """
+    response = get_session().post(
+        LEETCODE_GRAPHQL_URL,
+        headers={
+            "Content-Type": "application/json",
+            "Referer": "https://leetcode.com",
+        },
+        json={"query": LEETCODE_PROFILE_QUERY, "variables": {"username": username}},
+        timeout=10,
+    )
+    raise_for_retryable(response)
+
+    if response.status_code != 200:
+        logger.error(f"Error fetching data for {username}: {response.text}")
+        return None
+
+    data = response.json()
+    if "errors" in data or not data["data"]["matchedUser"]:
+        return None
+
+    counts = {
+        item["difficulty"]: item["count"]
+        for item in data["data"]["matchedUser"]["submitStats"]["acSubmissionNum"]
+    }
+    return {
+        "solvedProblem": counts.get("All", 0),
+        "easySolved": counts.get("Easy", 0),
+        "mediumSolved": counts.get("Medium", 0),
+        "hardSolved": counts.get("Hard", 0),
+    }
+
 
 class Command(BaseCommand):
     help = "Updates leetcode statistics for all users"
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=2.0,
+            help="Maximum API requests per second",
+        )
         parser.add_argument(
             "--timeout",
+            type=float,
+            help="Minimum seconds between API requests, overrides --rate",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Maximum number of requests in flight",
+        )
+        parser.add_argument(
+            "--retries",
             type=int,
-            default=10,
-            help="Timeout between API requests in seconds",
+            default=3,
+            help="Retries for rate limited or failed requests",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=1.0,
+            help="Base delay in seconds between retries, doubled on each attempt",
         )
         parser.add_argument(
             "--username", type=str, help="Update stats for specific username only"
         )
         parser.add_argument(
-            "--force", action="store_true", help="Force update even if recently updated"
+            "--limit", type=int, help="Maximum number of due users to refresh"
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Force update even if not yet due"
         )
 
     def handle(self, *args, **options):
-        timeout = options["timeout"]
         username = options["username"]
         force = options["force"]
+        rate = 1 / options["timeout"] if options["timeout"] else options["rate"]
 
-        def get_leetcode_profile(username):
-            try:
-                query = """
-                    query getUserProfile($username: String!) {
-                        matchedUser(username: $username) {
-                            submitStats {
-                                acSubmissionNum {
-                                    difficulty
-                                    count
-                                }
-                            }
-                        }
-                    }
-                """
-                response = requests.post(
-                    "https://leetcode.com/graphql",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": "https://leetcode.com",
-                    },
-                    json={"query": query, "variables": {"username": username}},
-                    timeout=10,
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    if "errors" in data:
-                        return None
-                    stats = data["data"]["matchedUser"]["submitStats"][
-                        "acSubmissionNum"
-                    ]
-                    return {
-                        "solvedProblem": next(
-                            (
-                                item["count"]
-                                for item in stats
-                                if item["difficulty"] == "All"
-                            ),
-                            0,
-                        ),
-                        "easySolved": next(
-                            (
-                                item["count"]
-                                for item in stats
-                                if item["difficulty"] == "Easy"
-                            ),
-                            0,
-                        ),
-                        "mediumSolved": next(
-                            (
-                                item["count"]
-                                for item in stats
-                                if item["difficulty"] == "Medium"
-                            ),
-                            0,
-                        ),
-                        "hardSolved": next(
-                            (
-                                item["count"]
-                                for item in stats
-                                if item["difficulty"] == "Hard"
-                            ),
-                            0,
-                        ),
-                    }
-                else:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f"Error fetching data for {username}: {response.text}"
-                        )
-                    )
-                return None
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"Error fetching data for {username}: {str(e)}")
-                )
-                return None
-
-        def update_user_stats(user):
-            if not user.leetcode or not user.leetcode.get("username"):
-                return False
-
-            # skip if updated in last hour unless forced
-            try:
-                stats = LeetcodeStats.objects.get(user=user)
-                if (
-                    not force
-                    and (timezone.now() - stats.last_updated).total_seconds() < 3600
-                ):
-                    return False
-            except LeetcodeStats.DoesNotExist:
-                stats = LeetcodeStats(user=user)
-
-            leetcode_data = get_leetcode_profile(user.leetcode["username"])
-            if not leetcode_data:
-                return False
-
-            with transaction.atomic():
-                stats.total_solved = leetcode_data.get("solvedProblem", 0)
-                stats.easy_solved = leetcode_data.get("easySolved", 0)
-                stats.medium_solved = leetcode_data.get("mediumSolved", 0)
-                stats.hard_solved = leetcode_data.get("hardSolved", 0)
-                stats.last_updated = timezone.now()
-                stats.save()
-                return True
-
+        scheduler = RefreshScheduler(RefreshSchedule.LEETCODE)
         users = (
             User.objects.filter(username=username) if username else User.objects.all()
+        ).only("id", "username", "leetcode")
+        users = with_handle(users, "leetcode")
+        if not force:
+            users = scheduler.due(users, limit=options["limit"])
+
+        due = {
+            user.id: user
+            for user in users
+            if user.leetcode and user.leetcode.get("username")
+        }
+        existing = {
+            stats.user_id: stats
+            for stats in LeetcodeStats.objects.filter(user_id__in=due)
+        }
+
+        results, errors = fetch_all(
+            due,
+            lambda user_id: get_leetcode_profile(due[user_id].leetcode["username"]),
+            limiter=TokenBucket(rate),
+            concurrency=options["concurrency"],
+            retries=options["retries"],
+            backoff=options["backoff"],
         )
 
-        for user in users:
-            if update_user_stats(user):
+        for user_id, error in errors.items():
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Error fetching data for {due[user_id].username}: {error}"
+                )
+            )
+
+        to_update, to_create, unchanged = [], [], []
+        now = timezone.now()
+        for user_id, leetcode_data in results.items():
+            if not leetcode_data:
                 self.stdout.write(
-                    self.style.SUCCESS(f"Updated stats for {user.username}")
+                    self.style.WARNING(f"Skipped {due[user_id].username}")
                 )
-                time.sleep(timeout)
-            else:
-                self.stdout.write(self.style.WARNING(f"Skipped {user.username}"))
+                unchanged.append(user_id)
+                continue
+
+            values = {
+                field: leetcode_data.get(key, 0)
+                for field, key in LEETCODE_STATS_FIELDS.items()
+            }
+            stats = existing.get(user_id) or LeetcodeStats(user_id=user_id)
+            if stats.pk and all(getattr(stats, f) == v for f, v in values.items()):
+                self.stdout.write(f"No changes for {due[user_id].username}")
+                unchanged.append(user_id)
+                continue
+
+            for field, value in values.items():
+                setattr(stats, field, value)
+            stats.last_updated = now
+            (to_update if stats.pk else to_create).append(stats)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Updated stats for {due[user_id].username}")
+            )
+
+        with transaction.atomic():
+            LeetcodeStats.objects.bulk_update(
+                to_update, [*LEETCODE_STATS_FIELDS, "last_updated"]
+            )
+            LeetcodeStats.objects.bulk_create(to_create)
+            scheduler.record(
+                changed=[stats.user_id for stats in to_update + to_create],
+                unchanged=unchanged,
+                now=now,
+            )
+
+        stats_changed.send(
+            sender=LeetcodeStats,
+            member_ids=[stats.user_id for stats in to_update + to_create],
+        )
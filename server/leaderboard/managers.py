@@ -1,167 +1,301 @@
 import logging
+from operator import itemgetter
+from typing import Dict
 
-from cache import CacheHandler
+from cache import CacheHandler, is_versioned, versioned
+from cohort.models import Cohort
 from cohort.serializers import CohortHydratedPublicSerializer
+from django.db.models import Prefetch
 from engagement.models import AttendanceSessionStats, CohortStats
-from members.serializers import UsernameSerializer
+from members.models import User
 
 from .models import GitHubStats, LeetcodeStats
 
 logger = logging.getLogger(__name__)
 
 
-class LeetcodeLeaderboardManager:
-    def __init__(self, cache_handler: CacheHandler, generate_key):
-        self.cache_handler = cache_handler
-        self.generate_key = generate_key
+class LeaderboardManager:
+    """
+    caches a leaderboard snapshot built from a single `values()` query.
 
-    def get_all(self):
-        key = self.generate_key()
-        cached_info = self.cache_handler.get(key)
-
-        if cached_info:
-            return cached_info
+    subclasses provide the queryset (joining whatever they need, e.g.
+    `user__username`) and turn each row into the cached dict, so building a
+    leaderboard never issues a query per member.
 
-        value = self.get_all_from_db()
-        self.cache_handler.set(key, value)
-
-        return value
-
-    def get_all_from_db(self):
-        queryset = LeetcodeStats.objects.all()
-
-        cached_value = []
-
-        for stat in queryset:
-            cached_value.append(
-                {
-                    "total_solved": stat.total_solved,
-                    "easy_solved": stat.easy_solved,
-                    "medium_solved": stat.medium_solved,
-                    "hard_solved": stat.hard_solved,
-                    "last_updated": stat.last_updated,
-                    "user": UsernameSerializer(stat.user).data,
-                }
-            )
+    the snapshot holds one list per `ordering_options` key, already sorted
+    and ranked, so serving a request never sorts. when a member's stats
+    change, `patch` swaps just their rows into the cached snapshot. every
+    cached snapshot gets a new content version, for conditional requests.
+    """
 
-        return cached_value
+    # order_by query param -> row field, sorted descending
+    ordering_options: Dict[str, str] = {}
 
+    # name of the board, the stats model and its fk to the member
+    board = ""
+    model = None
+    member_field = "user"
 
-class AttendanceLeaderboardManager:
-    def __init__(self, cache_handler: CacheHandler, generate_key):
+    def __init__(self, cache_handler: CacheHandler = None, generate_key=None):
         self.cache_handler = cache_handler
         self.generate_key = generate_key
 
-    def refresh_key(self, key, value):
-        self.cache_handler.set(key, value)
-
-    def get_all(self):
-        key = self.generate_key()
+    def get_versioned(self, key, build):
+        """cached `build()` along with its content version, see `versioned`"""
         cached_info = self.cache_handler.get(key)
 
-        if cached_info:
-            self.refresh_key(key, cached_info)
+        if is_versioned(cached_info):
             return cached_info
 
-        value = self.get_all_from_db()
+        value = versioned(build())
         self.cache_handler.set(key, value)
 
         return value
 
-    def get_all_from_db(self):
-        queryset = AttendanceSessionStats.objects.all()
-
-        cached_value = []
-
-        for stat in queryset:
-            cached_value.append(
-                {
-                    "sessions_attended": stat.sessions_attended,
-                    "last_updated": stat.last_updated,
-                    "member": UsernameSerializer(stat.member).data,
-                }
-            )
-
-        return cached_value
-
-
-class GitHubLeaderboardManager:
-    def __init__(self, cache_handler: CacheHandler, generate_key):
-        self.cache_handler = cache_handler
-        self.generate_key = generate_key
-
-    def refresh_key(self, key, value):
-        self.cache_handler.set(key, value)
+    def get_cached(self):
+        """the snapshot and its version, for conditional requests"""
+        return self.get_versioned(self.generate_key(), self.get_all_from_db)
 
     def get_all(self):
-        key = self.generate_key()
-        cached_info = self.cache_handler.get(key)
-
-        if cached_info:
-            self.refresh_key(key, cached_info)
-            return cached_info
-
-        value = self.get_all_from_db()
-        self.cache_handler.set(key, value)
-
-        return value
-
-    def get_all_from_db(self):
-        queryset = GitHubStats.objects.all()
-
-        cached_value = []
-
-        for stat in queryset:
-            cached_value.append(
-                {
-                    "total_prs": stat.total_prs,
-                    "total_commits": stat.total_commits,
-                    "followers": stat.followers,
-                    "last_updated": stat.last_updated,
-                    "user": UsernameSerializer(stat.user).data,
-                }
-            )
+        return self.get_cached()["value"]
 
-        return cached_value
+    def get_queryset(self):
+        raise NotImplementedError
 
+    def to_row(self, values):
+        raise NotImplementedError
 
-class CohortStatsLeaderboardManager:
-    def __init__(self, cache_handler: CacheHandler, generate_key):
-        self.cache_handler = cache_handler
-        self.generate_key = generate_key
+    def get_member_queryset(self, member_ids=None):
+        queryset = self.get_queryset()
+        if member_ids is not None:
+            queryset = queryset.filter(**{f"{self.member_field}_id__in": member_ids})
+        return queryset
 
-    def refresh_key(self, key, value):
-        self.cache_handler.set(key, value)
+    def member_username(self, row):
+        return row[self.member_field]["username"]
 
-    def get_all(self):
-        key = self.generate_key()
-        cached_info = self.cache_handler.get(key)
+    def member_key(self, row):
+        """identifies a row's member within the board"""
+        return self.member_username(row)
 
-        if cached_info:
-            self.refresh_key(key, cached_info)
-            return cached_info
-
-        value = self.get_all_from_db()
-        self.cache_handler.set(key, value)
-
-        return value
+    def get_rows_from_db(self, member_ids=None):
+        return [self.to_row(values) for values in self.get_member_queryset(member_ids)]
 
     def get_all_from_db(self):
-        queryset = CohortStats.objects.all()
-
-        cached_value = []
-
-        for stat in queryset:
-            cached_value.append(
-                {
-                    "cohort": CohortHydratedPublicSerializer(stat.cohort).data,
-                    "member": UsernameSerializer(stat.member).data,
-                    "applications": stat.applications,
-                    "online_assessments": stat.onlineAssessments,
-                    "interviews": stat.interviews,
-                    "offers": stat.offers,
-                    "daily_checks": stat.dailyChecks,
-                }
+        return self.build_snapshot(self.get_rows_from_db())
+
+    def build_snapshot(self, rows):
+        return {
+            order_by: [
+                {**row, "rank": rank}
+                for rank, row in enumerate(
+                    sorted(rows, key=itemgetter(field), reverse=True), start=1
+                )
+            ]
+            for order_by, field in self.ordering_options.items()
+        }
+
+    def patch(self, member_ids, usernames):
+        """
+        replace the rows of `member_ids` (currently named `usernames`) in the
+        cached snapshot with fresh ones from the db. returns the member keys
+        that are no longer on the board. a missing snapshot is left for the
+        next read to build. concurrent patches are serialized by the cache
+        handler's lock, so neither loses the other's rows.
+        """
+        key = self.generate_key()
+        with self.cache_handler.lock(key):
+            cached_info = self.cache_handler.get(key)
+            if not is_versioned(cached_info):
+                return []
+            snapshot = cached_info["value"]
+
+            usernames = set(usernames)
+            fresh = self.get_rows_from_db(member_ids)
+
+            # every ordering holds the same rows, so any one of them will do
+            cached = next(iter(snapshot.values()))
+            kept = [row for row in cached if self.member_username(row) not in usernames]
+            stale = {
+                self.member_key(row)
+                for row in cached
+                if self.member_username(row) in usernames
+            }
+
+            self.cache_handler.set(key, versioned(self.build_snapshot(kept + fresh)))
+
+        return list(stale - {self.member_key(row) for row in fresh})
+
+    def get_ranked(self, order_by):
+        """rows ranked by `order_by`, shared with the cache so don't mutate them"""
+        return self.get_all()[order_by]
+
+
+class LeetcodeLeaderboardManager(LeaderboardManager):
+    board = "leetcode"
+    model = LeetcodeStats
+    ordering_options = {
+        "total": "total_solved",
+        "easy": "easy_solved",
+        "medium": "medium_solved",
+        "hard": "hard_solved",
+        "recent": "last_updated",
+        "completion": "completion_rate",
+    }
+
+    def get_queryset(self):
+        return self.model.objects.values(
+            "total_solved",
+            "easy_solved",
+            "medium_solved",
+            "hard_solved",
+            "last_updated",
+            "user__username",
+        )
+
+    def to_row(self, values):
+        attempted = (
+            values["easy_solved"] + values["medium_solved"] + values["hard_solved"]
+        )
+        return {
+            "total_solved": values["total_solved"],
+            "easy_solved": values["easy_solved"],
+            "medium_solved": values["medium_solved"],
+            "hard_solved": values["hard_solved"],
+            "completion_rate": (
+                values["total_solved"] * 100.0 / attempted if attempted else 0.0
+            ),
+            "last_updated": values["last_updated"],
+            "user": {"username": values["user__username"]},
+        }
+
+
+class AttendanceLeaderboardManager(LeaderboardManager):
+    board = "attendance"
+    model = AttendanceSessionStats
+    member_field = "member"
+    ordering_options = {
+        "attendance": "sessions_attended",
+        "recent": "last_updated",
+    }
+
+    def get_queryset(self):
+        return self.model.objects.values(
+            "sessions_attended", "last_updated", "member__username"
+        )
+
+    def to_row(self, values):
+        return {
+            "sessions_attended": values["sessions_attended"],
+            "last_updated": values["last_updated"],
+            "member": {"username": values["member__username"]},
+        }
+
+
+class GitHubLeaderboardManager(LeaderboardManager):
+    board = "github"
+    model = GitHubStats
+    ordering_options = {
+        "commits": "total_commits",
+        "prs": "total_prs",
+        "followers": "followers",
+        "recent": "last_updated",
+    }
+
+    def get_queryset(self):
+        return self.model.objects.values(
+            "total_prs",
+            "total_commits",
+            "followers",
+            "last_updated",
+            "user__username",
+        )
+
+    def to_row(self, values):
+        return {
+            "total_prs": values["total_prs"],
+            "total_commits": values["total_commits"],
+            "followers": values["followers"],
+            "last_updated": values["last_updated"],
+            "user": {"username": values["user__username"]},
+        }
+
+
+class CohortStatsLeaderboardManager(LeaderboardManager):
+    board = "cohort"
+    model = CohortStats
+    member_field = "member"
+    ordering_options = {
+        "daily_check": "daily_checks",
+        "applications": "applications",
+        "online_assessments": "online_assessments",
+        "interviews": "interviews",
+        "offers": "offers",
+    }
+
+    def get_queryset(self):
+        return self.model.objects.values(
+            "cohort_id",
+            "cohort__name",
+            "cohort__level",
+            "applications",
+            "onlineAssessments",
+            "interviews",
+            "offers",
+            "dailyChecks",
+            "last_updated",
+            "member__username",
+        )
+
+    def to_row(self, values):
+        return {
+            "cohort": {
+                "id": values["cohort_id"],
+                "name": values["cohort__name"],
+                "level": values["cohort__level"],
+            },
+            "member": {"username": values["member__username"]},
+            "applications": values["applications"],
+            "online_assessments": values["onlineAssessments"],
+            "interviews": values["interviews"],
+            "offers": values["offers"],
+            "daily_checks": values["dailyChecks"],
+            "last_updated": values["last_updated"],
+        }
+
+    def member_key(self, row):
+        # members can be in more than one cohort
+        return f"{row['member']['username']}:{row['cohort']['id']}"
+
+    def cohorts_key(self):
+        return f"{self.generate_key()}:cohorts"
+
+    def get_cohorts(self, cohort_ids=()):
+        """
+        cohort_id -> hydrated cohort and its version, cached next to the
+        snapshot. rows only reference their cohort, so each cohort's members
+        are sent once. rebuilt if any of `cohort_ids` is missing, e.g. a
+        patched row moved to a new cohort.
+        """
+        cohorts = self.get_versioned(self.cohorts_key(), self.get_cohorts_from_db)
+        if set(cohort_ids) - cohorts["value"].keys():
+            cohorts = versioned(self.get_cohorts_from_db())
+            self.cache_handler.set(self.cohorts_key(), cohorts)
+        return cohorts
+
+    def invalidate_cohorts(self):
+        """have the next read rebuild the cohorts, e.g. after one changed"""
+        self.cache_handler.delete(self.cohorts_key())
+
+    def get_cohorts_from_db(self):
+        cohorts = Cohort.objects.filter(
+            id__in=self.model.objects.values("cohort_id")
+        ).prefetch_related(
+            Prefetch(
+                "members",
+                queryset=User.objects.prefetch_related("groups", "user_permissions"),
             )
-
-        return cached_value
+        )
+        return {
+            cohort.id: CohortHydratedPublicSerializer(cohort).data for cohort in cohorts
+        }
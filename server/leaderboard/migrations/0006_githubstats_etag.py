@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaderboard", "0005_internshipapplicationstats_last_updated_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="githubstats",
+            name="etag",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="githubstats",
+            name="last_modified",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
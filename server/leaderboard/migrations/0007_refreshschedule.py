@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("leaderboard", "0006_githubstats_etag"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RefreshSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("leetcode", "LeetCode"), ("github", "GitHub")],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "next_refresh",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("interval", models.DurationField()),
+                (
+                    "last_checked",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_changed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="refresh_schedules",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["source", "next_refresh"],
+                        name="leaderboard_source_6244de_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="refreshschedule",
+            constraint=models.UniqueConstraint(
+                fields=("user", "source"), name="unique_refresh_schedule"
+            ),
+        ),
+    ]
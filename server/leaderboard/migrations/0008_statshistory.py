@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("leaderboard", "0007_refreshschedule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatsHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("board", models.CharField(max_length=20)),
+                ("metric", models.CharField(max_length=32)),
+                ("scope", models.IntegerField(default=0)),
+                ("day", models.DateField()),
+                ("period", models.SmallIntegerField(default=1)),
+                ("value", models.IntegerField()),
+                ("delta", models.IntegerField()),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats_history",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Stats History",
+                "indexes": [
+                    models.Index(
+                        fields=["board", "metric", "day"],
+                        include=("member", "scope", "delta"),
+                        name="leaderboard_history_day_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="statshistory",
+            constraint=models.UniqueConstraint(
+                fields=("board", "member", "metric", "scope", "day", "period"),
+                name="unique_stats_history",
+            ),
+        ),
+    ]
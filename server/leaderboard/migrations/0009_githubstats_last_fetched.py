@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leaderboard", "0008_statshistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="githubstats",
+            name="last_fetched",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
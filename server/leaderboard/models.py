@@ -30,6 +30,14 @@ class GitHubStats(models.Model):
     followers = models.IntegerField(default=0)
     last_updated = models.DateTimeField(default=timezone.now)
 
+    # validators from the user's last public events response, for
+    # conditional requests
+    etag = models.CharField(max_length=255, blank=True, default="")
+    last_modified = models.CharField(max_length=255, blank=True, default="")
+    # when the stats were last fetched, changed or not. followers and the
+    # rolling year of contributions change without any public events
+    last_fetched = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-total_commits", "-total_prs"]
         verbose_name_plural = "GitHub Stats"
@@ -38,6 +46,34 @@ class GitHubStats(models.Model):
         return f"{self.user.username}'s GitHub Stats"
 
 
+class RefreshSchedule(models.Model):
+    """when a member's stats from a source are next due for a refresh"""
+
+    LEETCODE = "leetcode"
+    GITHUB = "github"
+    SOURCE_CHOICES = [(LEETCODE, "LeetCode"), (GITHUB, "GitHub")]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="refresh_schedules"
+    )
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    next_refresh = models.DateTimeField(default=timezone.now)
+    interval = models.DurationField()
+    last_checked = models.DateTimeField(default=timezone.now)
+    last_changed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "source"], name="unique_refresh_schedule"
+            )
+        ]
+        indexes = [models.Index(fields=["source", "next_refresh"])]
+
+    def __str__(self):
+        return f"{self.user.username}'s {self.source} refresh schedule"
+
+
 class InternshipApplicationStats(models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name="internship_stats"
@@ -66,3 +102,48 @@ class NewGradApplicationStats(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s New Grad Application Stats"
+
+
+class StatsHistory(models.Model):
+    """
+    a change in one of a member's leaderboard stats, appended by the daily
+    snapshot. days without a change have no row, and old days are folded
+    into weekly rows, see `leaderboard.history`.
+    """
+
+    DAY = 1
+    WEEK = 7
+
+    member = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="stats_history"
+    )
+    board = models.CharField(max_length=20)
+    metric = models.CharField(max_length=32)
+    # tells a member's rows on the same board apart, e.g. the cohort
+    scope = models.IntegerField(default=0)
+    day = models.DateField()
+    # days covered, starting on `day`
+    period = models.SmallIntegerField(default=DAY)
+    value = models.IntegerField()
+    delta = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index for a member's history
+            models.UniqueConstraint(
+                fields=["board", "member", "metric", "scope", "day", "period"],
+                name="unique_stats_history",
+            )
+        ]
+        indexes = [
+            # top movers are an index only scan over a window of days
+            models.Index(
+                fields=["board", "metric", "day"],
+                include=["member", "scope", "delta"],
+                name="leaderboard_history_day_idx",
+            )
+        ]
+        verbose_name_plural = "Stats History"
+
+    def __str__(self):
+        return f"{self.member.username}'s {self.board} {self.metric} on {self.day}"
@@ -0,0 +1,82 @@
+import gzip
+import logging
+from typing import Dict, List
+
+import brotli
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """content codings from an Accept-Encoding header, minus any with q=0"""
+    encodings = []
+    for coding in header.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        if any(param.replace(" ", "") in ("q=0", "q=0.0") for param in params):
+            continue
+        if name:
+            encodings.append(name.lower())
+    return encodings
+
+
+class PayloadCache:
+    """
+    encoded response bodies of leaderboard pages, with gzip and brotli
+    variants, cached per snapshot version so they never need invalidating.
+
+    the first request for a page of a snapshot encodes and compresses it once,
+    every other request for it is a cache read and a write to the socket.
+    """
+
+    KEY = "leaderboard:payload:{version}:{page}"
+
+    def __init__(self, expiration=60 * 60, gzip_level=6, brotli_quality=5):
+        self.expiration = expiration
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, request) -> str:
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return "identity"
+
+    def encode(self, content: bytes) -> Dict[str, bytes]:
+        return {
+            "identity": content,
+            "gzip": gzip.compress(content, compresslevel=self.gzip_level, mtime=0),
+            "br": brotli.compress(content, quality=self.brotli_quality),
+        }
+
+    def key(self, versions, page) -> str:
+        return self.KEY.format(
+            version=".".join(v["etag"] for v in versions),
+            page=":".join(str(part) for part in page),
+        )
+
+    def get_response(self, request, versions, page, build, encoding) -> HttpResponse:
+        """
+        the cached `encoding` of the page, `build()`ing and caching every
+        variant of it on a miss
+        """
+        key = self.key(versions, page)
+        variants = cache.get(key)
+
+        if variants is None or encoding not in variants:
+            response = build()
+            if response.status_code != 200:
+                return response
+
+            variants = self.encode(response.content)
+            cache.set(key, variants, timeout=self.expiration)
+
+        response = HttpResponse(variants[encoding], content_type=JSON_CONTENT_TYPE)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,35 @@
+# {table} is the application stats table, one (user_id, delta) row per member
+# is appended to VALUES, followed by the last_updated timestamp. the change is
+# floored at zero, and members without stats only get a row for an increment.
+# returns each member's applied count after the change.
+APPLY_APPLICATION_DELTAS_QUERY = """
+INSERT INTO {table} (user_id, applied, last_updated)
+SELECT deltas.user_id, deltas.delta, %s
+FROM (VALUES {values}) AS deltas (user_id, delta)
+WHERE deltas.delta > 0
+    OR EXISTS (SELECT 1 FROM {table} WHERE {table}.user_id = deltas.user_id)
+ON CONFLICT (user_id) DO UPDATE
+SET applied = GREATEST({table}.applied + EXCLUDED.applied, 0),
+    last_updated = EXCLUDED.last_updated
+RETURNING user_id, applied;
+"""
+
+# folds {table}'s daily stats history rows before a cutoff into one row per
+# week, starting on its monday. each week keeps its last value and the sum of
+# its changes. params are the daily period, the cutoff and the weekly period.
+# a day backfilled into a week that was already folded adds its change to the
+# week's row. the week keeps its value, which came from its later days.
+DOWNSAMPLE_STATS_HISTORY_QUERY = """
+WITH expired AS (
+    DELETE FROM {table}
+    WHERE period = %s AND day < %s
+    RETURNING board, member_id, metric, scope, day, value, delta
+)
+INSERT INTO {table} (board, member_id, metric, scope, day, period, value, delta)
+SELECT board, member_id, metric, scope, date_trunc('week', day)::date, %s,
+    (array_agg(value ORDER BY day DESC))[1], SUM(delta)
+FROM expired
+GROUP BY board, member_id, metric, scope, date_trunc('week', day)
+ON CONFLICT (board, member_id, metric, scope, day, period) DO UPDATE
+SET delta = {table}.delta + EXCLUDED.delta;
+"""
@@ -0,0 +1,66 @@
+import logging
+from typing import Iterable, Optional, Set
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# when update_attendance_stats last ran, incremental runs pick up from there
+LAST_RUN_KEY = "attendance:stats:last_run"
+
+
+class AttendanceRecounts:
+    """
+    members whose attendance went down since the last run of
+    update_attendance_stats, e.g. removed from a session or in one that was
+    deleted. that leaves no newer attendance row behind, so incremental runs
+    recount them from this redis set. if it can't be written, the next run
+    recounts everyone instead.
+    """
+
+    KEY = "attendance:stats:recount"
+
+    def __init__(self, redis=None):
+        self._redis = redis
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def add(self, member_ids: Iterable[int]) -> None:
+        member_ids = list(member_ids)
+        if not member_ids:
+            return
+
+        try:
+            self.redis.sadd(self.KEY, *member_ids)
+        except RedisError as e:
+            logger.error(f"failed to queue attendance recounts, recounting all: {e}")
+            cache.delete(LAST_RUN_KEY)
+
+    def get(self) -> Optional[Set[int]]:
+        """the queued member ids, or None if they can't be read"""
+        try:
+            return {int(member_id) for member_id in self.redis.smembers(self.KEY)}
+        except RedisError as e:
+            logger.error(f"failed to read attendance recounts: {e}")
+            return None
+
+    def done(self, member_ids: Iterable[int]) -> None:
+        """drop recounted members, ones queued meanwhile stay"""
+        member_ids = list(member_ids)
+        if not member_ids:
+            return
+
+        try:
+            self.redis.srem(self.KEY, *member_ids)
+        except RedisError as e:
+            # they're just recounted again next time
+            logger.error(f"failed to clear attendance recounts: {e}")
+
+
+attendance_recounts = AttendanceRecounts()
@@ -0,0 +1,138 @@
+import datetime
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import requests
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """thread safe token bucket, `acquire` blocks until a request may be made"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryableError(Exception):
+    """a failed request worth retrying, e.g. rate limited or a 5xx"""
+
+    def __init__(self, message, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """seconds to wait from a Retry-After header, in seconds or an http date"""
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        retry_at = None
+    if retry_at is None:
+        logger.warning(f"ignoring malformed Retry-After: {value!r}")
+        return None
+
+    if timezone.is_naive(retry_at):
+        retry_at = timezone.make_aware(retry_at, datetime.timezone.utc)
+    return max((retry_at - timezone.now()).total_seconds(), 0.0)
+
+
+def raise_for_retryable(response: requests.Response) -> None:
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableError(
+            f"{response.status_code} from {response.url}",
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+_sessions = threading.local()
+
+
+def get_session() -> requests.Session:
+    """one pooled session per worker thread"""
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def call_with_retries(fn: Callable, retries: int = 3, backoff: float = 1.0):
+    """call `fn`, retrying `RetryableError`s with jittered exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except (RetryableError, requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+
+            retry_after = getattr(e, "retry_after", None)
+            delay = retry_after if retry_after is not None else backoff * 2**attempt
+            delay += random.uniform(0, backoff)
+            logger.warning(f"{e}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def fetch_all(
+    items: Iterable[Hashable],
+    fetch: Callable,
+    limiter: TokenBucket,
+    concurrency: int = 4,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> Tuple[Dict, Dict]:
+    """
+    run `fetch(item)` for every item on a bounded thread pool, every attempt
+    waiting on `limiter`. returns (results, errors), both keyed by item.
+    """
+
+    def fetch_item(item):
+        def attempt():
+            limiter.acquire()
+            return fetch(item)
+
+        return call_with_retries(attempt, retries=retries, backoff=backoff)
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(fetch_item, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = e
+
+    return results, errors
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from typing import Iterable
+
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import RefreshSchedule
+
+MIN_REFRESH_INTERVAL = timedelta(hours=1)
+MAX_REFRESH_INTERVAL = timedelta(weeks=1)
+
+
+def with_handle(users, field):
+    """
+    `users` with a username on their `field` profile (e.g. "github"). only
+    they can be refreshed, so they're the only ones worth scheduling.
+    """
+    return (
+        users.filter(**{f"{field}__has_key": "username"})
+        .exclude(**{f"{field}__username": ""})
+        .exclude(**{f"{field}__username": None})
+    )
+
+
+class RefreshScheduler:
+    """
+    a persisted priority queue of members to refresh from a source.
+
+    every time a member is checked their interval doubles if their stats
+    didn't change and drops back to `min_interval` if they did, so active
+    members are refreshed hourly while dormant ones drift out to daily and
+    then weekly. members who have never been checked are always due.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        min_interval: timedelta = MIN_REFRESH_INTERVAL,
+        max_interval: timedelta = MAX_REFRESH_INTERVAL,
+    ):
+        self.source = source
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def schedules(self):
+        return RefreshSchedule.objects.filter(source=self.source)
+
+    def due(self, users, now=None, limit=None):
+        """
+        `users` that are due, most overdue (or never checked) first. filter
+        out members that can't be refreshed first, see `with_handle`, or
+        they'll hold the front of the queue.
+        """
+        now = now or timezone.now()
+        schedule = self.schedules().filter(user=OuterRef("pk"))
+
+        users = (
+            users.filter(~Exists(schedule.filter(next_refresh__gt=now)))
+            .annotate(next_refresh=Subquery(schedule.values("next_refresh")[:1]))
+            .order_by(F("next_refresh").asc(nulls_first=True), "pk")
+        )
+        return users[:limit] if limit else users
+
+    def next_interval(self, interval, changed: bool) -> timedelta:
+        if changed or interval is None:
+            return self.min_interval
+        return min(interval * 2, self.max_interval)
+
+    def record(
+        self, changed: Iterable[int], unchanged: Iterable[int], now=None
+    ) -> None:
+        """reschedule members after checking them"""
+        now = now or timezone.now()
+        changed, unchanged = set(changed), set(unchanged)
+
+        intervals = dict(
+            self.schedules()
+            .filter(user_id__in=changed | unchanged)
+            .values_list("user_id", "interval")
+        )
+
+        schedules = []
+        for user_id in changed | unchanged:
+            is_changed = user_id in changed
+            interval = self.next_interval(intervals.get(user_id), is_changed)
+            schedules.append(
+                RefreshSchedule(
+                    user_id=user_id,
+                    source=self.source,
+                    interval=interval,
+                    next_refresh=now + interval,
+                    last_checked=now,
+                    last_changed=now if is_changed else None,
+                )
+            )
+
+        RefreshSchedule.objects.bulk_create(
+            [s for s in schedules if s.last_changed],
+            update_conflicts=True,
+            unique_fields=["user", "source"],
+            update_fields=["interval", "next_refresh", "last_checked", "last_changed"],
+        )
+        RefreshSchedule.objects.bulk_create(
+            [s for s in schedules if not s.last_changed],
+            update_conflicts=True,
+            unique_fields=["user", "source"],
+            update_fields=["interval", "next_refresh", "last_checked"],
+        )
@@ -0,0 +1,177 @@
+import logging
+import threading
+
+from cohort.models import Cohort
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from engagement.models import AttendanceSession, AttendanceSessionStats, CohortStats
+from members.models import User
+
+from .models import GitHubStats, LeetcodeStats
+from .recounts import attendance_recounts
+from .store import LeaderboardStore, sync_leaderboard_store
+
+logger = logging.getLogger(__name__)
+
+# sent by anything that writes leaderboard stats, with sender set to the stats
+# model and `member_ids` the users whose stats changed. saves and deletes of
+# single stats rows are forwarded automatically, bulk writers send it themselves.
+stats_changed = Signal()
+
+LEADERBOARD_STATS_MODELS = [
+    LeetcodeStats,
+    GitHubStats,
+    AttendanceSessionStats,
+    CohortStats,
+]
+
+
+def get_leaderboard_managers(model):
+    # the cached managers are configured on the views
+    from .views import LEADERBOARD_MANAGERS
+
+    return [m for m in LEADERBOARD_MANAGERS.values() if m.model is model]
+
+
+def forward_stats_write(sender, instance, **kwargs):
+    for manager in get_leaderboard_managers(sender):
+        stats_changed.send(
+            sender=sender,
+            member_ids=[getattr(instance, f"{manager.member_field}_id")],
+        )
+
+
+def forward_stats_delete(sender, instance, **kwargs):
+    for manager in get_leaderboard_managers(sender):
+        member_id = getattr(instance, f"{manager.member_field}_id")
+        # resolve now, a deleted member is gone by the time the delete commits
+        stats_changed.send(
+            sender=sender,
+            member_ids=[member_id],
+            usernames=list(
+                User.objects.filter(id=member_id).values_list("username", flat=True)
+            ),
+        )
+
+
+for model in LEADERBOARD_STATS_MODELS:
+    post_save.connect(forward_stats_write, sender=model)
+    post_delete.connect(forward_stats_delete, sender=model)
+
+
+def invalidate_cohorts(sender, **kwargs):
+    # cohort leaderboards hydrate each row's cohort, members and all
+    for manager in get_leaderboard_managers(CohortStats):
+        transaction.on_commit(manager.invalidate_cohorts)
+
+
+post_save.connect(invalidate_cohorts, sender=Cohort)
+post_delete.connect(invalidate_cohorts, sender=Cohort)
+m2m_changed.connect(invalidate_cohorts, sender=Cohort.members.through)
+
+
+def queue_recounts(member_ids):
+    member_ids = list(member_ids)
+    if member_ids:
+        # once committed, or a run in between could recount the old rows
+        transaction.on_commit(lambda: attendance_recounts.add(member_ids))
+
+
+@receiver(m2m_changed, sender=AttendanceSession.attendees.through)
+def recount_removed_attendees(sender, instance, action, reverse, pk_set, **kwargs):
+    # the attendees of a cleared session are gone after the clear
+    if action not in ("post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # removed from the member's side, `instance` is the member
+        queue_recounts([instance.pk])
+    elif action == "post_remove":
+        queue_recounts(pk_set)
+    else:
+        queue_recounts(instance.attendees.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=AttendanceSession)
+def recount_deleted_session_attendees(sender, instance, **kwargs):
+    queue_recounts(instance.attendees.values_list("id", flat=True))
+
+
+def patch_leaderboard(manager, member_ids, usernames):
+    try:
+        stale = manager.patch(member_ids, usernames)
+        sync_leaderboard_store(manager, member_ids)
+        if stale:
+            LeaderboardStore().remove(manager, stale)
+    except Exception as e:
+        logger.error(f"Failed to patch {manager.board} leaderboard: {e}")
+        # e.g. another patch held the lock for too long, rather than risk a
+        # lost update have the next read rebuild it. don't fail the write
+        # over it either way
+        try:
+            manager.cache_handler.delete(manager.generate_key())
+        except Exception as e:
+            logger.error(f"Failed to drop {manager.board} leaderboard: {e}")
+
+
+class PendingPatch:
+    """
+    a board's changes waiting on the current transaction to commit, patched
+    in one go by its on_commit callback
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.member_ids = set()
+        self.usernames = set()
+
+    def add(self, member_ids, usernames):
+        self.member_ids.update(member_ids)
+        self.usernames.update(usernames)
+
+    def is_queued(self, connection):
+        # a rolled back transaction (or savepoint) drops its callbacks
+        return any(entry[1] is self for entry in connection.run_on_commit)
+
+    def __call__(self):
+        if _pending.patches.get(self.manager.board) is self:
+            del _pending.patches[self.manager.board]
+
+        usernames = self.usernames | set(
+            User.objects.filter(id__in=self.member_ids).values_list(
+                "username", flat=True
+            )
+        )
+        patch_leaderboard(self.manager, list(self.member_ids), usernames)
+
+
+# board -> the `PendingPatch` changes to it are added to, per thread
+_pending = threading.local()
+
+
+@receiver(stats_changed)
+def patch_leaderboards(sender, member_ids, usernames=(), **kwargs):
+    """
+    patch the leaderboards once the change commits. every change to a board
+    within a transaction is patched in one go.
+    """
+    managers = get_leaderboard_managers(sender)
+    if not managers or not member_ids:
+        return
+
+    if not hasattr(_pending, "patches"):
+        _pending.patches = {}
+    connection = transaction.get_connection()
+
+    for manager in managers:
+        pending = _pending.patches.get(manager.board)
+        if pending is not None and pending.is_queued(connection):
+            pending.add(member_ids, usernames)
+            continue
+
+        # nothing queued in this transaction, or it was rolled back
+        pending = _pending.patches[manager.board] = PendingPatch(manager)
+        pending.add(member_ids, usernames)
+        # outside a transaction, this patches right away
+        transaction.on_commit(pending)
@@ -0,0 +1,119 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .managers import LeaderboardManager
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardStore:
+    """
+    leaderboards as redis sorted sets, one per (board, metric).
+
+    each member of a board is scored under every metric in its manager's
+    `ordering_options`, so a page is a ZREVRANGE and a member's rank is a
+    ZREVRANK, neither of which loads the rest of the board.
+    """
+
+    KEY = "leaderboard:{board}:{metric}"
+
+    def __init__(self, redis=None):
+        self._redis = redis
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def key(self, board: str, metric: str) -> str:
+        return self.KEY.format(board=board, metric=metric)
+
+    @staticmethod
+    def score(value) -> float:
+        if isinstance(value, datetime):
+            return value.timestamp()
+        return float(value)
+
+    def sync(self, manager: LeaderboardManager, member_ids=None) -> int:
+        """
+        write `member_ids`' rows of the manager's board, or rebuild the whole
+        board if not given. returns the number of rows written.
+        """
+        rows = manager.get_rows_from_db(member_ids)
+        metrics = set(manager.ordering_options.values())
+
+        pipe = self.redis.pipeline()
+        for metric in metrics:
+            key = self.key(manager.board, metric)
+            scores = {manager.member_key(row): self.score(row[metric]) for row in rows}
+
+            if member_ids is not None:
+                if scores:
+                    pipe.zadd(key, scores)
+                continue
+
+            # rebuild off to the side and swap it in, so readers never see
+            # a partial board
+            if scores:
+                pipe.zadd(f"{key}:rebuild", scores)
+                pipe.rename(f"{key}:rebuild", key)
+            else:
+                pipe.delete(key)
+        pipe.execute()
+
+        logger.info(
+            f"synced {len(rows)} {manager.board} rows across {len(metrics)} metrics"
+        )
+        return len(rows)
+
+    def remove(self, manager: LeaderboardManager, member_keys: List[str]) -> None:
+        if not member_keys:
+            return
+
+        pipe = self.redis.pipeline()
+        for metric in set(manager.ordering_options.values()):
+            pipe.zrem(self.key(manager.board, metric), *member_keys)
+        pipe.execute()
+
+    def count(self, board: str, metric: str) -> int:
+        return self.redis.zcard(self.key(board, metric))
+
+    def page(
+        self, board: str, metric: str, start: int, size: int
+    ) -> List[Tuple[str, float]]:
+        """members and scores ranked [start, start + size), highest first"""
+        return [
+            (member.decode(), score)
+            for member, score in self.redis.zrevrange(
+                self.key(board, metric), start, start + size - 1, withscores=True
+            )
+        ]
+
+    def rank(self, board: str, metric: str, member: str) -> Optional[Dict]:
+        """1-based rank and score of a member, or None if not on the board"""
+        key = self.key(board, metric)
+
+        pipe = self.redis.pipeline()
+        pipe.zrevrank(key, member)
+        pipe.zscore(key, member)
+        rank, score = pipe.execute()
+
+        if rank is None:
+            return None
+        return {"rank": rank + 1, "score": score}
+
+
+def sync_leaderboard_store(manager: LeaderboardManager, member_ids=None) -> None:
+    """best effort `LeaderboardStore.sync`, for stats writers"""
+    if member_ids is not None and not member_ids:
+        return
+
+    try:
+        LeaderboardStore().sync(manager, member_ids)
+    except RedisError as e:
+        logger.error(f"Failed to sync {manager.board} leaderboard store: {e}")
@@ -1,3 +1,1376 @@
-from django.test import TestCase  # noqa: F401
+import gzip
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+import brotli
+import numpy as np
+from cache import versioned
+from cohort.models import Cohort
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from engagement.models import AttendanceSession, AttendanceSessionStats, CohortStats
+from members.discord import DiscordIdResolver
+from members.models import User
+from redis.exceptions import LockError, RedisError
+from rest_framework.test import APIClient
+
+from server.renderers import ORJSONRenderer
+from server.testing import FakeRedis, create_members
+
+from .history import downsample, take_snapshot
+from .managers import (
+    AttendanceLeaderboardManager,
+    CohortStatsLeaderboardManager,
+    GitHubLeaderboardManager,
+    LeetcodeLeaderboardManager,
+)
+from .models import (
+    GitHubStats,
+    InternshipApplicationStats,
+    LeetcodeStats,
+    NewGradApplicationStats,
+    RefreshSchedule,
+    StatsHistory,
+)
+from .payloads import PayloadCache
+from .recounts import attendance_recounts
+from .refresh import parse_retry_after
+from .schedule import RefreshScheduler
+from .store import LeaderboardStore
+from .views import (
+    INTERNSHIP_CHANNEL_ID,
+    LEADERBOARD_MANAGERS,
+    NEW_GRAD_CHANNEL_ID,
+    RankedLeaderboardBase,
+    payloads,
+)
+
+
+class LeaderboardManagerBenchmark(TestCase):
+    managers = [
+        LeetcodeLeaderboardManager,
+        GitHubLeaderboardManager,
+        AttendanceLeaderboardManager,
+        CohortStatsLeaderboardManager,
+    ]
+
+    def _build(self, manager_class):
+        manager = manager_class(cache_handler=None, generate_key=None)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            rows = manager.get_rows_from_db()
+            duration = (time.perf_counter() - start) * 1000
+        return rows, len(queries), duration
+
+    def test_query_count_is_constant(self):
+        create_members(0, 5)
+        small = {m: self._build(m) for m in self.managers}
+
+        create_members(5, 200)
+        for manager_class in self.managers:
+            rows, num_queries, duration = self._build(manager_class)
+            print(
+                f"{manager_class.__name__}: {len(rows)} rows, "
+                f"{num_queries} queries, {duration:.2f} ms"
+            )
+
+            self.assertEqual(len(rows), 205)
+            self.assertEqual(num_queries, small[manager_class][1])
+
+    def test_rows_match_serialized_shape(self):
+        create_members(0, 2)
+
+        leetcode, _, _ = self._build(LeetcodeLeaderboardManager)
+        self.assertEqual(
+            sorted(r["user"]["username"] for r in leetcode), ["member0", "member1"]
+        )
+
+        cohort, _, _ = self._build(CohortStatsLeaderboardManager)
+        cohort_id = Cohort.objects.get(name="cohort0").id
+        self.assertEqual(
+            cohort[0]["cohort"],
+            {"id": cohort_id, "name": "cohort0", "level": "beginner"},
+        )
+
+        cohorts = CohortStatsLeaderboardManager().get_cohorts_from_db()
+        self.assertEqual(list(cohorts), [cohort_id])
+        self.assertEqual(len(cohorts[cohort_id]["members"]), 2)
+        self.assertNotIn("password", cohorts[cohort_id]["members"][0])
+
+
+class CohortLeaderboardBenchmark(TestCase):
+    """payload size and build time of the cohort board as one cohort grows"""
+
+    sizes = [50, 500, 5000]
+
+    def _create_cohort(self, size):
+        users = User.objects.bulk_create(
+            [
+                User(username=f"{size}-{i}", discord_username=f"{size}-{i}")
+                for i in range(size)
+            ]
+        )
+        cohort = Cohort.objects.create(name=f"cohort{size}")
+        cohort.members.add(*users)
+        CohortStats.objects.bulk_create(
+            [
+                CohortStats(member=u, cohort=cohort, dailyChecks=i)
+                for i, u in enumerate(users)
+            ]
+        )
+        return cohort
+
+    def _build(self):
+        manager = CohortStatsLeaderboardManager()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            payload = {
+                "results": manager.get_rows_from_db(),
+                "cohorts": manager.get_cohorts_from_db(),
+            }
+            duration = (time.perf_counter() - start) * 1000
+        return len(json.dumps(payload, default=str)), len(queries), duration
+
+    def test_payload_grows_linearly(self):
+        results = {}
+        for size in self.sizes:
+            self._create_cohort(size)
+            results[size] = self._build()
+            payload_size, num_queries, duration = results[size]
+            print(
+                f"cohort board with {size} more members: {payload_size} bytes, "
+                f"{num_queries} queries, {duration:.2f} ms"
+            )
+            CohortStats.objects.all().delete()
+            Cohort.objects.all().delete()
+
+        smallest = results[self.sizes[0]]
+        for size, (payload_size, num_queries, _) in results.items():
+            self.assertEqual(num_queries, smallest[1])
+            # per member, the payload doesn't grow with the cohort
+            self.assertLess(payload_size / size, 2 * smallest[0] / self.sizes[0])
+
+
+class JSONRendererBenchmark(TestCase):
+    """orjson against the stdlib encoder on real leaderboard payloads"""
+
+    def _time(self, encode, payload, runs=20):
+        start = time.perf_counter()
+        for _ in range(runs):
+            body = encode(payload)
+        return body, (time.perf_counter() - start) * 1000 / runs
+
+    def _without_times(self, body):
+        document = json.loads(body)
+        for row in document["results"]:
+            row.pop("last_updated")
+        return document
+
+    def test_leaderboard_payloads(self):
+        create_members(0, 500)
+        cohorts = CohortStatsLeaderboardManager()
+        payloads = {
+            "leetcode": {
+                "results": LeetcodeLeaderboardManager().get_all_from_db()["total"]
+            },
+            "cohort": {
+                "results": cohorts.get_all_from_db()["daily_check"][:50],
+                "cohorts": cohorts.get_cohorts_from_db(),
+            },
+        }
+
+        for name, payload in payloads.items():
+            expected, stdlib = self._time(
+                lambda p: json.dumps(p, cls=DjangoJSONEncoder).encode(), payload
+            )
+            body, fast = self._time(ORJSONRenderer().render, payload)
+            print(
+                f"{name}: {len(body)} bytes, stdlib {stdlib:.2f} ms, "
+                f"orjson {fast:.2f} ms"
+            )
+
+            # the same document, up to how many digits of a second are sent
+            self.assertEqual(self._without_times(body), self._without_times(expected))
+
+    def test_uuids_datetimes_and_numpy(self):
+        interview_id = uuid.uuid4()
+        now = timezone.now()
+        body = ORJSONRenderer().render(
+            {
+                "interview_id": interview_id,
+                "common_slots": np.int64(3),
+                "availability": np.array([True, False]),
+                "created": now,
+                "stats": {1: Decimal("0.5")},
+            }
+        )
+
+        self.assertEqual(
+            json.loads(body),
+            {
+                "interview_id": str(interview_id),
+                "common_slots": 3,
+                "availability": [True, False],
+                "created": now.isoformat().replace("+00:00", "Z"),
+                "stats": {"1": 0.5},
+            },
+        )
+
+
+class LeaderboardSnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        create_members(0, 60)
+
+    def test_snapshot_is_ranked_per_ordering(self):
+        manager = LeetcodeLeaderboardManager(cache_handler=None, generate_key=None)
+        snapshot = manager.get_all_from_db()
+
+        self.assertEqual(set(snapshot), set(manager.ordering_options))
+        for order_by, field in manager.ordering_options.items():
+            ranked = snapshot[order_by]
+            self.assertEqual(
+                [row[field] for row in ranked],
+                sorted((row[field] for row in ranked), reverse=True),
+            )
+            self.assertEqual([row["rank"] for row in ranked], list(range(1, 61)))
+
+    def test_cached_request_is_a_slice(self):
+        response = self.client.get("/leaderboard/attendance/?page=2")
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/leaderboard/attendance/?page=2")
+
+        results = response.json()["results"]
+        self.assertEqual(response.json()["count"], 60)
+        self.assertEqual([r["rank"] for r in results], list(range(51, 61)))
+        self.assertEqual(results[0]["sessions_attended"], 9)
+
+    def test_filtered_page_is_reranked_without_mutating_cache(self):
+        self.client.get("/leaderboard/cohorts/?order_by=offers")
+        response = self.client.get(
+            "/leaderboard/cohorts/?order_by=daily_check&updated_within=1"
+        )
+
+        results = response.json()["results"]
+        self.assertEqual([r["rank"] for r in results], list(range(1, 51)))
+        self.assertEqual(results[0]["daily_checks"], 59)
+
+        response = self.client.get("/leaderboard/cohorts/?order_by=bogus")
+        self.assertEqual(response.status_code, 400)
+
+    def test_filtered_leetcode_and_github_are_reranked(self):
+        LeetcodeStats.objects.filter(user__username="member59").update(
+            last_updated=timezone.now() - timedelta(days=1)
+        )
+        GitHubStats.objects.filter(user__username="member59").update(
+            last_updated=timezone.now() - timedelta(days=1)
+        )
+
+        for url in ["/leaderboard/leetcode/", "/leaderboard/github/"]:
+            results = self.client.get(f"{url}?updated_within=1").json()["results"]
+
+            # the top member is filtered out, everyone else moves up
+            self.assertEqual([r["rank"] for r in results], list(range(1, 60)))
+            self.assertEqual(results[0]["user"]["username"], "member58")
+
+        snapshot = LEADERBOARD_MANAGERS["leetcode"].get_cached()
+        self.assertEqual(snapshot["value"]["total"][0]["rank"], 1)
+        self.assertEqual(snapshot["value"]["total"][1]["rank"], 2)
+
+    def test_cohorts_are_sent_once_per_page(self):
+        create_members(60, 2)
+        response = self.client.get("/leaderboard/cohorts/?order_by=daily_check")
+
+        body = response.json()
+        cohort_ids = {str(r["cohort"]["id"]) for r in body["results"]}
+        self.assertEqual(set(body["cohorts"]), cohort_ids)
+        self.assertNotIn("members", body["results"][0]["cohort"])
+        self.assertEqual(
+            len(body["cohorts"][str(body["results"][0]["cohort"]["id"])]["members"]),
+            60,
+        )
+
+    def test_unchanged_snapshot_is_not_modified(self):
+        for url in [
+            "/leaderboard/leetcode/",
+            "/leaderboard/github/?order_by=prs",
+            "/leaderboard/attendance/?page=2",
+            "/leaderboard/cohorts/",
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Last-Modified", response)
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b"")
+
+    def test_compressed_variants_are_cached(self):
+        url = "/leaderboard/attendance/?page=2"
+        body = self.client.get(url).content
+
+        with patch.object(PayloadCache, "encode", wraps=payloads.encode) as encode:
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+
+        encode.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), body)
+
+        # each encoding is its own representation
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_page_spellings_share_a_payload(self):
+        with patch.object(PayloadCache, "encode", wraps=payloads.encode) as encode:
+            bodies = {
+                self.client.get(f"/leaderboard/attendance/?page={page}").content
+                for page in ["2", "02", "9"]
+            }
+
+        # past the end is the last page
+        self.assertEqual(len(bodies), 1)
+        encode.assert_called_once()
+
+        response = self.client.get("/leaderboard/attendance/?page=two")
+        self.assertEqual(response.status_code, 400)
+
+    def test_brotli_is_preferred(self):
+        url = "/leaderboard/cohorts/"
+        body = self.client.get(url).content
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), body)
+
+    def test_time_filtered_pages_are_always_sent(self):
+        response = self.client.get("/leaderboard/leetcode/?updated_within=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+    def test_leetcode_completion_rate(self):
+        response = self.client.get("/leaderboard/leetcode/?order_by=completion")
+        results = response.json()["results"]
+
+        self.assertEqual(len(results), 60)
+        # member0 solved nothing, which used to divide by zero
+        self.assertEqual(results[-1]["completion_rate"], 0.0)
+
+
+class LeaderboardStoreTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = create_members(0, 30)
+        self.store = LeaderboardStore(redis=FakeRedis())
+        self.store_patcher = patch.object(RankedLeaderboardBase, "store", self.store)
+        self.store_patcher.start()
+
+    def tearDown(self):
+        self.store_patcher.stop()
+        super().tearDown()
+
+    def test_rebuild_and_page(self):
+        self.store.sync(LeetcodeLeaderboardManager())
+
+        response = self.client.get(
+            "/leaderboard/leetcode/ranked/?order_by=total&page=2&page_size=10"
+        )
+        data = response.json()
+
+        self.assertEqual(data["count"], 30)
+        self.assertEqual(data["prev"], 1)
+        self.assertEqual(data["next"], 3)
+        self.assertEqual(
+            data["results"][0], {"rank": 11, "member": "member19", "score": 19.0}
+        )
+
+    def test_member_rank_after_partial_sync(self):
+        self.store.sync(GitHubLeaderboardManager())
+
+        GitHubStats.objects.filter(user=self.users[0]).update(total_commits=100)
+        self.store.sync(GitHubLeaderboardManager(), [self.users[0].id])
+
+        response = self.client.get("/leaderboard/github/ranked/member0/")
+        self.assertEqual(
+            response.json(),
+            {"member": "member0", "count": 30, "rank": 1, "score": 100.0},
+        )
+
+        response = self.client.get("/leaderboard/github/ranked/nobody/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cohort_members_are_keyed_per_cohort(self):
+        self.store.sync(CohortStatsLeaderboardManager())
+
+        cohort_id = CohortStats.objects.get(member=self.users[29]).cohort_id
+        response = self.client.get(
+            f"/leaderboard/cohort/ranked/member29:{cohort_id}/?order_by=daily_check"
+        )
+        self.assertEqual(response.json()["rank"], 1)
+
+    def test_unknown_board(self):
+        response = self.client.get("/leaderboard/bogus/ranked/")
+        self.assertEqual(response.status_code, 404)
+
+
+class LeaderboardWriteThroughTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.users = create_members(0, 10)
+        self.store = LeaderboardStore(redis=FakeRedis())
+        self.store.sync(AttendanceLeaderboardManager())
+        self.store_patchers = [
+            patch.object(RankedLeaderboardBase, "store", self.store),
+            patch("leaderboard.store.LeaderboardStore.redis", self.store.redis),
+        ]
+        for patcher in self.store_patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.store_patchers:
+            patcher.stop()
+        super().tearDown()
+
+    def _ranked(self, url):
+        with self.assertNumQueries(0):
+            return self.client.get(url).json()["results"]
+
+    def test_saved_stats_are_patched_into_cache(self):
+        self.client.get("/leaderboard/attendance/")
+
+        stats = AttendanceSessionStats.objects.get(member=self.users[0])
+        stats.sessions_attended = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.save()
+
+        results = self._ranked("/leaderboard/attendance/")
+        self.assertEqual(results[0]["member"]["username"], "member0")
+        self.assertEqual(results[0]["sessions_attended"], 50)
+        self.assertEqual([r["rank"] for r in results], list(range(1, 11)))
+
+        results = self._ranked("/leaderboard/attendance/?order_by=recent")
+        self.assertEqual(len(results), 10)
+
+        response = self.client.get("/leaderboard/attendance/ranked/member0/")
+        self.assertEqual(response.json()["rank"], 1)
+
+    def test_patched_snapshot_gets_a_new_etag(self):
+        etag = self.client.get("/leaderboard/attendance/")["ETag"]
+
+        response = self.client.get("/leaderboard/attendance/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        stats = AttendanceSessionStats.objects.get(member=self.users[0])
+        stats.sessions_attended = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.save()
+
+        response = self.client.get("/leaderboard/attendance/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_changes_in_one_transaction_are_patched_once(self):
+        self.client.get("/leaderboard/attendance/")
+        manager = LEADERBOARD_MANAGERS["attendance"]
+
+        with patch.object(manager, "patch", wraps=manager.patch) as patched:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i, stats in enumerate(
+                    AttendanceSessionStats.objects.filter(member__in=self.users[:5])
+                ):
+                    stats.sessions_attended = 100 + i
+                    stats.save()
+
+        patched.assert_called_once()
+        member_ids, usernames = patched.call_args.args
+        self.assertEqual(sorted(member_ids), sorted(u.id for u in self.users[:5]))
+        self.assertEqual(usernames, {f"member{i}" for i in range(5)})
+
+        results = self._ranked("/leaderboard/attendance/")
+        self.assertEqual(
+            {r["member"]["username"] for r in results[:5]},
+            {f"member{i}" for i in range(5)},
+        )
+
+    def test_rolled_back_changes_are_not_patched(self):
+        self.client.get("/leaderboard/attendance/")
+        manager = LEADERBOARD_MANAGERS["attendance"]
+
+        with patch.object(manager, "patch", wraps=manager.patch) as patched:
+            try:
+                with transaction.atomic():
+                    stats = AttendanceSessionStats.objects.get(member=self.users[0])
+                    stats.sessions_attended = 100
+                    stats.save()
+                    raise RuntimeError("rolled back")
+            except RuntimeError:
+                pass
+
+            with self.captureOnCommitCallbacks(execute=True):
+                stats = AttendanceSessionStats.objects.get(member=self.users[1])
+                stats.sessions_attended = 100
+                stats.save()
+
+        patched.assert_called_once()
+        member_ids, usernames = patched.call_args.args
+        self.assertEqual(member_ids, [self.users[1].id])
+        self.assertEqual(usernames, {"member1"})
+
+    def test_snapshot_is_dropped_when_it_cant_be_patched(self):
+        self.client.get("/leaderboard/attendance/")
+        manager = LEADERBOARD_MANAGERS["attendance"]
+
+        stats = AttendanceSessionStats.objects.get(member=self.users[0])
+        stats.sessions_attended = 50
+        with patch.object(
+            manager.cache_handler, "lock", side_effect=LockError("timed out")
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                stats.save()
+
+        self.assertIsNone(cache.get(manager.generate_key()))
+        results = self.client.get("/leaderboard/attendance/").json()["results"]
+        self.assertEqual(results[0]["sessions_attended"], 50)
+
+    def test_deleted_stats_are_dropped_from_cache(self):
+        self.client.get("/leaderboard/cohorts/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CohortStats.objects.get(member=self.users[9]).delete()
+
+        results = self._ranked("/leaderboard/cohorts/")
+        self.assertEqual(len(results), 9)
+        self.assertEqual(results[0]["member"]["username"], "member8")
+
+    def test_cohort_membership_changes_refresh_cohorts(self):
+        self.client.get("/leaderboard/cohorts/")
+        cohort = Cohort.objects.get(name="cohort0")
+        newcomer = User.objects.create(username="newcomer", discord_id=-1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cohort.members.add(newcomer)
+
+        cohorts = self.client.get("/leaderboard/cohorts/").json()["cohorts"]
+        self.assertIn(
+            "newcomer",
+            [m["username"] for m in cohorts[str(cohort.id)]["members"]],
+        )
+
+    def test_rows_in_uncached_cohorts_are_hydrated(self):
+        self.client.get("/leaderboard/cohorts/")
+
+        # no signals, so only the row's reference says the cohort exists
+        (cohort,) = Cohort.objects.bulk_create([Cohort(name="late")])
+        with self.captureOnCommitCallbacks(execute=True):
+            CohortStats.objects.create(
+                member=self.users[0], cohort=cohort, dailyChecks=100
+            )
+
+        body = self.client.get("/leaderboard/cohorts/").json()
+        self.assertEqual(body["results"][0]["cohort"]["id"], cohort.id)
+        self.assertEqual(body["cohorts"][str(cohort.id)]["name"], "late")
+
+    def test_cache_hit_does_not_extend_expiry(self):
+        manager = AttendanceLeaderboardManager(
+            cache_handler=Mock(), generate_key=lambda: "attendance:test"
+        )
+        manager.cache_handler.get.return_value = versioned({"attendance": []})
+
+        manager.get_all()
+
+        manager.cache_handler.set.assert_not_called()
+
+
+class FakeServer:
+    """
+    an http server on localhost for commands that call out to third parties.
+    subclasses implement `respond(method, path, headers, body)`, returning
+    (status, headers, payload). each response takes `latency`s.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_request(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, headers, payload = server.respond(
+                    method, self.path, self.headers, body
+                )
+                time.sleep(server.latency)
+
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def respond(self, method, path, headers, body):
+        raise NotImplementedError
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeLeetcodeServer(FakeServer):
+    """
+    serves leetcode's profile query, turning every `rate_limit_every`th
+    request away with a 429
+    """
+
+    def __init__(self, latency=0.0, rate_limit_every=0):
+        super().__init__(latency)
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.rate_limited = 0
+        # username -> profiles served
+        self.served = Counter()
+
+    def respond(self, method, path, headers, body):
+        username = body["variables"]["username"]
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return 429, {"Retry-After": "0"}, {"errors": ["rate limited"]}
+            self.served[username] += 1
+
+        if username == "missing":
+            return 200, {}, {"data": {"matchedUser": None}}
+
+        # lc<n> has solved n easy, 2n medium and 3n hard problems
+        n = int(username[2:])
+        counts = {"All": 6 * n, "Easy": n, "Medium": 2 * n, "Hard": 3 * n}
+        return (
+            200,
+            {},
+            {
+                "data": {
+                    "matchedUser": {
+                        "submitStats": {
+                            "acSubmissionNum": [
+                                {"difficulty": d, "count": c} for d, c in counts.items()
+                            ]
+                        }
+                    }
+                }
+            },
+        )
+
+
+class UpdateLeetcodeStatsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = create_members(0, 20)
+        for i, user in enumerate(self.users):
+            User.objects.filter(pk=user.pk).update(leetcode={"username": f"lc{i}"})
+
+        # half the members have never been fetched
+        LeetcodeStats.objects.filter(user__in=self.users[10:]).delete()
+
+    def _update(self, server, **options):
+        options = {"rate": 1000, "backoff": 0, "force": True, **options}
+        with patch(
+            "leaderboard.management.commands.update_leetcode_stats"
+            ".LEETCODE_GRAPHQL_URL",
+            f"{server.url}/graphql",
+        ):
+            call_command("update_leetcode_stats", stdout=StringIO(), **options)
+
+    def test_stats_are_written_in_one_bulk_write(self):
+        with FakeLeetcodeServer(rate_limit_every=4) as server:
+            with CaptureQueriesContext(connection) as queries:
+                self._update(server, concurrency=8)
+
+        self.assertGreater(server.rate_limited, 0)
+        self.assertEqual(server.requests, 20 + server.rate_limited)
+
+        writes = [
+            q["sql"]
+            for q in queries.captured_queries
+            if "leaderboard_leetcodestats" in q["sql"]
+            and q["sql"].startswith(("UPDATE", "INSERT"))
+        ]
+        self.assertEqual(len(writes), 2)
+
+        for i, user in enumerate(self.users):
+            stats = LeetcodeStats.objects.get(user=user)
+            self.assertEqual(
+                (stats.total_solved, stats.easy_solved, stats.hard_solved),
+                (6 * i, i, 3 * i),
+            )
+
+    def test_only_due_and_found_profiles_are_written(self):
+        RefreshScheduler(RefreshSchedule.LEETCODE).record(
+            changed=[u.id for u in self.users[:10]], unchanged=[]
+        )
+        User.objects.filter(pk=self.users[10].pk).update(
+            leetcode={"username": "missing"}
+        )
+
+        with FakeLeetcodeServer() as server:
+            self._update(server, force=False)
+
+        # members 0-9 were just checked, and member10 can't be found
+        self.assertEqual(server.requests, 10)
+        self.assertEqual(LeetcodeStats.objects.count(), 19)
+        self.assertEqual(LeetcodeStats.objects.get(user=self.users[15]).hard_solved, 45)
+        self.assertEqual(
+            RefreshSchedule.objects.filter(
+                source=RefreshSchedule.LEETCODE, last_changed__isnull=True
+            )
+            .get()
+            .user,
+            self.users[10],
+        )
+
+    def test_members_without_a_handle_dont_hold_the_queue(self):
+        User.objects.filter(pk__in=[u.pk for u in self.users[:4]]).update(leetcode=None)
+        User.objects.filter(pk=self.users[4].pk).update(leetcode={"username": ""})
+
+        with FakeLeetcodeServer() as server:
+            self._update(server, force=False, limit=5)
+
+        self.assertEqual(server.requests, 5)
+        self.assertEqual(
+            set(
+                RefreshSchedule.objects.filter(
+                    source=RefreshSchedule.LEETCODE
+                ).values_list("user_id", flat=True)
+            ),
+            {u.id for u in self.users[5:10]},
+        )
+
+    def test_gives_up_after_retries(self):
+        with FakeLeetcodeServer(rate_limit_every=1) as server:
+            self._update(server, username="member3", retries=2)
+
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(LeetcodeStats.objects.get(user=self.users[3]).total_solved, 3)
+
+    def test_concurrency_throughput(self):
+        latency = 0.05
+        durations = {}
+        for concurrency in (1, 8):
+            with FakeLeetcodeServer(latency=latency) as server:
+                start = time.perf_counter()
+                self._update(server, concurrency=concurrency)
+                durations[concurrency] = time.perf_counter() - start
+
+            print(
+                f"update_leetcode_stats concurrency={concurrency}: 20 members "
+                f"in {durations[concurrency] * 1000:.0f} ms, "
+                f"{20 / durations[concurrency]:.1f} members/s"
+            )
+            self.assertEqual(server.served, Counter(f"lc{i}" for i in range(20)))
+            self.assertEqual(server.requests, 20)
+
+        # one at a time, every request waits out the latency
+        self.assertGreaterEqual(durations[1], 20 * latency)
+        # 8 at a time is 3 rounds, leave plenty of room for overhead
+        self.assertLess(durations[8], durations[1] / 3)
+
+
+class FakeGitHubServer(FakeServer):
+    """
+    serves public events with etags and the graphql user query. gh<n> has
+    n contributions, 2n prs and 3n followers, bumped by `activity`, plus any
+    `new_followers`, which aren't public events. the first graphql request is
+    rate limited.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.activity = {}
+        self.new_followers = {}
+        self.events = {200: 0, 304: 0}
+        self.queries = []
+        self.rate_limited = False
+
+    def respond(self, method, path, headers, body):
+        if method == "GET":
+            login = path.split("/")[2]
+            if login == "missing":
+                return 404, {}, {"message": "Not Found"}
+
+            etag = f'"{login}-{self.activity.get(login, 0)}"'
+            status = 304 if headers.get("If-None-Match") == etag else 200
+            with self.lock:
+                self.events[status] += 1
+            return status, {"ETag": etag}, [] if status == 200 else None
+
+        with self.lock:
+            if not self.rate_limited:
+                self.rate_limited = True
+                return 403, {"Retry-After": "0"}, {"message": "secondary rate limit"}
+            self.queries.append(body["variables"])
+
+        data = {}
+        for alias, login in body["variables"].items():
+            if login == "missing":
+                data[alias] = None
+                continue
+
+            n = int(login[2:]) + self.activity.get(login, 0)
+            data[alias] = {
+                "contributionsCollection": {
+                    "contributionCalendar": {"totalContributions": n}
+                },
+                "pullRequests": {"totalCount": 2 * n},
+                "followers": {"totalCount": 3 * n + self.new_followers.get(login, 0)},
+            }
+        return 200, {}, {"data": data}
+
+
+class UpdateGitHubStatsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = create_members(0, 30)
+        for i, user in enumerate(self.users):
+            User.objects.filter(pk=user.pk).update(github={"username": f"gh{i}"})
+
+        GitHubStats.objects.filter(user__in=self.users[20:]).delete()
+
+    def _update(self, server, **options):
+        options = {"rate": 1000, "backoff": 0, "batch_size": 8, **options}
+        module = "leaderboard.management.commands.update_github_stats"
+        with patch(f"{module}.GITHUB_API_URL", server.url), patch(
+            f"{module}.GITHUB_TOKEN", "token"
+        ):
+            call_command("update_github_stats", stdout=StringIO(), **options)
+
+    def test_batched_and_written_in_one_bulk_write(self):
+        with FakeGitHubServer() as server:
+            with CaptureQueriesContext(connection) as queries:
+                self._update(server, concurrency=4)
+
+        self.assertEqual(server.events, {200: 30, 304: 0})
+        self.assertEqual(sorted(len(q) for q in server.queries), [6, 8, 8, 8])
+
+        writes = [
+            q["sql"]
+            for q in queries.captured_queries
+            if "leaderboard_githubstats" in q["sql"]
+            and q["sql"].startswith(("UPDATE", "INSERT"))
+        ]
+        self.assertEqual(len(writes), 2)
+
+        stats = GitHubStats.objects.get(user=self.users[25])
+        self.assertEqual(
+            (stats.total_commits, stats.total_prs, stats.followers, stats.etag),
+            (25, 50, 75, '"gh25-0"'),
+        )
+
+    def test_unchanged_members_are_not_refetched(self):
+        User.objects.filter(pk=self.users[0].pk).update(github={"username": "missing"})
+
+        with FakeGitHubServer() as server:
+            self._update(server)
+            RefreshSchedule.objects.update(next_refresh=timezone.now())
+
+            server.queries.clear()
+            server.events = {200: 0, 304: 0}
+            server.activity["gh7"] = 10
+            self._update(server)
+
+        self.assertEqual(server.events, {200: 1, 304: 28})
+        self.assertEqual(server.queries, [{"u0": "gh7"}])
+        self.assertEqual(GitHubStats.objects.get(user=self.users[7]).followers, 51)
+
+        # forcing skips the conditional requests
+        with FakeGitHubServer() as server:
+            self._update(server, force=True, username="member3")
+        self.assertEqual(server.events, {200: 0, 304: 0})
+        self.assertEqual(server.queries, [{"u0": "gh3"}])
+
+    def test_stats_are_refetched_without_new_activity_once_stale(self):
+        with FakeGitHubServer() as server:
+            self._update(server)
+            RefreshSchedule.objects.update(next_refresh=timezone.now())
+            GitHubStats.objects.filter(user=self.users[5]).update(
+                last_fetched=timezone.now() - timedelta(days=2)
+            )
+
+            server.queries.clear()
+            server.events = {200: 0, 304: 0}
+            server.new_followers = {"gh5": 1, "gh6": 1}
+            self._update(server)
+
+        self.assertEqual(server.events, {200: 0, 304: 30})
+        self.assertEqual(server.queries, [{"u0": "gh5"}])
+        self.assertEqual(GitHubStats.objects.get(user=self.users[5]).followers, 16)
+        self.assertEqual(GitHubStats.objects.get(user=self.users[6]).followers, 18)
+
+    def test_rate_limit_can_be_an_http_date(self):
+        retry_at = timezone.now() + timedelta(seconds=30)
+        self.assertAlmostEqual(
+            parse_retry_after(format_datetime(retry_at, usegmt=True)), 30, delta=2
+        )
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        self.assertEqual(parse_retry_after("2"), 2)
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_requires_token(self):
+        with patch(
+            "leaderboard.management.commands.update_github_stats.GITHUB_TOKEN", None
+        ):
+            with self.assertRaises(CommandError):
+                call_command("update_github_stats", stdout=StringIO())
+
+
+class RefreshSchedulerTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = create_members(0, 4)
+        self.scheduler = RefreshScheduler(RefreshSchedule.LEETCODE)
+
+    def _interval(self, user):
+        return RefreshSchedule.objects.get(user=user).interval
+
+    def test_dormant_members_back_off_and_active_ones_reset(self):
+        ids = [u.id for u in self.users]
+        self.scheduler.record(changed=ids[:2], unchanged=ids[2:])
+
+        for _ in range(10):
+            self.scheduler.record(changed=[ids[0]], unchanged=ids[1:])
+
+        self.assertEqual(self._interval(self.users[0]), timedelta(hours=1))
+        self.assertEqual(self._interval(self.users[1]), timedelta(weeks=1))
+
+        self.scheduler.record(changed=[ids[1]], unchanged=[])
+        self.assertEqual(self._interval(self.users[1]), timedelta(hours=1))
+
+    def test_due_members_are_served_most_overdue_first(self):
+        now = timezone.now()
+        ids = [u.id for u in self.users]
+        self.scheduler.record(changed=ids[1:], unchanged=[], now=now)
+        RefreshSchedule.objects.filter(user_id=ids[2]).update(
+            next_refresh=now - timedelta(days=1)
+        )
+        RefreshSchedule.objects.filter(user_id=ids[3]).update(
+            next_refresh=now - timedelta(hours=1)
+        )
+
+        # never checked members come first, not yet due ones not at all
+        due = self.scheduler.due(User.objects.all(), now=now)
+        self.assertEqual([u.id for u in due], [ids[0], ids[2], ids[3]])
+
+        due = self.scheduler.due(User.objects.all(), now=now, limit=2)
+        self.assertEqual([u.id for u in due], [ids[0], ids[2]])
+
+        # schedules are per source
+        due = RefreshScheduler(RefreshSchedule.GITHUB).due(User.objects.all())
+        self.assertEqual(len(due), 4)
+
+
+class UpdateAttendanceStatsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.redis_patcher = patch(
+            "leaderboard.store.LeaderboardStore.redis", FakeRedis()
+        )
+        self.redis_patcher.start()
+        self.recounts_patcher = patch.object(attendance_recounts, "_redis", FakeRedis())
+        self.recounts_patcher.start()
+
+    def tearDown(self):
+        self.recounts_patcher.stop()
+        self.redis_patcher.stop()
+        super().tearDown()
+
+    def _session(self, key, attendees, expires_in=None):
+        session = AttendanceSession.objects.create(
+            key=key,
+            title=key,
+            expires=timezone.now() + (expires_in or timedelta(hours=1)),
+        )
+        session.attendees.add(*attendees)
+        return session
+
+    def _update(self, **options):
+        with CaptureQueriesContext(connection) as queries:
+            call_command("update_attendance_stats", stdout=StringIO(), **options)
+        return queries
+
+    def _counts(self):
+        return dict(
+            AttendanceSessionStats.objects.values_list(
+                "member__username", "sessions_attended"
+            )
+        )
+
+    def test_rebuild_counts_sessions_in_one_upsert(self):
+        users = create_members(0, 5)
+        self._session("a", users[:3])
+        self._session("b", users[1:3])
+        small = len(self._update())
+
+        self.assertEqual(
+            self._counts(),
+            {"member0": 1, "member1": 2, "member2": 2, "member3": 0, "member4": 0},
+        )
+
+        users += create_members(5, 50)
+        self._session("c", users)
+        queries = self._update()
+
+        writes = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith('INSERT INTO "engagement_attendancesessionstats"')
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(len(queries), small)
+        self.assertEqual(self._counts()["member2"], 3)
+        self.assertEqual(self._counts()["member54"], 1)
+
+    def test_incremental_only_recounts_recent_sessions(self):
+        users = create_members(0, 4)
+        expired = self._session("old", users[:2], expires_in=-timedelta(days=1))
+        active = self._session("new", [])
+        self._update()
+
+        # a late addition to an old session waits for the next full rebuild
+        expired.attendees.add(users[2])
+        active.attendees.add(users[3])
+        self._update(incremental=True)
+
+        self.assertEqual(
+            self._counts(),
+            {"member0": 1, "member1": 1, "member2": 0, "member3": 1},
+        )
+
+        self._update()
+        self.assertEqual(self._counts()["member2"], 1)
+
+    def test_incremental_recounts_removed_attendees(self):
+        users = create_members(0, 4)
+        old = self._session("old", users[:2], expires_in=-timedelta(days=1))
+        gone = self._session("gone", users[2:], expires_in=-timedelta(days=1))
+        self._update()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            old.attendees.remove(users[0])
+            users[1].attendance_sessions.clear()
+            gone.delete()
+        self._update(incremental=True)
+
+        self.assertEqual(
+            self._counts(),
+            {"member0": 0, "member1": 0, "member2": 0, "member3": 0},
+        )
+        self.assertEqual(attendance_recounts.get(), set())
+
+    def test_recounts_everyone_if_removals_cant_be_queued(self):
+        users = create_members(0, 2)
+        old = self._session("old", users, expires_in=-timedelta(days=1))
+        self._update()
+
+        with patch.object(
+            attendance_recounts.redis, "sadd", side_effect=RedisError("down")
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                old.attendees.remove(users[0])
+        self._update(incremental=True)
+
+        self.assertEqual(self._counts(), {"member0": 0, "member1": 1})
+
+
+class ReactionEventTests(TestCase):
+    url = "/leaderboard/events/process/"
+
+    def setUp(self):
+        super().setUp()
+        self.api_patcher = patch("members.permissions.IsApiKey.has_permission")
+        self.api_patcher.start().return_value = True
+        self.client = APIClient()
+        self.resolver_patcher = patch(
+            "leaderboard.views.discord_resolver",
+            DiscordIdResolver(redis=FakeRedis()),
+        )
+        self.resolver_patcher.start()
+        self.user, self.user2 = create_members(0, 2)
+
+    def tearDown(self):
+        super().tearDown()
+        self.api_patcher.stop()
+        self.resolver_patcher.stop()
+
+    def _applied(self, user, model=InternshipApplicationStats):
+        return model.objects.get(user=user).applied
+
+    def test_reaction_is_one_statement(self):
+        event = {"discord_id": 0, "channel_id": INTERNSHIP_CHANNEL_ID}
+
+        # member lookup, then cached
+        for num_queries in (2, 1):
+            with self.assertNumQueries(num_queries):
+                response = self.client.post(self.url, event, format="json")
+            self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(self._applied(self.user), 2)
+
+    def test_removed_reaction_is_floored_at_zero(self):
+        event = {"discord_id": 0, "channel_id": INTERNSHIP_CHANNEL_ID}
+
+        response = self.client.delete(self.url, event, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(InternshipApplicationStats.objects.exists())
+
+        self.client.post(self.url, event, format="json")
+        for _ in range(2):
+            self.client.delete(self.url, event, format="json")
+
+        self.assertEqual(self._applied(self.user), 0)
+
+    def test_unknown_member(self):
+        response = self.client.post(
+            self.url,
+            {"discord_id": 999, "channel_id": INTERNSHIP_CHANNEL_ID},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch(self):
+        InternshipApplicationStats.objects.create(user=self.user2, applied=1)
+        events = [
+            {"discord_id": 0, "channel_id": INTERNSHIP_CHANNEL_ID},
+            {"discord_id": 0, "channel_id": INTERNSHIP_CHANNEL_ID},
+            {"discord_id": 0, "channel_id": NEW_GRAD_CHANNEL_ID},
+            {
+                "discord_id": 1,
+                "channel_id": INTERNSHIP_CHANNEL_ID,
+                "action": "decrement",
+            },
+            {
+                "discord_id": 1,
+                "channel_id": INTERNSHIP_CHANNEL_ID,
+                "action": "decrement",
+            },
+            {"discord_id": 999, "channel_id": INTERNSHIP_CHANNEL_ID},
+            {"discord_id": 0, "channel_id": -1},
+            "not an event",
+            {"discord_id": 0, "channel_id": [INTERNSHIP_CHANNEL_ID]},
+            {"discord_id": 0, "channel_id": INTERNSHIP_CHANNEL_ID, "action": {}},
+        ]
+
+        # member lookup, and one upsert per channel. the upserts share a
+        # transaction, which is a savepoint inside the test's
+        with self.assertNumQueries(5):
+            response = self.client.post(f"{self.url}batch/", events, format="json")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            response.data, {"applied": 5, "unknown": [5], "invalid": [6, 7, 8, 9]}
+        )
+        self.assertEqual(self._applied(self.user), 2)
+        self.assertEqual(self._applied(self.user, NewGradApplicationStats), 1)
+        self.assertEqual(self._applied(self.user2), 0)
+
+
+class StatsHistoryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.users = create_members(0, 3)
+        self.cohort = Cohort.objects.get(name="cohort0")
+
+    def _solved(self, username, total):
+        LeetcodeStats.objects.filter(user__username=username).update(total_solved=total)
+
+    def _history(self, **filters):
+        return list(
+            StatsHistory.objects.filter(
+                board="leetcode", metric="total_solved", **filters
+            )
+            .order_by("member__username", "day")
+            .values_list("member__username", "day", "period", "value", "delta")
+        )
+
+    def test_snapshot_only_records_changes(self):
+        monday, tuesday = date(2026, 10, 5), date(2026, 10, 6)
+        take_snapshot("leetcode", monday)
+
+        # member0 solved nothing yet, the others get a baseline
+        self.assertEqual(
+            self._history(),
+            [("member1", monday, 1, 1, 0), ("member2", monday, 1, 2, 0)],
+        )
+
+        self._solved("member0", 4)
+        self._solved("member2", 5)
+        take_snapshot("leetcode", tuesday)
+        self.assertEqual(
+            self._history(day=tuesday),
+            [("member0", tuesday, 1, 4, 0), ("member2", tuesday, 1, 5, 3)],
+        )
+
+        # taking the same day again replaces it
+        self._solved("member2", 2)
+        take_snapshot("leetcode", tuesday)
+        self.assertEqual(self._history(day=tuesday), [("member0", tuesday, 1, 4, 0)])
+
+    def test_cohort_history_is_kept_per_cohort(self):
+        other = Cohort.objects.create(name="other")
+        CohortStats.objects.create(member=self.users[1], cohort=other, dailyChecks=7)
+        take_snapshot("cohort", date(2026, 10, 5))
+
+        self.assertEqual(
+            dict(
+                StatsHistory.objects.filter(
+                    board="cohort", metric="daily_checks", member=self.users[1]
+                ).values_list("scope", "value")
+            ),
+            {self.cohort.id: 1, other.id: 7},
+        )
+
+    def test_downsample_folds_whole_weeks(self):
+        # monday 5th to wednesday 14th, the first snapshot is a baseline
+        for day in range(5, 15):
+            self._solved("member1", day)
+            take_snapshot("leetcode", date(2026, 10, day))
+
+        # the week of the 12th isn't over by the 14th
+        downsample(date(2026, 10, 14))
+
+        self.assertEqual(
+            self._history(member__username="member1"),
+            [
+                ("member1", date(2026, 10, 5), 7, 11, 6),
+                ("member1", date(2026, 10, 12), 1, 12, 1),
+                ("member1", date(2026, 10, 13), 1, 13, 1),
+                ("member1", date(2026, 10, 14), 1, 14, 1),
+            ],
+        )
+
+        downsample(date(2026, 10, 14))
+        self.assertEqual(len(self._history(member__username="member1")), 4)
+
+    def test_day_backfilled_into_a_folded_week_is_merged(self):
+        for day in range(5, 12):
+            self._solved("member1", day)
+            take_snapshot("leetcode", date(2026, 10, day))
+        downsample(date(2026, 10, 12))
+
+        # a snapshot of the 8th that failed at the time, recorded late
+        StatsHistory.objects.create(
+            member=self.users[1],
+            board="leetcode",
+            metric="total_solved",
+            day=date(2026, 10, 8),
+            value=8,
+            delta=2,
+        )
+        downsample(date(2026, 10, 12))
+
+        self.assertEqual(
+            self._history(member__username="member1"),
+            [("member1", date(2026, 10, 5), 7, 11, 8)],
+        )
+
+    def test_member_history_is_one_query(self):
+        today = timezone.localdate()
+        take_snapshot("leetcode", today - timedelta(days=1))
+        self._solved("member2", 9)
+        take_snapshot("leetcode", today)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/leaderboard/leetcode/history/member2/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [(row["value"], row["delta"]) for row in response.json()["results"]],
+            [(2, 0), (9, 7)],
+        )
+
+    def test_top_movers_is_one_query(self):
+        today = timezone.localdate()
+        take_snapshot("leetcode", today - timedelta(days=30))
+        self._solved("member0", 20)
+        self._solved("member1", 3)
+        self._solved("member2", 12)
+        take_snapshot("leetcode", today)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/leaderboard/leetcode/history/movers/", {"days": 7}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        # member0's first row is only a baseline
+        self.assertEqual(
+            [
+                (row["member"]["username"], row["change"])
+                for row in response.json()["results"]
+            ],
+            [("member2", 10), ("member1", 2)],
+        )
+
+    def test_history_needs_a_tracked_metric(self):
+        self.assertEqual(
+            self.client.get("/leaderboard/attendance/history/movers/").status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get(
+                "/leaderboard/leetcode/history/movers/", {"order_by": "recent"}
+            ).status_code,
+            400,
+        )
+        self.assertEqual(
+            self.client.get("/leaderboard/cohort/history/member1/").status_code, 400
+        )
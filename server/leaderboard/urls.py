@@ -24,6 +24,11 @@ urlpatterns = [
         views.InjestReactionEventView.as_view(),
         name="process-events",
     ),
+    path(
+        "events/process/batch/",
+        views.InjestReactionBatchView.as_view(),
+        name="process-events-batch",
+    ),
     path(
         "attendance/",
         views.AttendanceSessionLeaderboard.as_view(),
@@ -34,4 +39,24 @@ urlpatterns = [
         views.CohortStatsLeaderboard.as_view(),
         name="cohort-leaderboard",
     ),
+    path(
+        "<str:board>/history/movers/",
+        views.StatsHistoryMoversView.as_view(),
+        name="stats-history-movers",
+    ),
+    path(
+        "<str:board>/history/<str:member>/",
+        views.StatsHistoryMemberView.as_view(),
+        name="stats-history-member",
+    ),
+    path(
+        "<str:board>/ranked/",
+        views.RankedLeaderboardPageView.as_view(),
+        name="ranked-leaderboard",
+    ),
+    path(
+        "<str:board>/ranked/<str:member>/",
+        views.RankedLeaderboardMemberView.as_view(),
+        name="ranked-leaderboard-member",
+    ),
 ]
@@ -1,26 +1,32 @@
 import logging
+import math
 import os
+from collections import defaultdict
 from datetime import timedelta
 
-from cache import CachedView, DjangoCacheHandler
+from cache import CachedView, DjangoCacheHandler, conditional_response
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import F
-from django.http import Http404, JsonResponse
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from engagement.serializers import (
     AttendanceStatsSerializer,
     CohortStatsLeaderboardSerializer,
 )
-from members.models import User
+from members.discord import discord_resolver
 from members.permissions import IsApiKey
+from redis.exceptions import RedisError
 from rest_framework import generics, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from server.renderers import ORJSONResponse
+
+from .applications import apply_application_deltas
+from .history import TRACKED_STATS, member_history, top_movers
 from .managers import (
     AttendanceLeaderboardManager,
     CohortStatsLeaderboardManager,
@@ -28,25 +34,112 @@ from .managers import (
     LeetcodeLeaderboardManager,
 )
 from .models import InternshipApplicationStats, NewGradApplicationStats
+from .payloads import PayloadCache
 from .serializers import (
     GitHubStatsSerializer,
     InternshipApplicationStatsSerializer,
     LeetcodeStatsSerializer,
     NewGradApplicationStatsSerializer,
 )
+from .store import LeaderboardStore
 
 logger = logging.getLogger(__name__)
 INTERNSHIP_CHANNEL_ID = int(os.getenv("INTERNSHIP_CHANNEL_ID"))
 NEW_GRAD_CHANNEL_ID = int(os.getenv("NEW_GRAD_CHANNEL_ID"))
 
 
+def validate_order_by(manager, order_by):
+    if order_by not in manager.ordering_options:
+        raise ValidationError(
+            f"Invalid order_by parameter. Must be one of: {', '.join(manager.ordering_options.keys())}"
+        )
+
+
+def parse_updated_within(time_range):
+    """cutoff for the `updated_within` (hours) query param, if given"""
+    if not time_range:
+        return None
+
+    try:
+        hours = int(time_range)
+    except ValueError:
+        raise ValidationError("updated_within must be a valid number of hours")
+
+    return timezone.now() - timedelta(hours=hours)
+
+
+payloads = PayloadCache()
+PAGE_SIZE = 50
+
+
+def snapshot_response(request, snapshots, build, cutoff=None, page=()):
+    """
+    `build()` a response from cached snapshots, or 304 if the client already
+    has it. `page` (e.g. order_by and page number) identifies the response
+    within the snapshots, whose encoded and compressed body is cached. pages
+    filtered by `updated_within` change as time passes, so those are always
+    built.
+    """
+    if cutoff:
+        return build()
+
+    encoding = payloads.choose_encoding(request)
+    response = conditional_response(
+        request,
+        snapshots,
+        lambda: payloads.get_response(request, snapshots, page, build, encoding),
+        variant=encoding,
+    )
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def parse_page(page_number, count, per_page=PAGE_SIZE):
+    """
+    the page `paginate_ranked` serves for the `page` query param, out of
+    `count` rows. pages past the end are the last page, so each page of a
+    snapshot has one cache key.
+    """
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        raise ValidationError("page must be a number")
+
+    return min(max(page_number, 1), max(math.ceil(count / per_page), 1))
+
+
+def renumber(rows, start=1):
+    """copies of `rows` ranked from `start`, leaving the cached rows alone"""
+    return [{**row, "rank": rank} for rank, row in enumerate(rows, start=start)]
+
+
+def paginate_ranked(ranked, page_number, rerank=False, per_page=PAGE_SIZE):
+    """
+    page of an already ranked list. `rerank` renumbers the page relative to
+    `ranked`, e.g. after filtering, without touching the cached rows.
+    """
+    paginator = Paginator(ranked, per_page)
+    page = paginator.get_page(page_number)
+
+    results = list(page)
+    if rerank:
+        results = renumber(results, start=page.start_index())
+
+    return {
+        "count": paginator.count,
+        "next": page.next_page_number() if page.has_next() else None,
+        "prev": page.previous_page_number() if page.has_previous() else None,
+        "results": results,
+    }
+
+
 class LeetcodeLeaderboardView(generics.ListAPIView):
     serializer_class = LeetcodeStatsSerializer
     # allow any permission for now
     permission_classes = []
 
     def generate_key():
-        return "leetcode:all"
+        return "leetcode:snapshot"
 
     manager = LeetcodeLeaderboardManager(
         DjangoCacheHandler(expiration=60 * 60), generate_key
@@ -56,47 +149,22 @@ class LeetcodeLeaderboardView(generics.ListAPIView):
         order_by = request.query_params.get("order_by", "total")
         time_range = request.query_params.get("updated_within", None)
 
-        leetcode_data = self.manager.get_all()
-
-        for element in leetcode_data:
-            element["completion_rate"] = (
-                element["total_solved"]
-                * 100.0
-                / (
-                    element["easy_solved"]
-                    + element["medium_solved"]
-                    + element["hard_solved"]
-                )
-            )
+        validate_order_by(self.manager, order_by)
+        cutoff = parse_updated_within(time_range)
 
-        if time_range:
-            try:
-                hours = int(time_range)
-                cutoff = timezone.now() - timedelta(hours=hours)
-                leetcode_data = filter(
-                    lambda x: x["last_updated"] >= cutoff, leetcode_data
-                )
-            except ValueError:
-                raise ValidationError("updated_within must be a valid number of hours")
+        snapshot = self.manager.get_cached()
 
-        ordering_options = {
-            "total": "total_solved",
-            "easy": "easy_solved",
-            "medium": "medium_solved",
-            "hard": "hard_solved",
-            "recent": "last_updated",
-            "completion": "completion_rate",
-        }
+        def build():
+            leetcode_data = snapshot["value"][order_by]
 
-        order_field = ordering_options.get(order_by)
-        if not order_field:
-            raise ValidationError(
-                f"Invalid order_by parameter. Must be one of: {', '.join(ordering_options.keys())}"
-            )
+            if cutoff:
+                leetcode_data = renumber(
+                    x for x in leetcode_data if x["last_updated"] >= cutoff
+                )
 
-        leetcode_data.sort(key=lambda x: x[order_field], reverse=True)
+            return ORJSONResponse({"results": leetcode_data})
 
-        return JsonResponse({"results": leetcode_data})
+        return snapshot_response(request, [snapshot], build, cutoff, (order_by,))
 
 
 class GitHubLeaderboardView(generics.ListAPIView):
@@ -104,7 +172,7 @@ class GitHubLeaderboardView(generics.ListAPIView):
     permission_classes = []
 
     def generate_key():
-        return "github:all"
+        return "github:snapshot"
 
     manager = GitHubLeaderboardManager(
         DjangoCacheHandler(expiration=60 * 60), generate_key
@@ -114,32 +182,22 @@ class GitHubLeaderboardView(generics.ListAPIView):
         order_by = request.query_params.get("order_by", "commits")
         time_range = request.query_params.get("updated_within", None)
 
-        github_data = self.manager.get_all()
+        validate_order_by(self.manager, order_by)
+        cutoff = parse_updated_within(time_range)
 
-        if time_range:
-            try:
-                hours = int(time_range)
-                cutoff = timezone.now() - timedelta(hours=hours)
-                github_data = filter(lambda x: x["last_update"] >= cutoff, github_data)
-            except ValueError:
-                raise ValidationError("updated_within must be a valid number of hours")
+        snapshot = self.manager.get_cached()
 
-        ordering_options = {
-            "commits": "total_commits",
-            "prs": "total_prs",
-            "followers": "followers",
-            "recent": "last_updated",
-        }
+        def build():
+            github_data = snapshot["value"][order_by]
 
-        order_field = ordering_options.get(order_by)
-        if not order_field:
-            raise ValidationError(
-                f"Invalid order_by parameter. Must be one of: {', '.join(ordering_options.keys())}"
-            )
+            if cutoff:
+                github_data = renumber(
+                    x for x in github_data if x["last_updated"] >= cutoff
+                )
 
-        github_data.sort(key=lambda x: x[order_field], reverse=True)
+            return ORJSONResponse({"results": github_data})
 
-        return JsonResponse({"results": github_data})
+        return snapshot_response(request, [snapshot], build, cutoff, (order_by,))
 
 
 class InternshipApplicationLeaderboardView(generics.ListAPIView):
@@ -206,11 +264,18 @@ class NewGradApplicationLeaderboardView(generics.ListAPIView):
         return queryset.order_by(order_field)
 
 
+MAX_REACTION_BATCH_SIZE = 1000
+REACTION_DELTAS = {"increment": 1, "decrement": -1}
+
+
 class InjestReactionEventView(generics.CreateAPIView):
     permission_classes = [IsApiKey]
 
     def _get_user_id(self, discord_id):
-        return get_object_or_404(User, discord_id=discord_id).id
+        user_id = discord_resolver.resolve(discord_id)
+        if user_id is None:
+            raise Http404
+        return user_id
 
     def _get_channel_config(self, channel_id):
         channel_configs = {
@@ -226,37 +291,18 @@ class InjestReactionEventView(generics.CreateAPIView):
         return channel_configs.get(channel_id)
 
     def _handle_stats(self, user_id, channel_config, action="increment"):
-        model = channel_config["model"]
-        position_type = channel_config["name"]
-
-        try:
-            stats = model.objects.select_for_update().get(user_id=user_id)
-
-            if action == "increment":
-                stats.applied = F("applied") + 1
-            elif action == "decrement" and stats.applied > 0:
-                stats.applied = F("applied") - 1
-            else:
-                return False
-
-            stats.save()
-            stats.refresh_from_db()
-
-            log_msg = (
-                f"User {user_id} has {stats.applied} {position_type} "
-                f"applications after {action}"
-            )
-            logger.info(log_msg)
-            return True
-
-        except model.DoesNotExist:
-            if action == "increment":
-                model.objects.create(user_id=user_id, applied=1)
-                logger.info(f"Created new {position_type} stats for user {user_id}")
-                return True
+        applied = apply_application_deltas(
+            channel_config["model"], {user_id: REACTION_DELTAS[action]}
+        )
+        if user_id not in applied:
             return False
 
-    @transaction.atomic
+        logger.info(
+            f"User {user_id} has {applied[user_id]} {channel_config['name']} "
+            f"applications after {action}"
+        )
+        return True
+
     def post(self, request, *args, **kwargs):
         discord_id = request.data.get("discord_id")
         channel_id = request.data.get("channel_id")
@@ -279,7 +325,6 @@ class InjestReactionEventView(generics.CreateAPIView):
             logger.error(f"User not found for discord_id: {discord_id}")
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         discord_id = request.data.get("discord_id")
         channel_id = request.data.get("channel_id")
@@ -303,6 +348,95 @@ class InjestReactionEventView(generics.CreateAPIView):
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
+class InjestReactionBatchView(InjestReactionEventView):
+    """
+    bulk version of `InjestReactionEventView`, accepts a json array (or
+    {"events": [...]}) of {discord_id, channel_id, action} reactions, where
+    action is "increment" (the default) or "decrement".
+
+    each member's reactions are summed per channel and applied with one
+    statement per channel, so the floor at zero applies to the net change.
+    invalid events and unknown members are reported back by index.
+    """
+
+    http_method_names = ["post", "options"]
+
+    def _parse_event(self, event):
+        if not isinstance(event, dict):
+            return None
+        try:
+            discord_id = int(event.get("discord_id"))
+        except (TypeError, ValueError):
+            return None
+        channel_id = event.get("channel_id")
+        action = event.get("action", "increment")
+        # lists and objects can't be looked up
+        if not isinstance(channel_id, (int, str)) or not isinstance(action, str):
+            return None
+        channel_config = self._get_channel_config(channel_id)
+        delta = REACTION_DELTAS.get(action)
+        if not channel_config or not delta:
+            return None
+        return discord_id, channel_config, delta
+
+    def post(self, request, *args, **kwargs):
+        events = request.data
+        if isinstance(events, dict):
+            events = events.get("events")
+
+        if not isinstance(events, list):
+            return Response(
+                {"error": "expected a list of events"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(events) > MAX_REACTION_BATCH_SIZE:
+            return Response(
+                {"error": f"at most {MAX_REACTION_BATCH_SIZE} events per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        parsed = {}
+        invalid = []
+        for idx, event in enumerate(events):
+            reaction = self._parse_event(event)
+            if reaction is None:
+                invalid.append(idx)
+            else:
+                parsed[idx] = reaction
+
+        user_ids = discord_resolver.resolve_many(
+            discord_id for discord_id, _, _ in parsed.values()
+        )
+
+        # model -> user id -> net change
+        deltas = defaultdict(lambda: defaultdict(int))
+        unknown = []
+        for idx, (discord_id, channel_config, delta) in parsed.items():
+            if discord_id not in user_ids:
+                unknown.append(idx)
+                continue
+            deltas[channel_config["model"]][user_ids[discord_id]] += delta
+
+        # one statement per channel, applied all or nothing
+        with transaction.atomic():
+            for model, model_deltas in deltas.items():
+                apply_application_deltas(model, model_deltas)
+
+        applied = len(parsed) - len(unknown)
+        logger.info(
+            "Reaction batch applied: %d applied, %d unknown, %d invalid",
+            applied,
+            len(unknown),
+            len(invalid),
+        )
+
+        return Response(
+            {"applied": applied, "unknown": unknown, "invalid": invalid},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
 class AttendancePagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = "page_size"
@@ -315,7 +449,7 @@ class AttendanceSessionLeaderboard(APIView, CachedView):
     pagination_class = AttendancePagination
 
     def generate_key(**kwargs):
-        return "attendance:all"
+        return "attendance:snapshot"
 
     manager = AttendanceLeaderboardManager(
         DjangoCacheHandler(expiration=60 * 60), generate_key
@@ -323,53 +457,34 @@ class AttendanceSessionLeaderboard(APIView, CachedView):
 
     def get(self, request):
         order_by = request.query_params.get("order_by", "attendance")
-        page_number = request.query_params.get("page", 1)
         time_range = request.query_params.get("updated_within", None)
 
-        attendance_data = self.manager.get_all()
+        validate_order_by(self.manager, order_by)
+        cutoff = parse_updated_within(time_range)
 
-        if time_range:
-            try:
-                hours = int(time_range)
-                cutoff = timezone.now() - timedelta(hours=hours)
-                # only include if >= 1 sessions attended
-                attendance_data = filter(
-                    lambda x: x["last_updated"] >= cutoff
-                    and x["sessions_attended"] >= 1,
-                    attendance_data,
-                )
-            except ValueError:
-                raise ValidationError("updated_within must be a valid number of hours")
+        snapshot = self.manager.get_cached()
+        page_number = parse_page(
+            request.query_params.get("page", 1), len(snapshot["value"][order_by])
+        )
 
-        ordering_options = {
-            "attendance": "sessions_attended",
-            "recent": "last_updated",
-        }
+        def build():
+            attendance_data = snapshot["value"][order_by]
 
-        order_field = ordering_options.get(order_by)
-        if not order_field:
-            raise ValidationError(
-                f"Invalid order_by parameter. Must be one of: {', '.join(ordering_options.keys())}"
+            if cutoff:
+                # only include if >= 1 sessions attended
+                attendance_data = [
+                    x
+                    for x in attendance_data
+                    if x["last_updated"] >= cutoff and x["sessions_attended"] >= 1
+                ]
+
+            return ORJSONResponse(
+                paginate_ranked(attendance_data, page_number, rerank=bool(cutoff))
             )
 
-        # Sorting in the backend is slower than sorting in the SQL query itself, but necessary for caching
-        attendance_data.sort(key=lambda x: x[order_field], reverse=True)
-
-        # Annotate with rank
-        for i in range(len(attendance_data)):
-            attendance_data[i]["rank"] = i + 1
-
-        paginator = Paginator(attendance_data, 50)
-        page = paginator.get_page(page_number)
-
-        payload = {
-            "count": paginator.count,
-            "next": page.next_page_number() if page.has_next() else None,
-            "prev": page.previous_page_number() if page.has_previous() else None,
-            "results": list(page),
-        }
-
-        return JsonResponse(payload)
+        return snapshot_response(
+            request, [snapshot], build, cutoff, (order_by, page_number)
+        )
 
 
 class CohortStatsLeaderboard(APIView):
@@ -377,7 +492,7 @@ class CohortStatsLeaderboard(APIView):
     permission_classes = []
 
     def generate_key(**kwargs):
-        return "cohort:all"
+        return "cohort:snapshot"
 
     manager = CohortStatsLeaderboardManager(
         DjangoCacheHandler(expiration=60 * 60), generate_key
@@ -385,54 +500,223 @@ class CohortStatsLeaderboard(APIView):
 
     def get(self, request):
         order_by = request.query_params.get("order_by", "daily_check")
-        page_number = request.query_params.get("page", 1)
         time_range = request.query_params.get("updated_within", None)
 
-        cohort_stats = self.manager.get_all()
+        validate_order_by(self.manager, order_by)
+        cutoff = parse_updated_within(time_range)
 
-        if time_range:
-            try:
-                hours = int(time_range)
-                cutoff = timezone.now() - timedelta(hours=hours)
-                # only include if >= 1 sessions attended
-                cohort_stats = filter(
-                    lambda x: x["last_updated"] >= cutoff
-                    and x["sessions_attended"] >= 1,
-                    cohort_stats,
-                )
-            except ValueError:
-                raise ValidationError(
-                    "`updated_within` must be a valid number of hours"
-                )
+        snapshot = self.manager.get_cached()
+        page_number = parse_page(
+            request.query_params.get("page", 1), len(snapshot["value"][order_by])
+        )
+        cohorts = self.manager.get_cohorts(
+            {row["cohort"]["id"] for row in snapshot["value"][order_by]}
+        )
 
-        ordering_options = {
-            "daily_check": "daily_checks",
-            "applications": "applications",
-            "online_assessments": "online_assessments",
-            "interviews": "interviews",
-            "offers": "offers",
-        }
+        def build():
+            cohort_stats = snapshot["value"][order_by]
 
-        order_field = ordering_options.get(order_by)
-        if not order_field:
-            raise ValidationError(
-                f"Invalid order_by parameter. Must be one of: {', '.join(ordering_options.keys())}"
+            if cutoff:
+                cohort_stats = [x for x in cohort_stats if x["last_updated"] >= cutoff]
+
+            page = paginate_ranked(cohort_stats, page_number, rerank=bool(cutoff))
+
+            # the cohorts on this page, each with its members, keyed by id
+            page["cohorts"] = {
+                cohort_id: cohorts["value"][cohort_id]
+                for cohort_id in {row["cohort"]["id"] for row in page["results"]}
+            }
+
+            return ORJSONResponse(page)
+
+        return snapshot_response(
+            request, [snapshot, cohorts], build, cutoff, (order_by, page_number)
+        )
+
+
+LEADERBOARD_MANAGERS = {
+    view.manager.board: view.manager
+    for view in [
+        LeetcodeLeaderboardView,
+        GitHubLeaderboardView,
+        AttendanceSessionLeaderboard,
+        CohortStatsLeaderboard,
+    ]
+}
+
+
+class RankedLeaderboardBase(APIView):
+    permission_classes = []
+    store = LeaderboardStore()
+
+    def get_metric(self, request, board):
+        manager = LEADERBOARD_MANAGERS.get(board)
+        if not manager:
+            raise Http404(f"Unknown leaderboard {board}")
+
+        order_by = request.query_params.get(
+            "order_by", next(iter(manager.ordering_options))
+        )
+        validate_order_by(manager, order_by)
+
+        return manager.ordering_options[order_by]
+
+
+class RankedLeaderboardPageView(RankedLeaderboardBase):
+    """a page of a leaderboard, read straight from its redis sorted set"""
+
+    max_page_size = 100
+
+    def get(self, request, board):
+        metric = self.get_metric(request, board)
+
+        try:
+            page = max(int(request.query_params.get("page", 1)), 1)
+            page_size = min(
+                max(int(request.query_params.get("page_size", 50)), 1),
+                self.max_page_size,
             )
+        except ValueError:
+            raise ValidationError("page and page_size must be numbers")
 
-        cohort_stats.sort(key=lambda x: x[order_field], reverse=True)
+        start = (page - 1) * page_size
 
-        # Annotate with rank
-        for i in range(len(cohort_stats)):
-            cohort_stats[i]["rank"] = i + 1
+        try:
+            count = self.store.count(board, metric)
+            members = self.store.page(board, metric, start, page_size)
+        except RedisError as e:
+            logger.error(f"Leaderboard store unavailable: {e}")
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(
+            {
+                "count": count,
+                "next": page + 1 if start + page_size < count else None,
+                "prev": page - 1 if page > 1 else None,
+                "results": [
+                    {"rank": rank, "member": member, "score": score}
+                    for rank, (member, score) in enumerate(members, start=start + 1)
+                ],
+            }
+        )
+
+
+class RankedLeaderboardMemberView(RankedLeaderboardBase):
+    """where a single member stands on a leaderboard"""
+
+    def get(self, request, board, member):
+        metric = self.get_metric(request, board)
 
-        paginator = Paginator(cohort_stats, 50)
-        page = paginator.get_page(page_number)
+        try:
+            standing = self.store.rank(board, metric, member)
+            count = self.store.count(board, metric)
+        except RedisError as e:
+            logger.error(f"Leaderboard store unavailable: {e}")
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if standing is None:
+            return Response(
+                {"error": "Member not on leaderboard"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
 
-        payload = {
-            "count": paginator.count,
-            "next": page.next_page_number() if page.has_next() else None,
-            "prev": page.previous_page_number() if page.has_previous() else None,
-            "results": list(page),
-        }
+        return Response({"member": member, "count": count, **standing})
+
+
+class StatsHistoryBase(APIView):
+    permission_classes = []
+    max_days = 365
+
+    def get_tracked(self, board):
+        tracked = TRACKED_STATS.get(board)
+        if not tracked:
+            raise Http404(f"No history for leaderboard {board}")
+        return tracked
+
+    def get_metric(self, request, tracked):
+        options = tracked.manager.ordering_options
+        order_by = request.query_params.get("order_by", next(iter(options)))
+        validate_order_by(tracked.manager, order_by)
 
-        return JsonResponse(payload)
+        metric = options[order_by]
+        if metric not in tracked.metrics:
+            raise ValidationError(f"{order_by} has no history")
+        return metric
+
+    def get_since(self, request, default):
+        try:
+            days = int(request.query_params.get("days", default))
+        except ValueError:
+            raise ValidationError("days must be a number")
+
+        days = min(max(days, 1), self.max_days)
+        return timezone.localdate() - timedelta(days=days - 1)
+
+    def get_scope(self, request, tracked):
+        """the requested scope (e.g. `?cohort=1`), if the board has scopes"""
+        if not tracked.scope:
+            return None
+
+        scope = request.query_params.get(tracked.scope)
+        if scope is None:
+            return None
+
+        try:
+            return int(scope)
+        except ValueError:
+            raise ValidationError(f"{tracked.scope} must be an id")
+
+
+class StatsHistoryMemberView(StatsHistoryBase):
+    """a member's recorded values of a leaderboard metric over the last days"""
+
+    def get(self, request, board, member):
+        tracked = self.get_tracked(board)
+        metric = self.get_metric(request, tracked)
+        scope = self.get_scope(request, tracked)
+        if tracked.scope and scope is None:
+            raise ValidationError(f"{tracked.scope} is required")
+
+        history = member_history(
+            board, member, metric, scope or 0, self.get_since(request, 90)
+        )
+
+        return Response({"member": member, "metric": metric, "results": history})
+
+
+class StatsHistoryMoversView(StatsHistoryBase):
+    """members whose leaderboard metric grew the most over the last days"""
+
+    max_limit = 50
+
+    def get(self, request, board):
+        tracked = self.get_tracked(board)
+        metric = self.get_metric(request, tracked)
+
+        try:
+            limit = min(
+                max(int(request.query_params.get("limit", 10)), 1), self.max_limit
+            )
+        except ValueError:
+            raise ValidationError("limit must be a number")
+
+        movers = top_movers(
+            board,
+            metric,
+            self.get_since(request, 7),
+            scope=self.get_scope(request, tracked),
+            limit=limit,
+        )
+
+        results = []
+        for rank, mover in enumerate(movers, start=1):
+            row = {
+                "rank": rank,
+                "member": {"username": mover["member__username"]},
+                "change": mover["change"],
+            }
+            if tracked.scope:
+                row[tracked.scope] = mover["scope"]
+            results.append(row)
+
+        return Response({"metric": metric, "results": results})
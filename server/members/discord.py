@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class DiscordIdResolver:
+    """
+    discord_id -> user id for the bot facing endpoints.
+
+    lookups go through a process-local LRU, then a redis hash shared by every
+    worker, and only then the db. changing a member's discord id drops it from
+    the hash and bumps a version in redis, and each worker drops its LRU when
+    it sees a new version, which it checks at most every `version_ttl`
+    seconds. while redis is down, lookups go straight to the db and redis
+    isn't retried for `retry_after` seconds.
+    """
+
+    HASH_KEY = "members:discord_ids"
+    VERSION_KEY = "members:discord_ids:version"
+
+    def __init__(self, max_size=10_000, version_ttl=5, retry_after=30, redis=None):
+        self._max_size = max_size
+        self._version_ttl = version_ttl
+        self._retry_after = retry_after
+        self._redis = redis
+        self._redis_down_until = 0.0
+
+        self._user_ids: "OrderedDict[int, int]" = OrderedDict()
+        self._version: Optional[bytes] = None
+        self._version_checked = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_connection("default")
+        return self._redis
+
+    def _clear_local(self):
+        with self._lock:
+            self._user_ids.clear()
+        self._version_checked = float("-inf")
+
+    def _redis_available(self):
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e):
+        logger.error(f"redis unavailable, resolving discord ids from the db: {e}")
+        self._redis_down_until = time.monotonic() + self._retry_after
+        # invalidations can't reach us while redis is down
+        self._clear_local()
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now < self._version_checked + self._version_ttl:
+            return
+
+        version = self.redis.get(self.VERSION_KEY)
+        if version != self._version:
+            with self._lock:
+                self._user_ids.clear()
+            self._version = version
+        self._version_checked = now
+
+    def _remember(self, user_ids: Dict[int, int]):
+        with self._lock:
+            for discord_id, user_id in user_ids.items():
+                self._user_ids[discord_id] = user_id
+                self._user_ids.move_to_end(discord_id)
+            while len(self._user_ids) > self._max_size:
+                self._user_ids.popitem(last=False)
+
+    def _from_local(self, discord_ids):
+        found = {}
+        with self._lock:
+            for discord_id in discord_ids:
+                if discord_id in self._user_ids:
+                    self._user_ids.move_to_end(discord_id)
+                    found[discord_id] = self._user_ids[discord_id]
+        return found
+
+    def _from_redis(self, discord_ids):
+        user_ids = self.redis.hmget(self.HASH_KEY, discord_ids)
+        return {
+            discord_id: int(user_id)
+            for discord_id, user_id in zip(discord_ids, user_ids)
+            if user_id is not None
+        }
+
+    def _from_db(self, discord_ids):
+        return dict(
+            User.objects.filter(discord_id__in=discord_ids).values_list(
+                "discord_id", "id"
+            )
+        )
+
+    def resolve_many(self, discord_ids: Iterable) -> Dict[int, int]:
+        """discord_id -> user id for every discord id that belongs to a member"""
+        discord_ids = list(dict.fromkeys(int(discord_id) for discord_id in discord_ids))
+        if not discord_ids:
+            return {}
+
+        if not self._redis_available():
+            return self._from_db(discord_ids)
+
+        try:
+            self._check_version()
+            found = self._from_local(discord_ids)
+            missing = [d for d in discord_ids if d not in found]
+            if missing:
+                shared = self._from_redis(missing)
+                self._remember(shared)
+                found.update(shared)
+
+            missing = [d for d in discord_ids if d not in found]
+            if missing:
+                # read before the db, so ids changed meanwhile aren't written back
+                version = self.redis.get(self.VERSION_KEY)
+        except RedisError as e:
+            self._redis_failed(e)
+            return self._from_db(discord_ids)
+
+        if missing:
+            fetched = self._from_db(missing)
+            if fetched:
+                try:
+                    self._write_back(fetched, version)
+                except RedisError as e:
+                    self._redis_failed(e)
+            found.update(fetched)
+
+        return found
+
+    def _write_back(self, fetched: Dict[int, int], version: Optional[bytes]):
+        """cache ids read from the db, unless a discord id changed since `version`"""
+        # the version is read along with the write, so either the write lands
+        # before an invalidation (which then drops it), or it's undone here
+        pipe = self.redis.pipeline()
+        pipe.hset(self.HASH_KEY, mapping=fetched)
+        pipe.get(self.VERSION_KEY)
+        _, current = pipe.execute()
+
+        if current != version:
+            self.redis.hdel(self.HASH_KEY, *fetched)
+            return
+        self._remember(fetched)
+
+    def resolve(self, discord_id) -> Optional[int]:
+        try:
+            discord_id = int(discord_id)
+        except (TypeError, ValueError):
+            return None
+        return self.resolve_many([discord_id]).get(discord_id)
+
+    def invalidate(self, discord_ids: Iterable) -> None:
+        discord_ids = [int(discord_id) for discord_id in discord_ids]
+        if not discord_ids:
+            return
+
+        with self._lock:
+            for discord_id in discord_ids:
+                self._user_ids.pop(discord_id, None)
+
+        # nothing is cached while redis is down
+        if not self._redis_available():
+            return
+
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hdel(self.HASH_KEY, *discord_ids)
+            pipe.incr(self.VERSION_KEY)
+            pipe.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+
+
+discord_resolver = DiscordIdResolver()
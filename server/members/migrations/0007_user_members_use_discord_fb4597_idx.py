@@ -0,0 +1,19 @@
+# Generated by Django 4.2.17 on 2026-10-17 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0006_alter_user_school_email"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["discord_id"], name="members_use_discord_fb4597_idx"
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Upper
 
 
 def validate_social_field(value):
@@ -59,4 +61,19 @@ class User(AbstractUser):
             models.Index(fields=["username"]),
             models.Index(fields=["first_name"]),
             models.Index(fields=["last_name"]),
+            models.Index(fields=["discord_id"]),
+            # directory search, matching the upper() that icontains applies
+            GinIndex(
+                *[
+                    OpClass(Upper(field), name="gin_trgm_ops")
+                    for field in [
+                        "username",
+                        "first_name",
+                        "last_name",
+                        "major",
+                        "discord_username",
+                    ]
+                ],
+                name="members_user_search_trgm_idx",
+            ),
         ]
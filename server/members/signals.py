@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .discord import discord_resolver
+from .models import User
+
+
+@receiver(post_init, sender=User)
+def remember_discord_id(sender, instance, **kwargs):
+    # skip deferred loads, reading the field would cost a query
+    instance._loaded_discord_id = instance.__dict__.get("discord_id")
+
+
+@receiver(post_save, sender=User)
+def invalidate_discord_id(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "discord_id" not in update_fields:
+        return
+
+    # a member created in a rolled back transaction may have left its
+    # discord id cached
+    previous = getattr(instance, "_loaded_discord_id", None)
+    if created or previous != instance.discord_id:
+        discord_resolver.invalidate(
+            {d for d in (previous, instance.discord_id) if d is not None}
+        )
+    instance._loaded_discord_id = instance.discord_id
+
+
+@receiver(post_delete, sender=User)
+def forget_discord_id(sender, instance, **kwargs):
+    if instance.discord_id is not None:
+        discord_resolver.invalidate([instance.discord_id])
@@ -1,3 +1,119 @@
-from django.test import TestCase  # noqa: F401
+from unittest.mock import patch
 
-# Create your tests here.
+from django.test import TestCase
+from redis.exceptions import ConnectionError
+
+from server.testing import FakeRedis
+
+from .discord import DiscordIdResolver
+from .models import User
+
+
+class DiscordIdResolverTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        # two gunicorn workers sharing the same redis
+        self.workers = [
+            DiscordIdResolver(redis=self.redis, version_ttl=0) for _ in range(2)
+        ]
+        self.patcher = patch("members.signals.discord_resolver", self.workers[0])
+        self.patcher.start()
+
+        self.user = User.objects.create(
+            username="1", discord_id=123456789, discord_username="test_user"
+        )
+        self.user2 = User.objects.create(
+            username="2", discord_id=987654321, discord_username="test_user2"
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_resolve_many_is_one_query(self):
+        first, second = self.workers
+
+        with self.assertNumQueries(1):
+            resolved = first.resolve_many(["123456789", 987654321, 555])
+        self.assertEqual(resolved, {123456789: self.user.id, 987654321: self.user2.id})
+
+        # the other worker finds them in redis, unknown ids are looked up again
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                second.resolve_many([123456789, 555]), {123456789: self.user.id}
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(second.resolve(987654321), self.user2.id)
+
+    def test_lru_is_bounded(self):
+        resolver = DiscordIdResolver(redis=self.redis, max_size=1)
+        resolver.resolve_many([123456789, 987654321])
+
+        self.assertEqual(len(resolver._user_ids), 1)
+
+    def test_changed_discord_id_is_dropped_by_every_worker(self):
+        first, second = self.workers
+        for worker in self.workers:
+            worker.resolve(123456789)
+
+        self.user.discord_id = 111
+        self.user.save()
+
+        for worker in (second, first):
+            with self.assertNumQueries(1):
+                self.assertIsNone(worker.resolve(123456789))
+            self.assertEqual(worker.resolve(111), self.user.id)
+
+    def test_ids_changed_during_the_db_lookup_arent_cached(self):
+        first, second = self.workers
+        from_db = second._from_db
+
+        def read_then_change(discord_ids):
+            user_ids = from_db(discord_ids)
+            # another request changes the discord id before the write back
+            self.user.discord_id = 111
+            self.user.save()
+            return user_ids
+
+        with patch.object(second, "_from_db", side_effect=read_then_change):
+            second.resolve(123456789)
+
+        self.assertEqual(
+            self.redis.hmget(DiscordIdResolver.HASH_KEY, [123456789]), [None]
+        )
+        for worker in (second, first):
+            with self.assertNumQueries(1):
+                self.assertIsNone(worker.resolve(123456789))
+
+    def test_unrelated_saves_dont_invalidate(self):
+        first, _ = self.workers
+        first.resolve(123456789)
+        version = self.redis.get(DiscordIdResolver.VERSION_KEY)
+
+        self.user.bio = "hi"
+        self.user.save()
+        User.objects.get(id=self.user2.id).save(update_fields=["bio"])
+
+        self.assertEqual(self.redis.get(DiscordIdResolver.VERSION_KEY), version)
+
+    def test_deleted_member_is_dropped(self):
+        first, _ = self.workers
+        first.resolve(987654321)
+
+        self.user2.delete()
+
+        self.assertIsNone(first.resolve(987654321))
+
+    def test_falls_back_to_db_without_redis(self):
+        first, _ = self.workers
+        first.resolve(123456789)
+
+        with patch.object(self.redis, "get", side_effect=ConnectionError("down")):
+            with self.assertNumQueries(1):
+                self.assertEqual(first.resolve(123456789), self.user.id)
+
+        # redis isn't retried for a while, and nothing is cached meanwhile
+        with self.assertNumQueries(1):
+            self.assertEqual(first.resolve(123456789), self.user.id)
+        self.assertEqual(first._user_ids, {})
@@ -20,6 +20,7 @@ from supabase import Client, create_client
 from server import settings
 from server.settings import JWT_SECRET, VERIFICATION_EMAIL_ADDR
 
+from .discord import discord_resolver
 from .models import User
 from .notification import verify_school_email_html
 from .permissions import IsApiKey
@@ -213,7 +214,7 @@ class PasswordResetRequest(APIView):
 
     def post(self, request, *args, **kwargs):
         discord_id = request.data.get("discord_id")
-        user = get_object_or_404(User, discord_id=discord_id)
+        user = get_object_or_404(User, id=discord_resolver.resolve(discord_id))
 
         uuid, token = create_password_reset_creds(user)
 
@@ -278,7 +279,7 @@ class VerifySchoolEmailRequest(APIView):
             )
 
         user = (
-            get_object_or_404(User, discord_id=discord_id)
+            get_object_or_404(User, id=discord_resolver.resolve(discord_id))
             if discord_id
             else get_object_or_404(User, id=user_id)
         )
@@ -16,6 +16,9 @@ METRIC_SERVER_URL = os.environ["METRIC_SERVER_URL"]
 JWT_SECRET = os.environ["JWT_SECRET"]
 AWS_BUCKET_NAME = os.environ["AWS_BUCKET_NAME"]
 VERIFICATION_EMAIL_ADDR = os.environ.get("VERIFICATION_EMAIL_ADDR", "swecc@uw.edu")
+# "local" buffers discord messages per worker, "redis" shares counts across workers
+MESSAGE_BUFFER_BACKEND = os.environ.get("MESSAGE_BUFFER_BACKEND", "local")
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 
 print(
     {
@@ -47,10 +50,15 @@ ALLOWED_HOSTS = ["*"]
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "server.renderers.ORJSONRenderer",
         # 'rest_framework.renderers.AdminRenderer',
         # 'rest_framework.renderers.BrowsableAPIRenderer'
     ],
+    "DEFAULT_PARSER_CLASSES": [
+        "server.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
     ],
@@ -64,6 +72,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "questions.apps.QuestionsConfig",
     "members.apps.MembersConfig",
@@ -77,6 +86,7 @@ INSTALLED_APPS = [
     "metrics.apps.MetricsConfig",
     "cohort.apps.CohortConfig",
     "resume_review.apps.ResumeReviewConfig",
+    "directory.apps.DirectoryConfig",
     "corsheaders",
     "rest_framework_api_key",
 ]
@@ -0,0 +1,196 @@
+from cohort.models import Cohort
+from engagement.models import AttendanceSessionStats, CohortStats
+from leaderboard.models import GitHubStats, LeetcodeStats
+from members.models import User
+from redis.exceptions import ResponseError
+
+
+def _encode(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakeRedis:
+    """
+    just enough of the redis client for the hashes, sets, sorted sets and
+    locks the apps keep in redis. keys are kept as given, everything stored is bytes
+    except sorted set scores.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = _encode(value)
+        return True
+
+    def incr(self, key):
+        self.data[key] = _encode(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def rename(self, src, dst):
+        if src not in self.data:
+            raise ResponseError("no such key")
+        self.data[dst] = self.data.pop(src)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        # only compare and delete: drop KEYS if KEYS[1] still holds ARGV[1]
+        keys, (token,) = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if self.get(keys[0]) != _encode(token):
+            return 0
+        return sum(self.delete(key) for key in keys)
+
+    def hlen(self, key):
+        return len(self.data.get(key, {}))
+
+    def hkeys(self, key):
+        return list(self.data.get(key, {}))
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hmget(self, key, fields):
+        bucket = self.data.get(key, {})
+        return [bucket.get(_encode(field)) for field in fields]
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(
+            {_encode(k): _encode(v) for k, v in mapping.items()}
+        )
+
+    def hsetnx(self, key, field, value):
+        bucket = self.data.setdefault(key, {})
+        if _encode(field) in bucket:
+            return 0
+        bucket[_encode(field)] = _encode(value)
+        return 1
+
+    def hincrby(self, key, field, amount):
+        bucket = self.data.setdefault(key, {})
+        count = int(bucket.get(_encode(field), 0)) + amount
+        bucket[_encode(field)] = _encode(count)
+        return count
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(_encode(field), None)
+
+    def sadd(self, key, *members):
+        bucket = self.data.setdefault(key, set())
+        added = {_encode(member) for member in members} - bucket
+        bucket.update(added)
+        return len(added)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def srem(self, key, *members):
+        bucket = self.data.get(key, set())
+        removed = {_encode(member) for member in members} & bucket
+        bucket.difference_update(removed)
+        if not bucket:
+            self.data.pop(key, None)
+        return len(removed)
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(
+            {_encode(member): float(score) for member, score in mapping.items()}
+        )
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.data.get(key, {}).pop(_encode(member), None)
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def _ranked(self, key):
+        return sorted(
+            self.data.get(key, {}).items(), key=lambda x: (x[1], x[0]), reverse=True
+        )
+
+    def zrevrange(self, key, start, end, withscores=False):
+        return self._ranked(key)[start : end + 1]
+
+    def zrevrank(self, key, member):
+        members = [m for m, _ in self._ranked(key)]
+        return members.index(_encode(member)) if _encode(member) in members else None
+
+    def zscore(self, key, member):
+        return self.data.get(key, {}).get(_encode(member))
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+def create_members(start, count):
+    """
+    members `member{start}` onwards, each with leetcode, github, attendance
+    and cohort stats growing with their index, in a new cohort
+    """
+    users = User.objects.bulk_create(
+        [
+            User(
+                username=f"member{i}",
+                first_name=f"first{i}",
+                last_name=f"last{i}",
+                major="Computer Science" if i % 2 else "Informatics",
+                discord_username=f"discord{i}",
+                discord_id=i,
+            )
+            for i in range(start, start + count)
+        ]
+    )
+    LeetcodeStats.objects.bulk_create(
+        [
+            LeetcodeStats(user=u, total_solved=i, easy_solved=i)
+            for i, u in enumerate(users)
+        ]
+    )
+    GitHubStats.objects.bulk_create(
+        [GitHubStats(user=u, total_commits=i) for i, u in enumerate(users)]
+    )
+    AttendanceSessionStats.objects.bulk_create(
+        [
+            AttendanceSessionStats(member=u, sessions_attended=i)
+            for i, u in enumerate(users)
+        ]
+    )
+
+    cohort = Cohort.objects.create(name=f"cohort{start}")
+    cohort.members.add(*users)
+    CohortStats.objects.bulk_create(
+        [
+            CohortStats(member=u, cohort=cohort, dailyChecks=i)
+            for i, u in enumerate(users)
+        ]
+    )
+    return users
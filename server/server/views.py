@@ -22,6 +22,18 @@ class ManagementCommandView(APIView):
             "name": "update_leetcode_stats",
             "description": "Updates LeetCode statistics for all users",
         },
+        {
+            "name": "rebuild_leaderboards",
+            "description": "Rebuilds the ranked leaderboards from the database",
+        },
+        {
+            "name": "snapshot_stats_history",
+            "description": "Records today's leaderboard stats changes in their history",
+        },
+        {
+            "name": "downsample_stats_history",
+            "description": "Folds old daily leaderboard stats history into weeks",
+        },
         {
             "name": "view_interview_pool",
             "description": "View the interview pool (current signups)",